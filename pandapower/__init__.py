@@ -9,6 +9,11 @@ from pandapower.runpm import *
 from pandapower.std_types import *
 from pandapower.toolbox import *
 from pandapower.powerflow import *
+from pandapower.timeseries import *
+from pandapower.session import *
+from pandapower.contingency import *
+from pandapower.sensitivity import *
+from pandapower.switching import *
 from pandapower.opf import *
 from pandapower.optimal_powerflow import OPFNotConverged
 
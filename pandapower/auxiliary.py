@@ -181,6 +181,35 @@ class pandapowerNet(ADict):
     def __init__(self, *args, **kwargs):
         super(pandapowerNet, self).__init__(*args, **kwargs)
 
+    def __getitem__(self, key):
+        # the res_* tables of a power flow with result_mode="arrays" are created on first access
+        if isinstance(key, six.string_types) and key.startswith("res_"):
+            self._build_pending_results()
+        return super(pandapowerNet, self).__getitem__(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __getstate__(self):
+        # copies and pickles of the net contain the pending results
+        self._build_pending_results()
+        return super(pandapowerNet, self).__getstate__()
+
+    def items(self):
+        # iterations over all tables (e.g. in file_io) need the pending results, which cannot be
+        # created while the dict is iterated
+        self._build_pending_results()
+        return super(pandapowerNet, self).items()
+
+    def values(self):
+        self._build_pending_results()
+        return super(pandapowerNet, self).values()
+
+    def _build_pending_results(self):
+        if "_pending_results" in self:
+            from pandapower.powerflow import _extract_pending_results
+            _extract_pending_results(self)
+
     def __repr__(self):  # pragma: no cover
         r = "This pandapower network includes the following parameter tables:"
         par = []
@@ -444,14 +473,15 @@ def _add_pf_options(net, tolerance_kva, trafo_loading, numba, ac,
     _add_options(net, options)
 
 
-def _add_opf_options(net, trafo_loading, ac, v_debug=False, **kwargs):
+def _add_opf_options(net, trafo_loading, ac, v_debug=False, linear_solver="superlu", **kwargs):
     """
     creates dictionary for pf, opf and short circuit calculations from input parameters.
     """
     options = {
         "trafo_loading": trafo_loading,
         "ac": ac,
-        "v_debug": v_debug
+        "v_debug": v_debug,
+        "linear_solver": linear_solver
     }
 
     options.update(kwargs)  # update options with some algorithm-specific parameters
@@ -459,7 +489,8 @@ def _add_opf_options(net, trafo_loading, ac, v_debug=False, **kwargs):
 
 
 def _add_sc_options(net, fault, case, lv_tol_percent, tk_s, topology, r_fault_ohm,
-                    x_fault_ohm, kappa, ip, ith, consider_sgens, branch_results, kappa_method):
+                    x_fault_ohm, kappa, ip, ith, consider_sgens, branch_results, kappa_method,
+                    inverse_y=True, bus=None, chunk_size=None):
     """
     creates dictionary for pf, opf and short circuit calculations from input parameters.
     """
@@ -476,7 +507,10 @@ def _add_sc_options(net, fault, case, lv_tol_percent, tk_s, topology, r_fault_oh
         "ith": ith,
         "consider_sgens": consider_sgens,
         "branch_results": branch_results,
-        "kappa_method": kappa_method
+        "kappa_method": kappa_method,
+        "inverse_y": inverse_y,
+        "bus": bus,
+        "chunk_size": chunk_size
     }
     _add_options(net, options)
 
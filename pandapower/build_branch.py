@@ -856,6 +856,31 @@ def _update_trafo_trafo3w_ppc(net, ppc):
             _calc_trafo3w_parameter(net, ppc)
 
 
+def _update_branch_parameters_ppc(net, ppc):
+    """
+    Updates the electrical parameters (impedances, taps, phase shift) of lines, trafos and trafo3w
+    when reusing the ppc between two powerflows. The connections and the status of the branches
+    are kept, since open switches and out of service buses change them in the ppc.
+
+    :param net: pandapower net
+    :param ppc: pypower format
+    :return: ppc with updates values
+    """
+    lookup = net["_pd2ppc_lookups"]["branch"]
+    if "line" in lookup:
+        f, t = lookup["line"]
+        ppc["branch"][f:t, [BR_R, BR_X, BR_B, RATE_A]] = \
+            _calc_line_parameter(net, ppc)[:, [2, 3, 4, 6]]
+    if "trafo" in lookup:
+        f, t = lookup["trafo"]
+        ppc["branch"][f:t, [BR_R, BR_X, BR_B, TAP, SHIFT, RATE_A]] = \
+            _calc_trafo_parameter(net, ppc)[:, [2, 3, 4, 5, 6, 8]]
+    if "trafo3w" in lookup:
+        f, t = lookup["trafo3w"]
+        ppc["branch"][f:t, [BR_R, BR_X, BR_B, TAP, SHIFT, RATE_A]] = \
+            _calc_trafo3w_parameter(net, ppc)[:, [2, 3, 4, 5, 6, 8]]
+
+
 def _calc_switch_parameter(net, ppc):
     """
     calculates the line parameter in per unit.
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+from multiprocessing import Pool
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from pandapower.idx_brch import F_BUS, T_BUS
+from pandapower.idx_bus import BASE_KV
+from pandapower.pf.makeSbus import makeSbus
+from pandapower.pf.newtonpf import newtonpf
+from pandapower.pf.ppci_variables import _get_pf_variables_from_ppci
+from pandapower.session import PowerFlowSession
+
+try:
+    import pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+OUTAGE_ELEMENTS = ["line", "trafo", "trafo3w", "impedance"]
+MONITORED_ELEMENTS = ["line", "trafo"]
+
+# base case of the contingency analysis in the worker processes, set by _init_worker
+_worker_base = None
+
+
+def run_contingency_analysis(net, elements=None, n_jobs=1, **kwargs):
+    """
+    Runs an AC contingency analysis (N-1) for the outage of single branch elements.
+
+    The network is converted to the ppc format only once. For every outage, the branch is removed
+    from the admittance matrix of the base case, buses that are disconnected by the outage are
+    treated as out of service and the power flow is started from the voltages of the base case.
+    The outages can be split across several worker processes, which receive the internal base
+    case only once.
+
+    INPUT:
+        **net** - The pandapower format network
+
+    OPTIONAL:
+        **elements** (dict, None) - indices of the elements to be outaged for the element tables
+        "line", "trafo", "trafo3w" and "impedance", e.g. {"line": [0, 1, 5], "trafo": [0]}. If
+        None, the outage of every line and trafo is calculated. Outages of out of service
+        elements give the base case results.
+
+        **n_jobs** (int, 1) - number of worker processes. With n_jobs=1, all outages are
+        calculated in the current process.
+
+        ****kwargs** - power flow options as in runpp (e.g. calculate_voltage_angles,
+        tolerance_kva, max_iteration). enforce_q_lims is not available.
+
+    OUTPUT:
+        **results** (dict) - arrays with one entry per outage:
+
+            - "element", "index" - element table and index of the outaged element
+            - "converged" - convergence of the power flow
+            - "min_vm_pu", "max_vm_pu" - minimum and maximum voltage of the supplied buses
+            - "max_loading_line", "max_loading_trafo" - maximum loading_percent of the lines and
+              trafos (except for the outaged element)
+            - "unsupplied_buses" - number of buses in net.bus that are disconnected by the outage
+
+        Outages without convergence get nan results.
+
+    EXAMPLE:
+        res = pp.run_contingency_analysis(net, {"line": net.line.index}, n_jobs=4)
+
+        critical = res["index"][res["max_loading_line"] > 100]
+
+    NOTE:
+        With n_jobs > 1 on Windows, the function has to be called from a script that is protected
+        by if __name__ == "__main__".
+    """
+    if elements is None:
+        elements = {element: net[element].index for element in MONITORED_ELEMENTS}
+    for element in elements:
+        if element not in OUTAGE_ELEMENTS:
+            raise NotImplementedError("Outages of %s are not available, only of %s"
+                                      % (element, OUTAGE_ELEMENTS))
+        if not set(elements[element]).issubset(net[element].index):
+            raise UserWarning("Unknown %s indices in the contingency list" % element)
+
+    session = PowerFlowSession(net, **kwargs)
+    session.run()
+    base = _get_contingency_base(net, session)
+    outage_element = np.array([element for element, index in elements.items() for _ in index],
+                              dtype=str)
+    outage_index = np.array([i for index in elements.values() for i in index], dtype=np.int64)
+    outage_rows = [_get_ppci_branch_rows(net, session, element, index)
+                   for element, index in zip(outage_element, outage_index)]
+
+    if n_jobs > 1 and len(outage_rows) > 1:
+        chunks = [list(chunk) for chunk in np.array_split(np.arange(len(outage_rows)),
+                                                         min(4 * n_jobs, len(outage_rows)))]
+        pool = Pool(n_jobs, initializer=_init_worker, initargs=(base,))
+        try:
+            chunk_results = pool.map(_run_outages_in_worker,
+                                     [[outage_rows[i] for i in chunk] for chunk in chunks])
+        finally:
+            pool.close()
+            pool.join()
+        results = {key: np.concatenate([res[key] for res in chunk_results])
+                   for key in chunk_results[0]}
+    else:
+        results = _run_outages(base, outage_rows)
+    results["element"] = outage_element
+    results["index"] = outage_index
+    return results
+
+
+def _get_contingency_base(net, session):
+    """
+    Collects everything the outage calculation needs in one picklable dict, so that it is sent to
+    every worker process only once: the base case ppci with its admittance matrices and voltages,
+    the positions of the branch admittances in Ybus and the loading factors of all ppci branches.
+    """
+    ppci, Ybus = session.ppci, session.Ybus
+    Yf, Yt = ppci["internal"]["Yf"].tocsr(), ppci["internal"]["Yt"].tocsr()
+    branch = ppci["branch"]
+    n_branch = branch.shape[0]
+    f = branch[:, F_BUS].real.astype(np.int64)
+    t = branch[:, T_BUS].real.astype(np.int64)
+    k = np.arange(n_branch)
+
+    # position of every Ybus entry in Ybus.data (+1 so that no entry becomes an explicit zero)
+    Yk = csr_matrix((np.arange(1, len(Ybus.data) + 1), Ybus.indices, Ybus.indptr),
+                    shape=Ybus.shape)
+    pos = [np.asarray(Yk[rows, cols]).ravel() - 1
+           for rows, cols in [(f, f), (f, t), (t, f), (t, t)]]
+    y = [np.asarray(Y[k, cols]).ravel() for Y, cols in [(Yf, f), (Yf, t), (Yt, f), (Yt, t)]]
+
+    base = {"ppci": ppci, "options": session.options, "Ybus": Ybus, "Yf": Yf, "Yt": Yt,
+            "Sbus": makeSbus(ppci["baseMVA"], ppci["bus"], ppci["gen"]), "V": session.V,
+            "pv": session.pv, "pq": session.pq, "f": f, "t": t, "pos": pos, "y": y}
+    # ppci buses of the pandapower buses, without the auxiliary buses (e.g. trafo3w star points)
+    bus_ppci = session.lookups["bus"][session.bus_index]
+    base["bus_ppci"] = bus_ppci[bus_ppci < Ybus.shape[0]]
+    base.update(_get_loading_factors(net, session))
+    return base
+
+
+def _get_loading_factors(net, session):
+    """
+    Returns the factors that convert the current (or apparent power for trafo_loading="power") at
+    both sides of every ppci branch to loading_percent, as in _get_branch_results_batch, and the
+    monitored element type of every ppci branch (-1 for branches that are not monitored).
+    """
+    ppci = session.ppci
+    branch_is = ppci["internal"]["branch_is"]
+    n_branch = ppci["branch"].shape[0]
+    ppci_rows = np.cumsum(branch_is) - 1
+    a_f, a_t = np.zeros(n_branch), np.zeros(n_branch)
+    use_power = np.zeros(n_branch, dtype=bool)
+    monitored = np.full(n_branch, -1)
+    for i, element in enumerate(MONITORED_ELEMENTS):
+        if element not in session.lookups["branch"]:
+            continue
+        first, last = session.lookups["branch"][element]
+        ppc_rows = np.arange(first, last)
+        is_ppci = branch_is[ppc_rows]
+        rows = ppci_rows[ppc_rows[is_ppci]]
+        df = net[element].iloc[is_ppci]
+        if element == "line":
+            a = 100. / (df["max_i_ka"].values * df["df"].values * df["parallel"].values)
+            a_f[rows], a_t[rows] = a, a
+        else:
+            a = 100. / (df["sn_kva"].values * df["parallel"].values * df["df"].values)
+            if session.options["trafo_loading"] == "power":
+                # apparent power in MVA
+                a_f[rows], a_t[rows] = a * 1e3, a * 1e3
+                use_power[rows] = True
+            else:
+                a_f[rows] = a * df["vn_hv_kv"].values * 1e3 * np.sqrt(3)
+                a_t[rows] = a * df["vn_lv_kv"].values * 1e3 * np.sqrt(3)
+        monitored[rows] = i
+    return {"a_f": a_f, "a_t": a_t, "use_power": use_power, "monitored": monitored}
+
+
+def _get_ppci_branch_rows(net, session, element, index):
+    """
+    Returns the ppci branch rows of the element (three rows for a trafo3w). Out of service
+    elements have no ppci branch rows.
+    """
+    branch_is = session.ppci["internal"]["branch_is"]
+    first, last = session.lookups["branch"][element]
+    pos = net[element].index.get_loc(index)
+    if element == "trafo3w":
+        n = len(net["trafo3w"])
+        ppc_rows = first + pos + np.arange(3) * n
+    else:
+        ppc_rows = np.array([first + pos])
+    ppc_rows = ppc_rows[branch_is[ppc_rows]]
+    return np.cumsum(branch_is)[ppc_rows] - 1
+
+
+def _init_worker(base):
+    global _worker_base
+    _worker_base = base
+
+
+def _run_outages_in_worker(outage_rows):
+    return _run_outages(_worker_base, outage_rows)
+
+
+def _run_outages(base, outage_rows):
+    n = len(outage_rows)
+    results = {"converged": np.zeros(n, dtype=bool), "unsupplied_buses": np.zeros(n, dtype=int)}
+    for key in ["min_vm_pu", "max_vm_pu"] + ["max_loading_" + e for e in MONITORED_ELEMENTS]:
+        results[key] = np.full(n, np.nan)
+    for i, rows in enumerate(outage_rows):
+        _run_outage(base, rows, results, i)
+    return results
+
+
+def _run_outage(base, rows, results, i):
+    ppci, Ybus, f, t = base["ppci"], base["Ybus"], base["f"], base["t"]
+    n_bus = Ybus.shape[0]
+
+    # remove the branch from Ybus without changing the sparsity pattern, so that the jacobian
+    # template of the base case can be reused
+    data = Ybus.data.copy()
+    for pos, y in zip(base["pos"], base["y"]):
+        np.subtract.at(data, pos[rows], y[rows])
+    Y = csr_matrix((data, Ybus.indices, Ybus.indptr), shape=Ybus.shape)
+
+    # buses that are not connected to a reference bus anymore are not supplied
+    in_service = np.ones(len(f), dtype=bool)
+    in_service[rows] = False
+    graph = coo_matrix((np.ones(in_service.sum()), (f[in_service], t[in_service])),
+                       shape=(n_bus, n_bus))
+    _, labels = connected_components(graph, directed=False)
+    ref = _get_pf_variables_from_ppci(ppci)[4]
+    supplied = np.in1d(labels, labels[ref])
+    pv, pq = base["pv"], base["pq"]
+    if not supplied.all():
+        pv, pq = pv[supplied[pv]], pq[supplied[pq]]
+    results["unsupplied_buses"][i] = np.count_nonzero(~supplied[base["bus_ppci"]])
+
+    if len(pv) + len(pq):
+        V, converged, _, _, _, _ = newtonpf(Y, base["Sbus"], base["V"].copy(), pv, pq, ppci,
+                                            base["options"])
+    else:
+        # only the reference buses are supplied
+        V, converged = base["V"], True
+    results["converged"][i] = converged
+    if not converged:
+        return
+    vm = np.abs(V[supplied])
+    results["min_vm_pu"][i], results["max_vm_pu"][i] = vm.min(), vm.max()
+
+    # loading of the branches between supplied buses
+    valid = in_service & supplied[f] & supplied[t]
+    baseMVA, base_kv = ppci["baseMVA"], ppci["bus"][:, BASE_KV]
+    s_f = np.abs(V[f] * np.conj(base["Yf"] * V)) * baseMVA
+    s_t = np.abs(V[t] * np.conj(base["Yt"] * V)) * baseMVA
+    use_power = base["use_power"]
+    x_f = np.where(use_power, s_f, s_f / (np.abs(V[f]) * base_kv[f] * np.sqrt(3)))
+    x_t = np.where(use_power, s_t, s_t / (np.abs(V[t]) * base_kv[t] * np.sqrt(3)))
+    loading = np.maximum(x_f * base["a_f"], x_t * base["a_t"])
+    for j, element in enumerate(MONITORED_ELEMENTS):
+        monitored = valid & (base["monitored"] == j)
+        if monitored.any():
+            results["max_loading_" + element][i] = loading[monitored].max()
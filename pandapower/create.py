@@ -5,7 +5,8 @@
 
 
 import pandas as pd
-from numpy import nan, isnan, arange, dtype, zeros
+from numpy import nan, isnan, arange, dtype, zeros, array, full, int64, setdiff1d, isin, \
+    unique, where
 
 from pandapower.auxiliary import pandapowerNet, get_free_id, _preserve_dtypes
 from pandapower.results import reset_results
@@ -2397,6 +2398,111 @@ def create_measurement(net, meas_type, element_type, value, std_dev, bus, elemen
     return index
 
 
+def create_measurements(net, measurements, check_existing=True, index=None):
+    """
+    Creates several measurements at once, e.g. all telemetry points of a SCADA snapshot. The
+    measurements are checked and added to net.measurement like by create_measurement, but
+    vectorized for the whole table.
+
+    INPUT:
+        **measurements** (DataFrame) - Table of the measurements with the columns "type",
+        "element_type", "value", "std_dev", "bus" and optionally "element" and "name" as described
+        for create_measurement. Missing elements of bus measurements are None or nan.
+
+    OPTIONAL:
+        **check_existing** (bool) - Check for and replace existing measurements for the same bus,
+        type, element_type and element. Set it to false for performance improvements which can
+        cause unsafe behaviour.
+
+        **index** (array, None) - Indices of the measurements. If None, the indices higher than
+        the highest already existing index are selected.
+
+    OUTPUT:
+        (array) Indices of the measurements
+
+    EXAMPLE:
+        measurements = pd.DataFrame({"type": ["v", "p", "p"], "element_type": ["bus", "bus", "line"],
+                                     "value": [1.01, -500., 300.], "std_dev": [0.004, 10., 10.],
+                                     "bus": [0, 0, 0], "element": [None, None, 0]})
+
+        create_measurements(net, measurements)
+    """
+    n = len(measurements)
+    meas_type = measurements["type"].values
+    element_type = measurements["element_type"].values.copy()
+    element_type[meas_type == "v"] = "bus"
+    if "element" in measurements:
+        element = pd.to_numeric(measurements["element"].values).astype(float)
+    else:
+        element = full(n, nan)
+    bus = measurements["bus"].values.astype(object)
+
+    invalid_types = set(pd.unique(meas_type)) - {"v", "p", "q", "i"}
+    if len(invalid_types):
+        raise UserWarning("Invalid measurement type (%s)" % invalid_types.pop())
+    invalid_types = set(pd.unique(element_type)) - {"bus", "line", "trafo"}
+    if len(invalid_types):
+        raise UserWarning("Invalid element type (%s)" % invalid_types.pop())
+    if ((meas_type == "i") & (element_type == "bus")).any():
+        raise UserWarning("Line current measurements cannot be placed at buses")
+
+    for et, sides in [("line", ("from", "to")), ("trafo", ("hv", "lv"))]:
+        is_et = element_type == et
+        if (is_et & isnan(element)).any():
+            raise UserWarning("The element type %s requires a value in 'element'" % et)
+        missing = setdiff1d(element[is_et], net[et].index.values)
+        if len(missing):
+            raise UserWarning("%s %s does not exist" % (et.capitalize(), int(missing[0])))
+        # buses given as the side of the element
+        for side in sides:
+            at_side = is_et & (bus == side)
+            bus[at_side] = net[et][side + "_bus"].loc[element[at_side]].values
+    bus = bus.astype(int64)
+    missing = setdiff1d(bus, net["bus"].index.values)
+    if len(missing):
+        raise UserWarning("Bus %s does not exist" % missing[0])
+
+    if index is None:
+        first = get_free_id(net.measurement)
+        index = arange(first, first + n)
+    index = array(index, dtype=int64)
+    if check_existing:
+        # replace existing measurements of the same type, element type, bus and element
+        key = ["type", "element_type", "bus", "element"]
+        existing = net.measurement[key].copy()
+        existing["element"] = pd.to_numeric(existing["element"]).fillna(-1)
+        if existing.duplicated().any():
+            raise UserWarning("More than one measurement of this type exists")
+        new = pd.DataFrame({"type": meas_type, "element_type": element_type, "bus": bus,
+                            "element": where(isnan(element), -1, element)})[key]
+        if new.duplicated().any():
+            raise UserWarning("More than one measurement of this type is given")
+        positions = pd.MultiIndex.from_arrays([existing[c].values for c in key]).get_indexer(
+            pd.MultiIndex.from_arrays([new[c].values for c in key]))
+        index[positions >= 0] = existing.index.values[positions[positions >= 0]]
+    else:
+        positions = full(n, -1)
+    if isin(index[positions < 0], net.measurement.index.values).any() or \
+            len(unique(index)) < n:
+        raise UserWarning("A measurement with one of the indices %s already exists" % index)
+
+    name = measurements["name"].values if "name" in measurements else full(n, None)
+    element_values = full(n, None, dtype=object)
+    element_values[~isnan(element)] = element[~isnan(element)].astype(int64)
+    table = pd.DataFrame({"name": name, "type": meas_type, "element_type": element_type,
+                          "value": measurements["value"].values.astype(float),
+                          "std_dev": measurements["std_dev"].values.astype(float),
+                          "bus": bus, "element": element_values},
+                         index=index, columns=net.measurement.columns)
+    dtypes = net.measurement.dtypes
+    replace = positions >= 0
+    if replace.any():
+        net.measurement.loc[index[replace]] = table.loc[index[replace]].values
+    net["measurement"] = pd.concat([net.measurement, table[~replace]])
+    _preserve_dtypes(net.measurement, dtypes)
+    return index
+
+
 def create_piecewise_linear_cost(net, element, element_type, data_points, type="p", index=None):
     """
     Creates an entry for piecewise linear costs for an element. The currently supported elements are
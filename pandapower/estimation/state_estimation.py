@@ -3,9 +3,9 @@
 # Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
 # and Energy System Technology (IEE), Kassel. All rights reserved.
 import numpy as np
+import pandas as pd
 
-from scipy.sparse import csr_matrix
-from scipy.sparse.linalg import spsolve
+from scipy.sparse import diags
 from scipy.stats import chi2
 
 from pandapower.estimation.wls_ppc_conversions import _add_measurements_to_ppc, \
@@ -14,6 +14,7 @@ from pandapower.estimation.results import _copy_power_flow_results, _rename_resu
 from pandapower.idx_brch import F_BUS, T_BUS, BR_STATUS, PF, PT, QF, QT
 from pandapower.auxiliary import _add_pf_options, get_values
 from pandapower.estimation.wls_matrix_ops import wls_matrix_ops
+from pandapower.pf.linear_solver import get_linear_solver
 from pandapower.pf.ppci_variables import _get_pf_variables_from_ppci, \
     _store_results_from_pf_in_ppci
 from pandapower.results import _copy_results_ppci_to_ppc, _extract_results_se
@@ -25,9 +26,21 @@ except ImportError:
     import logging
 std_logger = logging.getLogger(__name__)
 
+# maximum number of entries of the dense blocks of Gm^-1 * H^T for the residual covariances
+GAIN_BLOCK_ENTRIES = 2 ** 22
+# residual covariances below this fraction of the measurement variance belong to critical
+# measurements, whose residuals are zero
+OMEGA_TOLERANCE = 1e-10
+# correlation coefficient of the residuals above which suspect measurements interact and are
+# not removed together
+INTERACTION_TOLERANCE = 0.1
+# number of suspect measurements that are checked for interactions per measurement to be removed
+CANDIDATES_PER_REMOVAL = 5
+
 
 def estimate(net, init='flat', tolerance=1e-6, maximum_iterations=10,
-             calculate_voltage_angles=True, ref_power=1e6):
+             calculate_voltage_angles=True, ref_power=1e6, linear_solver="superlu",
+             algorithm="wls"):
     """
     Wrapper function for WLS state estimation.
 
@@ -47,10 +60,20 @@ def estimate(net, init='flat', tolerance=1e-6, maximum_iterations=10,
         **calculate_voltage_angles** - (boolean) - Take into account absolute voltage angles and phase
         shifts in transformers, if init is 'slack'. Default is True.
 
+        **linear_solver** - (string) - Sparse linear solver for the gain matrix, see
+        pandapower.pf.linear_solver. As the gain matrix is symmetric positive definite, "cholmod"
+        (scikit-sparse) can be used. Default is "superlu".
+
+        **algorithm** - (string) - "wls" for the Newton WLS estimation with the full Jacobian in
+        every iteration or "fd" for the fast-decoupled WLS estimation with constant P-theta and
+        Q-V gain matrices, which are factorized only once. The fast-decoupled estimation needs
+        more, but much cheaper iterations. Default is "wls".
+
     OUTPUT:
         **successful** (boolean) - Was the state estimation successful?
     """
-    wls = state_estimation(tolerance, maximum_iterations, net, ref_power=ref_power)
+    wls = state_estimation(tolerance, maximum_iterations, net, ref_power=ref_power,
+                           linear_solver=linear_solver, algorithm=algorithm)
     v_start = None
     delta_start = None
     if init == 'results':
@@ -67,7 +90,8 @@ def estimate(net, init='flat', tolerance=1e-6, maximum_iterations=10,
 
 
 def remove_bad_data(net, init='flat', tolerance=1e-6, maximum_iterations=10,
-                    calculate_voltage_angles=True, rn_max_threshold=3.0, ref_power=1e6):
+                    calculate_voltage_angles=True, rn_max_threshold=3.0, ref_power=1e6,
+                    linear_solver="superlu", max_removed_per_pass=1):
     """
     Wrapper function for bad data removal.
 
@@ -87,17 +111,25 @@ def remove_bad_data(net, init='flat', tolerance=1e-6, maximum_iterations=10,
         **calculate_voltage_angles** - (boolean) - Take into account absolute voltage angles and phase
         shifts in transformers, if init is 'slack'. Default is True.
 
+        **linear_solver** - (string) - Sparse linear solver for the gain matrix, see
+        pandapower.pf.linear_solver. As the gain matrix is symmetric positive definite, "cholmod"
+        (scikit-sparse) can be used. Default is "superlu".
+
         **rn_max_threshold** (float) - Identification threshold to determine
         if the largest normalized residual reflects a bad measurement
         (default value of 3.0)
 
-        **chi2_prob_false** (float) - probability of error / false alarms
-        (default value: 0.05)
+        **max_removed_per_pass** (int) - Maximum number of non-interacting suspect measurements
+        that are removed at once (default value of 1)
 
     OUTPUT:
         **successful** (boolean) - Was the state estimation successful?
     """
-    wls = state_estimation(tolerance, maximum_iterations, net, ref_power=ref_power)
+    if max_removed_per_pass < 1:
+        raise ValueError("max_removed_per_pass has to be at least 1, not %s"
+                         % max_removed_per_pass)
+    wls = state_estimation(tolerance, maximum_iterations, net, ref_power=ref_power,
+                           linear_solver=linear_solver)
     v_start = None
     delta_start = None
     if init == 'results':
@@ -111,11 +143,12 @@ def remove_bad_data(net, init='flat', tolerance=1e-6, maximum_iterations=10,
     elif init != 'flat':
         raise UserWarning("Unsupported init value. Using flat initialization.")
     return wls.perform_rn_max_test(v_start, delta_start, calculate_voltage_angles,
-                                   rn_max_threshold)
+                                   rn_max_threshold, max_removed_per_pass)
 
 
 def chi2_analysis(net, init='flat', tolerance=1e-6, maximum_iterations=10,
-                  calculate_voltage_angles=True, chi2_prob_false=0.05, ref_power=1e6):
+                  calculate_voltage_angles=True, chi2_prob_false=0.05, ref_power=1e6,
+                  linear_solver="superlu"):
     """
     Wrapper function for the chi-squared test.
 
@@ -135,13 +168,18 @@ def chi2_analysis(net, init='flat', tolerance=1e-6, maximum_iterations=10,
         **calculate_voltage_angles** - (boolean) - Take into account absolute voltage angles and phase
         shifts in transformers, if init is 'slack'. Default is True.
 
+        **linear_solver** - (string) - Sparse linear solver for the gain matrix, see
+        pandapower.pf.linear_solver. As the gain matrix is symmetric positive definite, "cholmod"
+        (scikit-sparse) can be used. Default is "superlu".
+
         **chi2_prob_false** (float) - probability of error / false alarms
         (default value: 0.05)
 
     OUTPUT:
         **bad_data_detected** (boolean) - Returns true if bad data has been detected
     """
-    wls = state_estimation(tolerance, maximum_iterations, net, ref_power=ref_power)
+    wls = state_estimation(tolerance, maximum_iterations, net, ref_power=ref_power,
+                           linear_solver=linear_solver)
     v_start = None
     delta_start = None
     if init == 'results':
@@ -165,7 +203,10 @@ class state_estimation(object):
     system according to the users needs while one function is used for the actual estimation
     process.
     """
-    def __init__(self, tolerance=1e-6, maximum_iterations=10, net=None, logger=None, ref_power=1e6):
+    def __init__(self, tolerance=1e-6, maximum_iterations=10, net=None, logger=None, ref_power=1e6,
+                 linear_solver="superlu", algorithm="wls"):
+        if algorithm not in ("wls", "fd"):
+            raise UserWarning("Unsupported algorithm %s, use 'wls' or 'fd'" % algorithm)
         self.logger = logger
         if self.logger is None:
             self.logger = std_logger
@@ -174,6 +215,8 @@ class state_estimation(object):
         self.max_iterations = maximum_iterations
         self.net = net
         self.s_ref = ref_power
+        self.linear_solver = linear_solver
+        self.algorithm = algorithm
         self.s_node_powers = None
         # variables for chi^2 / rn_max tests
         self.hx = None
@@ -186,6 +229,11 @@ class state_estimation(object):
         self.pp_meas_indices = None
         self.delta = None
         self.bad_data_present = None
+        # linear solver of the gain matrix and the sparsity pattern of its last factorization
+        self._solver = None
+        self._gain_pattern = None
+        # factorized constant gain matrices of the fast-decoupled estimation
+        self._fd_gains = None
 
     def estimate(self, v_start=None, delta_start=None, calculate_voltage_angles=True):
         """
@@ -230,6 +278,41 @@ class state_estimation(object):
         if self.net is None:
             raise UserWarning("Component was not initialized with a network.")
         t0 = time()
+
+        # initialize result tables if not existent
+        _copy_power_flow_results(self.net)
+
+        ppc, ppci, sem, z, self.pp_meas_indices, r_cov = \
+            self._create_model(v_start, delta_start, calculate_voltage_angles)
+
+        # Check if observability criterion is fulfilled and the state estimation is possible
+        if not self._check_observability(ppci, z):
+            return False
+
+        # set the starting values for all active buses
+        v_m = ppci["bus"][:, 7]
+        delta = ppci["bus"][:, 8] * np.pi / 180  # convert to rad
+
+        # new factorization of the gain matrix, whose ordering is reused in the iterations
+        self._solver = get_linear_solver(self.linear_solver)
+        self._gain_pattern = None
+        self._fd_gains = None
+
+        try:
+            successful, cur_it, v_m, delta = self._iterate(sem, z, r_cov, v_m, delta)
+        except np.linalg.linalg.LinAlgError:
+            self.logger.error("A problem appeared while using the linear algebra methods."
+                              "Check and change the measurement set.")
+            return False
+        self._write_results(ppc, ppci, sem, v_m, delta, successful, cur_it, t0)
+        return successful
+
+    def _create_model(self, v_start, delta_start, calculate_voltage_angles):
+        """
+        Converts the network and its measurements to the ppci and creates the measurement vector,
+        the pandapower indices of the measurements, their standard deviations and the matrix
+        calculation object.
+        """
         # add initial values for V and delta
         # node voltages
         # V<delta
@@ -238,9 +321,6 @@ class state_estimation(object):
         if delta_start is None:
             delta_start = np.zeros(self.net.bus.shape[0])
 
-        # initialize result tables if not existent
-        _copy_power_flow_results(self.net)
-
         # initialize ppc
         ppc, ppci = _init_ppc(self.net, v_start, delta_start, calculate_voltage_angles)
 
@@ -248,34 +328,44 @@ class state_estimation(object):
         ppci = _add_measurements_to_ppc(self.net, ppci, self.s_ref)
 
         # calculate relevant vectors from ppci measurements
-        z, self.pp_meas_indices, r_cov = _build_measurement_vectors(ppci)
+        z, pp_meas_indices, r_cov = _build_measurement_vectors(ppci)
 
-        # number of nodes
-        n_active = len(np.where(ppci["bus"][:, 1] != 4)[0])
         slack_buses = np.where(ppci["bus"][:, 1] == 3)[0]
+        non_slack_buses = np.setdiff1d(np.arange(ppci["bus"].shape[0]), slack_buses)
 
-        # Check if observability criterion is fulfilled and the state estimation is possible
+        # matrix calculation object
+        sem = wls_matrix_ops(ppci, slack_buses, non_slack_buses, self.s_ref)
+        return ppc, ppci, sem, z, pp_meas_indices, r_cov
+
+    def _check_observability(self, ppci, z):
+        # number of nodes
+        n_active = len(np.where(ppci["bus"][:, 1] != 4)[0])
         if len(z) < 2 * n_active - 1:
             self.logger.error("System is not observable (cancelling)")
             self.logger.error("Measurements available: %d. Measurements required: %d" %
                               (len(z), 2 * n_active - 1))
             return False
+        return True
 
-        # set the starting values for all active buses
-        v_m = ppci["bus"][:, 7]
-        delta = ppci["bus"][:, 8] * np.pi / 180  # convert to rad
-        delta_masked = np.ma.array(delta, mask=False)
-        delta_masked.mask[slack_buses] = True
-        non_slack_buses = np.arange(len(delta))[~delta_masked.mask]
+    def _iterate(self, sem, z, r_cov, v_m, delta):
+        if self.algorithm == "fd":
+            return self._fd_iterations(sem, z, r_cov, v_m, delta)
+        return self._wls_iterations(sem, z, r_cov, v_m, delta)
 
-        # matrix calculation object
-        sem = wls_matrix_ops(ppci, slack_buses, non_slack_buses, self.s_ref)
+    def _wls_iterations(self, sem, z, r_cov, v_m, delta):
+        """
+        Gauss-Newton iterations of the WLS estimation from the given start values. Stores the
+        variables required for the chi^2 and r_N_max tests and returns whether the estimation
+        converged, the number of iterations and the estimated voltage magnitudes and angles.
+        """
+        non_slack_buses = sem.non_slack_buses
+        delta = delta.copy()
 
         # state vector
-        E = np.concatenate((delta_masked.compressed(), v_m))
+        E = np.concatenate((delta[non_slack_buses], v_m))
 
-        # invert covariance matrix
-        r_inv = csr_matrix(np.linalg.inv(np.diagflat(r_cov) ** 2))
+        # inverse of the diagonal covariance matrix
+        r_inv = diags(1 / r_cov ** 2, format="csr")
 
         current_error = 100.
         cur_it = 0
@@ -283,38 +373,32 @@ class state_estimation(object):
 
         while current_error > self.tolerance and cur_it < self.max_iterations:
             self.logger.debug(" Starting iteration %d" % (1 + cur_it))
-            try:
-                # create h(x) for the current iteration
-                h_x = sem.create_hx(v_m, delta)
+            # create h(x) for the current iteration
+            h_x = sem.create_hx(v_m, delta)
 
-                # residual r
-                r = csr_matrix(z - h_x).T
+            # residual r
+            r = z - h_x
 
-                # jacobian matrix H
-                H = csr_matrix(sem.create_jacobian(v_m, delta))
+            # jacobian matrix H
+            H = sem.create_jacobian(v_m, delta)
 
-                # gain matrix G_m
-                # G_m = H^t * R^-1 * H
-                G_m = H.T * (r_inv * H)
+            # gain matrix G_m
+            # G_m = H^t * R^-1 * H
+            G_m = H.T * (r_inv * H)
 
-                # state vector difference d_E
-                # d_E = G_m^-1 * (H' * R^-1 * r)
-                d_E = spsolve(G_m, H.T * (r_inv * r))
-                E += d_E
+            # state vector difference d_E
+            # d_E = G_m^-1 * (H' * R^-1 * r)
+            d_E = self._solve_gain_matrix(G_m, H.T * (r_inv * r))
+            E += d_E
 
-                # update V/delta
-                delta[non_slack_buses] = E[:len(non_slack_buses)]
-                v_m = np.squeeze(E[len(non_slack_buses):])
+            # update V/delta
+            delta[non_slack_buses] = E[:len(non_slack_buses)]
+            v_m = np.squeeze(E[len(non_slack_buses):])
 
-                # prepare next iteration
-                cur_it += 1
-                current_error = np.max(np.abs(d_E))
-                self.logger.debug("Current error: %.7f" % current_error)
-
-            except np.linalg.linalg.LinAlgError:
-                self.logger.error("A problem appeared while using the linear algebra methods."
-                                  "Check and change the measurement set.")
-                return False
+            # prepare next iteration
+            cur_it += 1
+            current_error = np.max(np.abs(d_E))
+            self.logger.debug("Current error: %.7f" % current_error)
 
         # print output for results
         if current_error <= self.tolerance:
@@ -325,12 +409,114 @@ class state_estimation(object):
             self.logger.debug("WLS State Estimation not successful (%d/%d iterations)" %
                               (cur_it, self.max_iterations))
 
+        self._store_test_variables(r_inv, G_m, r, H, h_x, v_m, delta)
+        return successful, cur_it, v_m, delta
+
+    def _fd_iterations(self, sem, z, r_cov, v_m, delta):
+        """
+        Fast-decoupled WLS iterations from the given start values. The active power measurements
+        only update the voltage angles and the reactive power and voltage measurements only the
+        voltage magnitudes, with the constant gain matrices
+
+            G_P = H_P,theta^T * R_P^-1 * H_P,theta and G_Q = H_Q,V^T * R_Q^-1 * H_Q,V
+
+        of the Jacobian at the start values. They are factorized in the first call and reused
+        until the weights change. Current magnitude measurements are not part of the decoupled
+        models, but of the residuals and the tests for bad data.
+        """
+        non_slack_buses = sem.non_slack_buses
+        n_theta = len(non_slack_buses)
+        delta = delta.copy()
+        # rows of the active and reactive measurements in z = [p_i p_ij q_i q_ij U i_ij]
+        n_p = len(sem.p_bus) + len(sem.p_from) + len(sem.p_to)
+        n_q = len(sem.q_bus) + len(sem.q_from) + len(sem.q_to) + len(sem.v_bus)
+        p_rows, q_rows = slice(0, n_p), slice(n_p, n_p + n_q)
+        w = 1 / r_cov ** 2
+
+        if self._fd_gains is None:
+            H = sem.create_jacobian(v_m, delta)
+            H_p = H[p_rows, :n_theta].tocsc()
+            H_q = H[q_rows, n_theta:].tocsc()
+            gains = []
+            for H_block, w_block in [(H_p, w[p_rows]), (H_q, w[q_rows])]:
+                solver = get_linear_solver(self.linear_solver)
+                solver.factorize((H_block.T * diags(w_block) * H_block).tocsc())
+                if not solver.is_factorized():
+                    raise np.linalg.linalg.LinAlgError("Decoupled gain matrix is singular")
+                gains.append((H_block.T.tocsr(), solver))
+            self._fd_gains = gains
+        (H_p_t, solver_p), (H_q_t, solver_q) = self._fd_gains
+
+        current_error = 100.
+        cur_it = 0
+        while current_error > self.tolerance and cur_it < self.max_iterations:
+            self.logger.debug(" Starting iteration %d" % (1 + cur_it))
+            # P-theta half iteration
+            r = z - sem.create_hx(v_m, delta)
+            d_theta = solver_p.solve(H_p_t * (w[p_rows] * r[p_rows]))
+            delta[non_slack_buses] += d_theta
+
+            # Q-V half iteration with the updated voltage angles
+            r = z - sem.create_hx(v_m, delta)
+            d_v = solver_q.solve(H_q_t * (w[q_rows] * r[q_rows]))
+            v_m = v_m + d_v
+
+            cur_it += 1
+            current_error = max(np.max(np.abs(d_theta), initial=0.), np.max(np.abs(d_v)))
+            self.logger.debug("Current error: %.7f" % current_error)
+
+        if current_error <= self.tolerance:
+            successful = True
+            self.logger.debug("Fast-decoupled WLS State Estimation successful (%d iterations)"
+                              % cur_it)
+        else:
+            successful = False
+            self.logger.debug("Fast-decoupled WLS State Estimation not successful (%d/%d "
+                              "iterations)" % (cur_it, self.max_iterations))
+
+        # the tests for bad data use the full Jacobian of the estimated state
+        r_inv = diags(w, format="csr")
+        h_x = sem.create_hx(v_m, delta)
+        H = sem.create_jacobian(v_m, delta)
+        self._store_test_variables(r_inv, H.T * (r_inv * H), z - h_x, H, h_x, v_m, delta)
+        return successful, cur_it, v_m, delta
+
+    def _store_test_variables(self, r_inv, G_m, r, H, h_x, v_m, delta):
+        # store variables required for chi^2 and r_N_max test (R_inv, Gm, H and Ht are sparse):
+        self.R_inv = r_inv
+        self.Gm = G_m
+        self.r = r[:, np.newaxis]
+        self.H = H
+        self.Ht = H.T
+        self.hx = h_x
+        self.V = v_m
+        self.delta = delta
+
+    def _solve_gain_matrix(self, G_m, b):
+        """
+        Solves G_m * x = b. The gain matrix is only refactorized with the ordering of the last
+        factorization as long as its sparsity pattern does not change.
+        """
+        G_m = G_m.tocsc()
+        G_m.sort_indices()
+        pattern = self._gain_pattern
+        if pattern is not None and np.array_equal(pattern[0], G_m.indptr) and \
+                np.array_equal(pattern[1], G_m.indices):
+            self._solver.refactorize(G_m)
+        else:
+            self._solver.factorize(G_m)
+            self._gain_pattern = (G_m.indptr.copy(), G_m.indices.copy())
+        return self._solver.solve(b)
+
+    def _write_results(self, ppc, ppci, sem, v_m, delta, successful, cur_it, t0):
+        """
+        Calculates the bus power injections and branch flows of the estimated state and writes
+        them to the res_*_est tables of the network.
+        """
         # store results for all elements
         # calculate bus power injections
         v_cpx = v_m * np.exp(1j * delta)
-        bus_powers_conj = np.zeros(len(v_cpx), dtype=np.complex128)
-        for i in range(len(v_cpx)):
-            bus_powers_conj[i] = np.dot(sem.Y_bus[i, :], v_cpx) * np.conjugate(v_cpx[i])
+        bus_powers_conj = (sem.Y_bus * v_cpx) * np.conjugate(v_cpx)
 
         ppci["bus"][:, 2] = bus_powers_conj.real  # saved in per unit
         ppci["bus"][:, 3] = - bus_powers_conj.imag  # saved in per unit
@@ -369,24 +555,12 @@ class state_estimation(object):
         self.net.res_bus_est.q_kvar = - get_values(ppc["bus"][:, 3], self.net.bus.index.values,
                                                    mapping_table) * self.s_ref / 1e3
 
-        # store variables required for chi^2 and r_N_max test:
-        self.R_inv = r_inv.toarray()
-        self.Gm = G_m.toarray()
-        self.r = r.toarray()
-        self.H = H.toarray()
-        self.Ht = self.H.T
-        self.hx = h_x
-        self.V = v_m
-        self.delta = delta
-
         # delete results which are not correctly calculated
         for k in list(self.net.keys()):
             if k.startswith("res_") and k.endswith("_est") and \
                     k not in ("res_bus_est", "res_line_est", "res_trafo_est", "res_trafo3w_est"):
                 del self.net[k]
 
-        return successful
-
     def perform_chi2_test(self, v_in_out=None, delta_in_out=None,
                           calculate_voltage_angles=True, chi2_prob_false=0.05):
         """
@@ -431,7 +605,7 @@ class state_estimation(object):
         self.estimate(v_in_out, delta_in_out, calculate_voltage_angles)
 
         # Performance index J(hx)
-        J = np.dot(self.r.T, np.dot(self.R_inv, self.r))
+        J = np.dot(self.r.T, self.R_inv * self.r)
 
         # Number of measurements
         m = len(self.net.measurement)
@@ -460,7 +634,8 @@ class state_estimation(object):
             return self.bad_data_present
 
     def perform_rn_max_test(self, v_in_out=None, delta_in_out=None,
-                            calculate_voltage_angles=True, rn_max_threshold=3.0):
+                            calculate_voltage_angles=True, rn_max_threshold=3.0,
+                            max_removed_per_pass=1):
         """
         The function perform_rn_max_test performs a largest normalized residual test for bad data
         identification and removal. It takes two input arguments: v_in_out and delta_in_out.
@@ -472,6 +647,12 @@ class state_estimation(object):
         which can be modified), performs the state estimation again,
         and so on and so forth until no further bad data measurements are detected.
 
+        Only the diagonal of the residual covariance matrix is calculated with the sparse
+        factorization of the gain matrix. After the removal of suspect measurements, the
+        residuals and their covariances are updated by low-rank changes of the gain matrix, so
+        that the state estimation is only repeated when no further bad data is identified in the
+        updated linear model.
+
         INPUT:
             **v_in_out** (np.array, shape=(1,), optional) - Vector with initial values for all
             voltage magnitudes in p.u. (sorted by bus index)
@@ -487,8 +668,9 @@ class state_estimation(object):
             if the largest normalized residual reflects a bad measurement
             (standard value of 3.0)
 
-            **chi2_prob_false** (float) - probability of error / false alarms
-            (standard value: 0.05)
+            **max_removed_per_pass** (int) - maximum number of suspect measurements that are
+            removed at once. Only measurements whose residuals do not interact (correlation
+            coefficient of the residuals below 0.1) are removed together (standard value: 1)
 
         OUTPUT:
             **successful** (boolean) - True if all bad data could be removed
@@ -497,6 +679,9 @@ class state_estimation(object):
             perform_rn_max_test(np.array([1.0, 1.0, 1.0]), np.array([0.0, 0.0, 0.0]), 5.0, 0.05)
 
         """
+        if max_removed_per_pass < 1:
+            raise ValueError("max_removed_per_pass has to be at least 1, not %s"
+                             % max_removed_per_pass)
         # 'flat'-start conditions
         if v_in_out is None:
             v_in_out = np.ones(self.net.bus.shape[0])
@@ -515,57 +700,280 @@ class state_estimation(object):
 
             # Try to remove the bad data
             try:
-                # Error covariance matrix:
-                R = np.linalg.inv(self.R_inv)
-
-                # for future debugging: this line's results have changed with the ppc
-                # overhaul in April 2017 after commit 9ae5b8f42f69ae39f8c8cf (which still works)
-                # there are differences of < 1e-10 for the Omega entries which cause
-                # the function to work far worse. As of now it is unclear if it's just numerical
-                # accuracy to blame or an error in the code. a sort in the ppc creation function
-                # was removed which caused this issue
-                # Covariance matrix of the residuals: \Omega = S*R = R - H*G^(-1)*H^T
-                # (S is the sensitivity matrix: r = S*e):
-                Omega = R - np.dot(self.H, np.dot(np.linalg.inv(self.Gm), self.Ht))
-
-                # Diagonalize \Omega:
-                Omega = np.diag(np.diag(Omega))
-
-                # Compute squareroot (|.| since some -0.0 produced nans):
-                Omega = np.sqrt(np.absolute(Omega))
-
-                OmegaInv = np.linalg.inv(Omega)
-
-                # Compute normalized residuals (r^N_i = |r_i|/sqrt{Omega_ii}):
-                rN = np.dot(OmegaInv, np.absolute(self.r))
-
-                if max(rN) <= rn_max_threshold:
-                    self.logger.debug("Largest normalized residual test passed. "
-                                      "No bad data detected.")
-                    return True
-                else:
-                    self.logger.debug(
-                        "Largest normalized residual test failed (%.1f > %.1f)."
-                        % (max(rN), rn_max_threshold))
-
-                    # Identify bad data: Determine index corresponding to max(rN):
-                    idx_rN = np.argsort(rN, axis=0)[-1]
-
-                    # Determine pandapower index of measurement to be removed:
-                    meas_idx = self.pp_meas_indices[idx_rN]
-
-                    # Remove bad measurement:
-                    self.logger.debug("Removing measurement: %s"
-                                      % self.net.measurement.loc[meas_idx].values[0])
-                    self.net.measurement.drop(meas_idx, inplace=True)
-                    self.logger.debug("Bad data removed from the set of measurements.")
-
+                bad_data = self._identify_bad_data(rn_max_threshold, max_removed_per_pass)
             except np.linalg.linalg.LinAlgError:
                 self.logger.error("A problem appeared while using the linear algebra methods."
                                   "Check and change the measurement set.")
                 return False
 
+            if not len(bad_data):
+                self.logger.debug("Largest normalized residual test passed. "
+                                  "No bad data detected.")
+                return True
+
+            # Determine pandapower indices of the measurements to be removed:
+            meas_idx = self.pp_meas_indices[bad_data].astype(int)
+
+            # Remove bad measurements:
+            self.logger.debug("Removing measurements: %s" % list(meas_idx))
+            self.net.measurement.drop(meas_idx, inplace=True)
+            self.logger.debug("Bad data removed from the set of measurements.")
+
             self.logger.debug("rN_max identification threshold: %.2f" % rn_max_threshold)
             num_iterations += 1
 
         return False
+
+    def _identify_bad_data(self, rn_max_threshold, max_removed_per_pass):
+        """
+        Largest normalized residual test on the linearized model of the last estimation. Returns
+        the positions of the bad measurements in the measurement vector.
+
+        The measurements with the largest normalized residual r_i / sqrt(Omega_ii) are removed
+        (up to max_removed_per_pass non-interacting ones at once) until the test passes. Instead
+        of a new estimation, the residuals and the covariance Omega = R - H * Gm^-1 * H^T are
+        updated with the Woodbury identity for the gain matrix without the removed measurements S:
+
+            (Gm - H_S^T * R_S^-1 * H_S)^-1 = Gm^-1 + K * Omega_SS^-1 * K^T, K = Gm^-1 * H_S^T
+
+        so that only the columns K of the removed measurements are solved with the factorization
+        of the gain matrix.
+        """
+        H = self.H.tocsr()
+        R = 1 / self.R_inv.diagonal()
+        solver = get_linear_solver(self.linear_solver)
+        solver.factorize(self.Gm.tocsc())
+        if not solver.is_factorized():
+            raise np.linalg.linalg.LinAlgError("The gain matrix is singular")
+        # residuals and their covariances of the last estimation
+        r_0 = self.r.ravel()
+        omega_0 = R - _diagonal_of_h_ginv_ht(H, solver)
+        r, omega = r_0, omega_0
+        # removed measurements S and H * K
+        removed = np.array([], dtype=np.int64)
+        HK = np.zeros((H.shape[0], 0))
+        omega_s = np.zeros((0, 0))
+        # measurements without pandapower index (virtual measurements of artificial buses) and
+        # critical measurements with vanishing residual covariance cannot be identified
+        identifiable = self.pp_meas_indices >= 0
+        # at least as many measurements as state variables have to remain
+        max_removed = H.shape[0] - H.shape[1]
+
+        while len(removed) < max_removed:
+            valid = identifiable & (np.abs(omega) > OMEGA_TOLERANCE * R)
+            valid[removed] = False
+            r_n = np.zeros(len(r))
+            r_n[valid] = np.abs(r[valid]) / np.sqrt(np.abs(omega[valid]))
+            if np.max(r_n) <= rn_max_threshold:
+                break
+            self.logger.debug("Largest normalized residual test failed (%.1f > %.1f)."
+                              % (np.max(r_n), rn_max_threshold))
+
+            # candidates in the order of their normalized residuals and their columns of H * K
+            n_candidates = min(max_removed_per_pass, max_removed - len(removed))
+            candidates = np.argsort(-r_n)[:np.count_nonzero(r_n > rn_max_threshold)]
+            candidates = candidates[:max(n_candidates, 1) * CANDIDATES_PER_REMOVAL]
+            HK_c = H * solver.solve_matrix(H[candidates].T.toarray())
+            # residual covariances between the candidates without the removed measurements
+            omega_c = np.diag(R[candidates]) - HK_c[candidates]
+            if len(removed):
+                omega_c -= HK[candidates].dot(np.linalg.solve(omega_s, HK[candidates].T))
+            selected = []
+            for c in range(len(candidates)):
+                if len(selected) == n_candidates:
+                    break
+                correlation = np.abs(omega_c[c, selected]) / \
+                    np.sqrt(np.abs(omega_c[c, c] * omega_c.diagonal()[selected]))
+                # the normalized residual of the candidate has to exceed the threshold even
+                # without the parts that can be smeared from the selected measurements
+                smeared = np.dot(correlation, r_n[candidates[selected]])
+                if not np.any(correlation > INTERACTION_TOLERANCE) and \
+                        r_n[candidates[c]] - smeared > rn_max_threshold:
+                    selected.append(c)
+            if not selected:
+                break
+
+            # low-rank update of the residuals and covariances for all removed measurements
+            removed = np.r_[removed, candidates[selected]]
+            HK = np.c_[HK, HK_c[:, selected]]
+            omega_s = np.diag(R[removed]) - HK[removed]
+            a = r_0[removed] / R[removed]
+            r = r_0 + HK.dot(a + np.linalg.solve(omega_s, HK[removed].T.dot(a)))
+            omega = omega_0 - np.sum(HK.T * np.linalg.solve(omega_s, HK.T), axis=0)
+        return removed
+
+
+class tracking_state_estimation(state_estimation):
+    """
+    WLS state estimation for consecutive measurement snapshots of an unchanged network and
+    measurement configuration, e.g. SCADA cycles that arrive every few seconds.
+
+    The ppci, the mapping of the measurements to the measurement vector and the matrix calculation
+    object are created only once in the first call of *track*. Each call of *track* only sets the
+    new measurement values, starts from the state of the last estimation and reuses the ordering
+    of the gain matrix factorization. If the topology (e.g. switches or elements in service) or the
+    set of measurements in net.measurement changes, *initialize* has to be called before the next
+    call of *track*.
+
+    EXAMPLE:
+        tse = tracking_state_estimation(net=net)
+
+        for values in scada_snapshots:
+            success = tse.track(values)
+
+            print(net.res_bus_est)
+    """
+    def __init__(self, tolerance=1e-6, maximum_iterations=10, net=None, logger=None, ref_power=1e6,
+                 linear_solver="superlu", algorithm="wls"):
+        super(tracking_state_estimation, self).__init__(tolerance, maximum_iterations, net,
+                                                        logger, ref_power, linear_solver,
+                                                        algorithm)
+        # pandapower indices of the measurements in the order of the values given to track
+        self.measurement_index = None
+        self._init = (None, None, True)
+        self._model = None
+
+    def initialize(self, v_start=None, delta_start=None, calculate_voltage_angles=True):
+        """
+        Sets the start values of the first estimation. The internal model is created from the
+        network and net.measurement at the next call of *track* and is used by all following
+        calls.
+
+        INPUT:
+            **v_start** (np.array, shape=(1,), optional) - Vector with initial values for all
+            voltage magnitudes in p.u. (sorted by bus index) for the first estimation
+
+            **delta_start** (np.array, shape=(1,), optional) - Vector with initial values for all
+            voltage angles in degrees (sorted by bus index) for the first estimation
+
+        OPTIONAL:
+            **calculate_voltage_angles** - (bool) - Take into account absolute voltage angles and
+            phase shifts in transformers Default is True.
+        """
+        self._init = (v_start, delta_start, calculate_voltage_angles)
+        self._model = None
+        self.V = None
+        self.delta = None
+
+    def _create_tracking_model(self):
+        ppc, ppci, sem, z, self.pp_meas_indices, r_cov = self._create_model(*self._init)
+
+        # positions of the measurements of the measurement vector in net.measurement (virtual
+        # measurements of artificial buses are not in net.measurement) and their conversion
+        # factors to per unit, which are the same for the values and the standard deviations
+        measurement = self.net.measurement
+        self.measurement_index = measurement.index.values.copy()
+        z_positions = np.flatnonzero(np.in1d(self.pp_meas_indices, self.measurement_index))
+        meas_positions = measurement.index.get_indexer(self.pp_meas_indices[z_positions])
+        z_to_pu = r_cov[z_positions] / measurement.std_dev.values[meas_positions]
+
+        # start values of the first estimation in the ppci order
+        v_start, delta_start = ppci["bus"][:, 7].copy(), ppci["bus"][:, 8] * np.pi / 180
+        bus_lookup = self.net["_pd2ppc_lookups"]["bus"][self.net.bus.index.values]
+        in_ppci = bus_lookup < len(v_start)
+        if self._init[0] is not None:
+            v_start[bus_lookup[in_ppci]] = np.asarray(self._init[0], dtype=np.float64)[in_ppci]
+        if self._init[1] is not None:
+            delta_start[bus_lookup[in_ppci]] = \
+                np.deg2rad(np.asarray(self._init[1], dtype=np.float64))[in_ppci]
+
+        self._model = {"ppc": ppc, "ppci": ppci, "sem": sem, "z": z, "r_cov": r_cov,
+                       "z_positions": z_positions, "meas_positions": meas_positions,
+                       "z_to_pu": z_to_pu, "v_start": v_start, "delta_start": delta_start,
+                       "options": dict(self.net["_options"]),
+                       "lookups": self.net["_pd2ppc_lookups"],
+                       "is_elements": self.net["_is_elements"],
+                       "observable": self._check_observability(ppci, z)}
+        self._solver = get_linear_solver(self.linear_solver)
+        self._gain_pattern = None
+        self._fd_gains = None
+
+    def track(self, values=None, std_dev=None):
+        """
+        Estimates the state for new measurement values, starting from the state of the last
+        estimation. The results are written to the res_*_est tables of the network like by
+        *estimate*.
+
+        OPTIONAL:
+            **values** (array or pandas.Series, None) - new measurement values in the units of
+            net.measurement, either as an array in the order of *measurement_index* (the index of
+            net.measurement when the model was created) or as a Series indexed by the measurement
+            index. If None, the values of the last call (or of net.measurement) are used.
+
+            **std_dev** (array or pandas.Series, None) - new standard deviations of the
+            measurements, given like the values
+
+        OUTPUT:
+            **successful** (boolean) - True if the estimation process was successful
+        """
+        if self.net is None:
+            raise UserWarning("Component was not initialized with a network.")
+        t0 = time()
+
+        # initialize result tables if not existent
+        _copy_power_flow_results(self.net)
+
+        if self._model is None:
+            self._create_tracking_model()
+        model = self._model
+        if not model["observable"]:
+            _rename_results(self.net)
+            return False
+        z, r_cov = model["z"], model["r_cov"]
+        z_positions, meas_positions = model["z_positions"], model["meas_positions"]
+        if values is not None:
+            z[z_positions] = self._measurement_array(values)[meas_positions] * model["z_to_pu"]
+        if std_dev is not None:
+            r_cov[z_positions] = self._measurement_array(std_dev)[meas_positions] * \
+                model["z_to_pu"]
+            # new weights of the constant fast-decoupled gain matrices
+            self._fd_gains = None
+
+        # warm start from the last estimated state, unless it failed
+        if self.V is not None and np.all(np.isfinite(self.V)) and \
+                np.all(np.isfinite(self.delta)):
+            v_m, delta = self.V, self.delta
+        else:
+            v_m, delta = model["v_start"], model["delta_start"]
+
+        self.net["_options"] = dict(model["options"])
+        self.net["_pd2ppc_lookups"] = model["lookups"]
+        self.net["_is_elements"] = model["is_elements"]
+        try:
+            successful, cur_it, v_m, delta = self._iterate(model["sem"], z, r_cov, v_m, delta)
+        except np.linalg.linalg.LinAlgError:
+            self.logger.error("A problem appeared while using the linear algebra methods."
+                              "Check and change the measurement set.")
+            _rename_results(self.net)
+            return False
+        self._write_results(model["ppc"], model["ppci"], model["sem"], v_m, delta, successful,
+                            cur_it, t0)
+        if not successful:
+            # the next cycle starts again from the initial state
+            self.V, self.delta = None, None
+        return successful
+
+    def _measurement_array(self, values):
+        if isinstance(values, pd.Series):
+            return values.loc[self.measurement_index].values.astype(np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape != self.measurement_index.shape:
+            raise ValueError("%d measurement values are given, %d are required"
+                             % (len(values), len(self.measurement_index)))
+        return values
+
+
+def _diagonal_of_h_ginv_ht(H, solver, block_size=None):
+    """
+    Diagonal of H * Gm^-1 * H^T, calculated with solves of the factorized gain matrix for blocks
+    of block_size columns of H^T. If block_size is None, the dense blocks of Gm^-1 * H^T have at
+    most GAIN_BLOCK_ENTRIES entries.
+    """
+    Ht = H.T.tocsc()
+    n, m = Ht.shape
+    block = block_size or max(1, GAIN_BLOCK_ENTRIES // max(n, 1))
+    diagonal = np.empty(m)
+    for i in range(0, m, block):
+        Ht_block = Ht[:, i:i + block].toarray()
+        diagonal[i:i + block] = np.sum(Ht_block * solver.solve_matrix(Ht_block), axis=0)
+    return diagonal
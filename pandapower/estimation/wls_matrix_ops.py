@@ -6,10 +6,12 @@
 
 import warnings
 import numpy as np
+from scipy.sparse import csr_matrix, hstack, vstack
 from pandapower.estimation.idx_bus import *
 from pandapower.estimation.idx_brch import *
 from pandapower.idx_brch import branch_cols
 from pandapower.idx_bus import bus_cols
+from pandapower.pf.dSbus_dV_pypower import dSbus_dV_sparse
 try:
     from pandapower.pf.makeYbus import makeYbus
 except ImportError:
@@ -17,6 +19,11 @@ except ImportError:
 
 
 class wls_matrix_ops:
+    """
+    Measurement function h(x) and its Jacobian for the WLS state estimation. Both are calculated
+    branch-wise with the sparse Ybus, Yf and Yt, so that memory and time scale with the number of
+    branches and measurements instead of the square of the number of buses.
+    """
     def __init__(self, ppc, slack_buses, non_slack_buses, s_ref):
         np.seterr(divide='ignore', invalid='ignore')
         self.ppc = ppc
@@ -26,20 +33,13 @@ class wls_matrix_ops:
         self.Y_bus = None
         self.Yf = None
         self.Yt = None
-        self.G = None
-        self.B = None
-        self.G_series = None
-        self.B_series = None
-        self.G_shunt = None
-        self.B_shunt = None
-        self.keep_ix = None
         self.i_ij = None
         self.fb = None
         self.tb = None
         self.create_y()
+        self._set_measurement_indices()
 
-    # Function which builds a node admittance matrix out of the topology data
-    # In addition, it provides the series admittances of lines as G_series and B_series
+    # Function which builds the sparse node and branch admittance matrices out of the topology data
     def create_y(self):
         self.fb = self.ppc["branch"][:, 0].real.astype(int)
         self.tb = self.ppc["branch"][:, 1].real.astype(int)
@@ -48,259 +48,106 @@ class wls_matrix_ops:
             warnings.simplefilter("ignore")
             y_bus, y_f, y_t = makeYbus(self.baseMVA, self.ppc["bus"], self.ppc["branch"])
 
-        # create relevant matrices
-        self.Y_bus = y_bus.toarray()
-        self.Yf = y_f
-        self.Yt = y_t
-        self.G = self.Y_bus.real
-        self.B = self.Y_bus.imag
-        n = len(self.ppc["bus"])
-        self.G_series = - self.G
-        np.fill_diagonal(self.G_series, 0.)
-        self.B_series = - self.B
-        np.fill_diagonal(self.B_series, 0.)
-        # In case that's becoming relevant later, G_shunt will not be removed
-        self.G_shunt = np.zeros_like(self.G)
-        self.B_shunt = np.zeros((n, n))
-        from_to = np.concatenate((self.fb, self.tb))
-        to_from = np.concatenate((self.tb, self.fb))
-        self.B_shunt[from_to, to_from] = np.tile(0.5 * self.ppc["branch"][:, 4].real, 2)
+        self.Y_bus = y_bus.tocsr()
+        self.Yf = y_f.tocsr()
+        self.Yt = y_t.tocsr()
 
     # Get Y as tuple (real, imaginary)
     def get_y(self):
-        return self.G, self.B
+        return self.Y_bus.real, self.Y_bus.imag
+
+    def _set_measurement_indices(self):
+        # measured buses and branches in the order of the measurement vector z
+        # [p_i p_ij q_i q_ij U i_ij], branch measurements with the from side first
+        bus, branch = self.ppc["bus"], self.ppc["branch"]
+        self.p_bus = np.flatnonzero(~np.isnan(bus[:, bus_cols + P]))
+        self.q_bus = np.flatnonzero(~np.isnan(bus[:, bus_cols + Q]))
+        self.v_bus = np.flatnonzero(~np.isnan(bus[:, bus_cols + VM]))
+        self.p_from = np.flatnonzero(~np.isnan(branch[:, branch_cols + P_FROM]))
+        self.p_to = np.flatnonzero(~np.isnan(branch[:, branch_cols + P_TO]))
+        self.q_from = np.flatnonzero(~np.isnan(branch[:, branch_cols + Q_FROM]))
+        self.q_to = np.flatnonzero(~np.isnan(branch[:, branch_cols + Q_TO]))
+        self.i_from = np.flatnonzero(~np.isnan(branch[:, branch_cols + IM_FROM]))
+        self.i_to = np.flatnonzero(~np.isnan(branch[:, branch_cols + IM_TO]))
 
     # Creates h(x), depending on the current U and delta and the static topology data
     def create_hx(self, v, delta):
-        deltas = delta[:, np.newaxis] - delta
-        cos_delta = np.cos(deltas)
-        sin_delta = np.sin(deltas)
-        vi_vj = np.outer(v, v)
-
-        # Power flow from node i to node j
-        # p_ij = (np.multiply((self.G_series + self.G_shunt).T, v ** 2).T - vi_vj *
-        #         (self.G_series * cos_delta + self.B_series * sin_delta))
-        # q_ij = (-1 * np.multiply((self.B_series + self.B_shunt).T, v ** 2).T - vi_vj *
-        #         (self.G_series * sin_delta - self.B_series * cos_delta))
-
         V = v * np.exp(1j * delta)
-        s_ij = np.zeros_like(deltas, dtype=complex)
-        s_ij[self.fb, self.tb] = V[self.fb] * np.conj(self.Yf * V)
-        s_ij[self.tb, self.fb] = V[self.tb] * np.conj(self.Yt * V)
-
-        # Bus powers:
-        p_i = np.sum(vi_vj * (self.G * cos_delta + self.B * sin_delta), axis=1)
-        q_i = np.sum(vi_vj * (self.G * sin_delta - self.B * cos_delta), axis=1)
-        self.i_ij = np.divide(np.sqrt(np.float64(s_ij.real ** 2 + s_ij.imag ** 2)).T, v).T
-
-        # Build h(x) from measurements
-        # [p_i p_ij q_i q_ij U i_ij]
-
-        # P line
-        not_nan = ~np.isnan(self.ppc["branch"][:, branch_cols + P_FROM])
-        p_first_ix = self.ppc["branch"][not_nan, 0].real.astype(int)
-        p_second_ix = self.ppc["branch"][not_nan, 1].real.astype(int)
-        not_nan = ~np.isnan(self.ppc["branch"][:, branch_cols + P_TO])
-        p_first_ix = np.append(p_first_ix, self.ppc["branch"][not_nan, 1].real.astype(int))
-        p_second_ix = np.append(p_second_ix, self.ppc["branch"][not_nan, 0].real.astype(int))
-
-        # Q line
-        not_nan = ~np.isnan(self.ppc["branch"][:, branch_cols + Q_FROM])
-        q_first_ix = self.ppc["branch"][not_nan, 0].real.astype(int)
-        q_second_ix = self.ppc["branch"][not_nan, 1].real.astype(int)
-        not_nan = ~np.isnan(self.ppc["branch"][:, branch_cols + Q_TO])
-        q_first_ix = np.append(q_first_ix, self.ppc["branch"][not_nan, 1].real.astype(int))
-        q_second_ix = np.append(q_second_ix, self.ppc["branch"][not_nan, 0].real.astype(int))
-
-        # I line
-        not_nan = ~np.isnan(self.ppc["branch"][:, branch_cols + IM_FROM])
-        i_first_ix = self.ppc["branch"][not_nan, 0].real.astype(int)
-        i_second_ix = self.ppc["branch"][not_nan, 1].real.astype(int)
-        not_nan = ~np.isnan(self.ppc["branch"][:, branch_cols + IM_TO])
-        i_first_ix = np.append(i_first_ix, self.ppc["branch"][not_nan, 1].real.astype(int))
-        i_second_ix = np.append(i_second_ix, self.ppc["branch"][not_nan, 0].real.astype(int))
 
-        v_bus_not_nan = ~np.isnan(self.ppc["bus"][:, bus_cols + VM])
-        p_bus_not_nan = ~np.isnan(self.ppc["bus"][:, bus_cols + P])
-        q_bus_not_nan = ~np.isnan(self.ppc["bus"][:, bus_cols + Q])
-
-        hx = np.hstack((p_i[p_bus_not_nan],
-                        s_ij.real[p_first_ix, p_second_ix],
-                        q_i[q_bus_not_nan],
-                        s_ij.imag[q_first_ix, q_second_ix],
-                        v[v_bus_not_nan],
-                        self.i_ij[i_first_ix, i_second_ix]))
+        # Bus powers and branch power flows at the from and to buses
+        s_bus = V * np.conj(self.Y_bus * V)
+        i_f = self.Yf * V
+        i_t = self.Yt * V
+        s_f = V[self.fb] * np.conj(i_f)
+        s_t = V[self.tb] * np.conj(i_t)
+        self.i_ij = (np.abs(i_f), np.abs(i_t))
+
+        hx = np.hstack((s_bus.real[self.p_bus],
+                        s_f.real[self.p_from],
+                        s_t.real[self.p_to],
+                        s_bus.imag[self.q_bus],
+                        s_f.imag[self.q_from],
+                        s_t.imag[self.q_to],
+                        v[self.v_bus],
+                        self.i_ij[0][self.i_from],
+                        self.i_ij[1][self.i_to]))
 
         return hx
 
-    # Create Jacobian matrix
+    # Create the sparse Jacobian matrix with the columns [delta of non slack buses, U]
     def create_jacobian(self, v, delta):
         n = len(self.ppc["bus"])
-        G = self.G
-        B = self.B
-        G_series = self.G_series
-        B_series = self.B_series
-        G_shunt = self.G_shunt
-        B_shunt = self.B_shunt
-
-        # Create Jacobi Matrix
-        # Source: p.23; Power System State Estimation by Ali Abur
-
-        deltas = delta[:, np.newaxis] - delta  # delta_i - delta_j
-        cos_delta = np.cos(deltas)  # cos(delta_i - delta_j)
-        sin_delta = np.sin(deltas)  # sin(delta_i - delta_j)
-        vi_vj = np.outer(v, v)  # Ui * Uj
-        diag_n = np.arange(n)  # Used for indexing the diagonal of a n x n matrix
-
-        # Submatrices d(Pinj)/d(theta) and d(Pinj)/d(V)
-        H_dPinj_dth = vi_vj * (G * sin_delta - B * cos_delta)
-        H_dPinj_dth[diag_n, diag_n] = np.sum(vi_vj * (-G * sin_delta + B * cos_delta), axis=1) \
-                                      - (v ** 2 * B.diagonal())
-
-        H_dPinj_dU = np.multiply((G * cos_delta + B * sin_delta).T, v).T
-        H_dPinj_dU[diag_n, diag_n] = np.sum(v * (G * cos_delta + B * sin_delta), axis=1) \
-                                     + (v * G.diagonal())
-
-        # Submatrices d(Qinj)/d(theta) and d(Qinj)/d(V)
-        H_dQinj_dth = vi_vj * (-G * cos_delta - B * sin_delta)
-        H_dQinj_dth[diag_n, diag_n] = np.sum(vi_vj * (G * cos_delta + B * sin_delta), axis=1) \
-                                      - (v ** 2 * G.diagonal())
-
-        H_dQinj_dU = np.multiply((G * sin_delta - B * cos_delta).T, v).T
-        H_dQinj_dU[diag_n, diag_n] = np.sum(v * (G * sin_delta - B * cos_delta), axis=1) \
-                                     - (v * B.diagonal())
-
-        # Submatrices d(Pij)/d(theta) and d(Pij)/d(V)
-        # d(P01)/d(theta0) is at position H_dPij_dth_i[0,1]
-        # d(P23)/d(theta3) is at position H_dPij_dth_j[2,3]
-        # d(P23)/d(theta1) is 0 and not stored in the matrix
-
-        H_dPij_dth_i = vi_vj * (G_series * sin_delta - B_series * cos_delta)
-        H_dPij_dth_j = - H_dPij_dth_i
-
-        H_dPij_dU_i = (G_series * cos_delta + B_series * sin_delta) * -v + \
-                      2 * np.multiply((G_series+G_shunt).T, v).T
-        H_dPij_dU_j = np.multiply((G_series * cos_delta + B_series * sin_delta).T, -v).T
-
-        # Submatrices d(Qij)/d(theta) and d(Qij)/d(V)
-        # two columns, two derivatives (theta1, theta2) per line
-        # d(Q12)/d(theta_1) | d(Q12)/d(theta_2)
-        H_dQij_dth_i = -vi_vj * (G_series * cos_delta + B_series * sin_delta)
-        H_dQij_dth_j = -H_dQij_dth_i
+        V = v * np.exp(1j * delta)
 
-        H_dQij_dU_i = (G_series * sin_delta - B_series * cos_delta) * -v - \
-                      2 * np.multiply((B_series+B_shunt).T, v).T
-        H_dQij_dU_j = np.multiply((G_series * sin_delta - B_series * cos_delta).T, -v).T
+        # Submatrices d(Sinj)/d(theta) and d(Sinj)/d(V)
+        dSbus_dVm, dSbus_dVa = dSbus_dV_sparse(self.Y_bus, V)
 
-        # h_dPij_dth_i = v[self.fb] * v[self.tb] * np.exp(
-        #     1j * (delta[self.fb] - delta[self.tb] + np.pi / 2)) * self.Y_bus[
-        #                    self.fb, self.tb].conj()
-        # h_dPij_dth_j = v[self.fb] * v[self.tb] * np.exp(
-        #     1j * (delta[self.fb] - delta[self.tb] - np.pi / 2)) \
-        #                * self.Y_bus[self.fb, self.tb].conj()
+        # Submatrices d(Sij)/d(theta), d(Sij)/d(V), d(|Iij|)/d(theta) and d(|Iij|)/d(V) for the
+        # from and to sides
+        dSf_dVa, dSf_dVm, dIf_dVa, dIf_dVm = _dSbr_dV(self.Yf, self.fb, V)
+        dSt_dVa, dSt_dVm, dIt_dVa, dIt_dVm = _dSbr_dV(self.Yt, self.tb, V)
 
         # Submatrices d(Vi)/d(Vi..j)
-        H_dU_dU = np.eye(n)  # diagonally 1, otherwise 0
-        H_dU_dth = np.zeros((n, n))  # always 0
-
-        # Submatrices d(Iij)/d(theta) and d(Iij)/d(V)
-        # two columns, two derivatives (theta1, theta2) per line
-        # d(I12)/d(theta_1) | d(I12)/d(theta_2)
-        if not np.all(self.i_ij == 0.):
-            H_dIij_dth_i = np.divide((G_series**2 + B_series**2) * vi_vj * sin_delta, self.i_ij)
-            H_dIij_dth_j = -H_dIij_dth_i
-            H_dIij_dU_i = np.divide(G_series ** 2 + B_series ** 2, self.i_ij) * \
-                          (v - (v * cos_delta).T).T
-            H_dIij_dU_j = np.divide(G_series ** 2 + B_series ** 2, self.i_ij) * \
-                          (v - np.multiply(cos_delta.T, v).T)
-
-        # Build H dynamically from submatrices and measurements
-        columns = 2 * n - len(self.slack_buses)
-        range_theta = self.non_slack_buses
-        range_v = list(range(n))
-
-        h_mat = np.zeros((1, columns))  # create matrix with dummy line so that we can append to it
-
-        # if P bus measurements exist
-        p_bus_not_nan = ~np.isnan(self.ppc["bus"][:, bus_cols + 2])
-        if True in p_bus_not_nan:
-            nodes = np.arange(n)[p_bus_not_nan]
-            h_t = H_dPinj_dth[np.tile(nodes, len(range_theta)), np.repeat(range_theta, len(nodes))]\
-                .reshape(len(range_theta), len(nodes)).T
-            h__u = H_dPinj_dU[np.tile(nodes, len(range_v)), np.repeat(range_v, len(nodes))]\
-                .reshape(len(range_v), len(nodes)).T
-            h_ = np.hstack((h_t, h__u))
-            h_mat = np.vstack((h_mat, h_))
-
-        # if P line measurements exist
-        # and so on ..
-        p_line_not_nan = ~np.isnan(self.ppc["branch"][:, branch_cols + 4])
-        node1 = self.ppc["branch"][p_line_not_nan, 0].real.astype(int)
-        node2 = self.ppc["branch"][p_line_not_nan, 1].real.astype(int)
-        p_line_not_nan = ~np.isnan(self.ppc["branch"][:, branch_cols + 6])
-        node1 = np.append(node1, self.ppc["branch"][p_line_not_nan, 1].real.astype(int))
-        node2 = np.append(node2, self.ppc["branch"][p_line_not_nan, 0].real.astype(int))
-        if len(node1):
-            nr = range(0, len(node1))
-            h_ = np.zeros((len(node1), columns + len(self.slack_buses)))
-            h_[nr, node1] = H_dPij_dth_i[node1, node2]
-            h_[nr, node2] = H_dPij_dth_j[node1, node2]
-            h_[nr, n+node1] = H_dPij_dU_i[node1, node2]
-            h_[nr, n+node2] = H_dPij_dU_j[node1, node2]
-            h_ = np.delete(h_, self.slack_buses, 1)
-            h_mat = np.vstack((h_mat, h_))
-
-        q_bus_not_nan = ~np.isnan(self.ppc["bus"][:, bus_cols + 4])
-        if True in q_bus_not_nan:
-            nodes = np.arange(n)[q_bus_not_nan]
-            h_t = H_dQinj_dth[np.tile(nodes, len(range_theta)), np.repeat(range_theta, len(nodes))]\
-                .reshape(len(range_theta), len(nodes)).T
-            h__u = H_dQinj_dU[np.tile(nodes, len(range_v)), np.repeat(range_v, len(nodes))]\
-                .reshape(len(range_v), len(nodes)).T
-            h_ = np.hstack((h_t, h__u))
-            h_mat = np.vstack((h_mat, h_))
-
-        q_line_not_nan = ~np.isnan(self.ppc["branch"][:, branch_cols + 8])
-        node1 = self.ppc["branch"][q_line_not_nan, 0].real.astype(int)
-        node2 = self.ppc["branch"][q_line_not_nan, 1].real.astype(int)
-        q_line_not_nan = ~np.isnan(self.ppc["branch"][:, branch_cols + 10])
-        node1 = np.append(node1, self.ppc["branch"][q_line_not_nan, 1].real.astype(int))
-        node2 = np.append(node2, self.ppc["branch"][q_line_not_nan, 0].real.astype(int))
-        if len(node1):
-            nr = range(0, len(node1))
-            h_ = np.zeros((len(node1), columns + len(self.slack_buses)))
-            h_[nr, node1] = H_dQij_dth_i[node1, node2]
-            h_[nr, node2] = H_dQij_dth_j[node1, node2]
-            h_[nr, n+node1] = H_dQij_dU_i[node1, node2]
-            h_[nr, n+node2] = H_dQij_dU_j[node1, node2]
-            h_ = np.delete(h_, self.slack_buses, 1)
-            h_mat = np.vstack((h_mat, h_))
-
-        v_bus_not_nan = ~np.isnan(self.ppc["bus"][:, bus_cols + 0])
-        if True in v_bus_not_nan:
-            nodes = np.arange(n)[v_bus_not_nan]
-            h_t = H_dU_dth[np.repeat(range_theta, len(nodes)), np.tile(nodes, len(range_theta))]\
-                .reshape(len(range_theta), len(nodes)).T
-            h__u = H_dU_dU[np.repeat(range_v, len(nodes)), np.tile(nodes, len(range_v))]\
-                .reshape(len(range_v), len(nodes)).T
-            h_ = np.hstack((h_t, h__u))
-            h_mat = np.vstack((h_mat, h_))
-
-        i_line_not_nan = ~np.isnan(self.ppc["branch"][:, branch_cols + 0])
-        node1 = self.ppc["branch"][i_line_not_nan, 0].real.astype(int)
-        node2 = self.ppc["branch"][i_line_not_nan, 1].real.astype(int)
-        i_line_not_nan = ~np.isnan(self.ppc["branch"][:, branch_cols + 2])
-        node1 = np.append(node1, self.ppc["branch"][i_line_not_nan, 1].real.astype(int))
-        node2 = np.append(node2, self.ppc["branch"][i_line_not_nan, 0].real.astype(int))
-        if len(node1):
-            nr = range(0, len(node1))
-            h_ = np.zeros((len(node1), columns + len(self.slack_buses)))
-            if not np.all(self.i_ij == 0.):
-                h_[nr, node1] = H_dIij_dth_i[node1, node2]
-                h_[nr, node2] = H_dIij_dth_j[node1, node2]
-                h_[nr, n+node1] = H_dIij_dU_i[node1, node2]
-                h_[nr, n+node2] = H_dIij_dU_j[node1, node2]
-            h_ = np.delete(h_, self.slack_buses, 1)
-            h_mat = np.vstack((h_mat, h_))
-
-        return h_mat[1:, :]  # delete dummy line
+        dU_dVm = csr_matrix((np.ones(len(self.v_bus)),
+                             (np.arange(len(self.v_bus)), self.v_bus)), (len(self.v_bus), n))
+        dU_dVa = csr_matrix((len(self.v_bus), n))
+
+        # Build H from the rows of the measured quantities
+        rows = [(dSbus_dVa.real, dSbus_dVm.real, self.p_bus),
+                (dSf_dVa.real, dSf_dVm.real, self.p_from),
+                (dSt_dVa.real, dSt_dVm.real, self.p_to),
+                (dSbus_dVa.imag, dSbus_dVm.imag, self.q_bus),
+                (dSf_dVa.imag, dSf_dVm.imag, self.q_from),
+                (dSt_dVa.imag, dSt_dVm.imag, self.q_to),
+                (dU_dVa, dU_dVm, slice(None)),
+                (dIf_dVa, dIf_dVm, self.i_from),
+                (dIt_dVa, dIt_dVm, self.i_to)]
+        h_mat = vstack([hstack((dVa[ix][:, self.non_slack_buses], dVm[ix]))
+                        for dVa, dVm, ix in rows], format="csr")
+        return h_mat
+
+
+def _dSbr_dV(Ybr, br_buses, V):
+    """
+    Partial derivatives of the branch power flows S = V[br_buses] * conj(Ybr * V) and of the
+    branch current magnitudes |Ybr * V| w.r.t. the voltage angles and magnitudes.
+    """
+    n, nl = len(V), len(br_buses)
+    ib, il = np.arange(n), np.arange(nl)
+    I = Ybr * V
+    diagV = csr_matrix((V, (ib, ib)))
+    diagVnorm = csr_matrix((V / np.abs(V), (ib, ib)))
+    diagVbr = csr_matrix((V[br_buses], (il, il)))
+    diagIbr = csr_matrix((I, (il, il)), (nl, nl))
+    C = csr_matrix((np.ones(nl), (il, br_buses)), (nl, n))
+
+    dI_dVa = Ybr * 1j * diagV
+    dI_dVm = Ybr * diagVnorm
+    dS_dVa = diagIbr.conj() * C * 1j * diagV + diagVbr * dI_dVa.conj()
+    dS_dVm = diagIbr.conj() * C * diagVnorm + diagVbr * dI_dVm.conj()
+
+    # d|I| = Re(conj(I) / |I| * dI), zero for branches without current
+    abs_I = np.abs(I)
+    i_norm = np.where(abs_I > 0, np.conj(I) / np.where(abs_I > 0, abs_I, 1.), 0.)
+    diagInorm = csr_matrix((i_norm, (il, il)), (nl, nl))
+    return dS_dVa, dS_dVm, (diagInorm * dI_dVa).real, (diagInorm * dI_dVm).real
@@ -12,7 +12,6 @@ from pandapower.estimation.idx_brch import *
 from pandapower.idx_brch import branch_cols
 from pandapower.idx_bus import bus_cols
 from pandapower.pf.run_newton_raphson_pf import _run_dc_pf
-from pandapower.build_branch import get_is_lines
 
 
 def _init_ppc(net, v_start, delta_start, calculate_voltage_angles):
@@ -47,45 +46,29 @@ def _add_measurements_to_ppc(net, ppci, s_ref):
     :param s_ref: reference power in W
     :return: ppc with added columns
     """
-
+    meas = net.measurement
+    meas_type = meas.type.values
+    element_type = meas.element_type.values
+    value = meas.value.values.astype(np.float64)
+    std_dev = meas.std_dev.values.astype(np.float64)
+    meas_idx = meas.index.values
+    meas_bus = meas.bus.values.astype(np.int64)
     map_bus = net["_pd2ppc_lookups"]["bus"]
-    map_line, map_trafo = None, None
-    # mapping to dict instead of np array ensures good performance for large indices
-    # (e.g., 999999999 requires a large np array even if there are only 2 buses)
-    # downside is loop comprehension to access the map
-    if "line" in net["_pd2ppc_lookups"]["branch"]:
-        map_line = dict(zip(net.line.index, range(*net["_pd2ppc_lookups"]["branch"]["line"])))
-    if "trafo" in net["_pd2ppc_lookups"]["branch"]:
-        map_trafo = dict(zip(net.trafo.index, range(*net["_pd2ppc_lookups"]["branch"]["trafo"])))
 
     # set measurements for ppc format
     # add 9 columns to ppc[bus] for Vm, Vm std dev, P, P std dev, Q, Q std dev,
     # pandapower measurement indices V, P, Q
     bus_append = np.full((ppci["bus"].shape[0], bus_cols_se), np.nan, dtype=ppci["bus"].dtype)
 
-    v_measurements = net.measurement[(net.measurement.type == "v")
-                                     & (net.measurement.element_type == "bus")]
-    if len(v_measurements):
-        bus_positions = map_bus[v_measurements.bus.values.astype(int)]
-        bus_append[bus_positions, VM] = v_measurements.value.values
-        bus_append[bus_positions, VM_STD] = v_measurements.std_dev.values
-        bus_append[bus_positions, VM_IDX] = v_measurements.index.values
-
-    p_measurements = net.measurement[(net.measurement.type == "p")
-                                     & (net.measurement.element_type == "bus")]
-    if len(p_measurements):
-        bus_positions = map_bus[p_measurements.bus.values.astype(int)]
-        bus_append[bus_positions, P] = p_measurements.value.values * 1e3 / s_ref
-        bus_append[bus_positions, P_STD] = p_measurements.std_dev.values * 1e3 / s_ref
-        bus_append[bus_positions, P_IDX] = p_measurements.index.values
-
-    q_measurements = net.measurement[(net.measurement.type == "q")
-                                     & (net.measurement.element_type == "bus")]
-    if len(q_measurements):
-        bus_positions = map_bus[q_measurements.bus.values.astype(int)]
-        bus_append[bus_positions, Q] = q_measurements.value.values * 1e3 / s_ref
-        bus_append[bus_positions, Q_STD] = q_measurements.std_dev.values * 1e3 / s_ref
-        bus_append[bus_positions, Q_IDX] = q_measurements.index.values
+    is_bus = element_type == "bus"
+    for m_type, (col, std_col, idx_col), to_pu in [("v", (VM, VM_STD, VM_IDX), 1.),
+                                                   ("p", (P, P_STD, P_IDX), 1e3 / s_ref),
+                                                   ("q", (Q, Q_STD, Q_IDX), 1e3 / s_ref)]:
+        m = is_bus & (meas_type == m_type)
+        bus_positions = map_bus[meas_bus[m]]
+        bus_append[bus_positions, col] = value[m] * to_pu
+        bus_append[bus_positions, std_col] = std_dev[m] * to_pu
+        bus_append[bus_positions, idx_col] = meas_idx[m]
 
     # add virtual measurements for artificial buses, which were created because
     # of an open line switch. p/q are 0. and std dev is 1. (small value)
@@ -102,125 +85,63 @@ def _add_measurements_to_ppc(net, ppci, s_ref):
     branch_append = np.full((ppci["branch"].shape[0], branch_cols_se),
                             np.nan, dtype=ppci["branch"].dtype)
 
-    i_measurements = net.measurement[(net.measurement.type == "i")
-                                     & (net.measurement.element_type == "line")]
-    if len(i_measurements):
-        meas_from = i_measurements[(i_measurements.bus.values.astype(int) ==
-                                    net.line.from_bus[i_measurements.element]).values]
-        meas_to = i_measurements[(i_measurements.bus.values.astype(int) ==
-                                  net.line.to_bus[i_measurements.element]).values]
-        ix_from = [map_line[l] for l in meas_from.element.values.astype(int)]
-        ix_to = [map_line[l] for l in meas_to.element.values.astype(int)]
-        i_a_to_pu_from = (net.bus.vn_kv[meas_from.bus] * 1e3 / s_ref).values
-        i_a_to_pu_to = (net.bus.vn_kv[meas_to.bus] * 1e3 / s_ref).values
-        branch_append[ix_from, IM_FROM] = meas_from.value.values * i_a_to_pu_from
-        branch_append[ix_from, IM_FROM_STD] = meas_from.std_dev.values * i_a_to_pu_from
-        branch_append[ix_from, IM_FROM_IDX] = meas_from.index.values
-        branch_append[ix_to, IM_TO] = meas_to.value.values * i_a_to_pu_to
-        branch_append[ix_to, IM_TO_STD] = meas_to.std_dev.values * i_a_to_pu_to
-        branch_append[ix_to, IM_TO_IDX] = meas_to.index.values
-
-    p_measurements = net.measurement[(net.measurement.type == "p")
-                                      & (net.measurement.element_type == "line")]
-    if len(p_measurements):
-        meas_from = p_measurements[(p_measurements.bus.values.astype(int) ==
-                                    net.line.from_bus[p_measurements.element]).values]
-        meas_to = p_measurements[(p_measurements.bus.values.astype(int) ==
-                                  net.line.to_bus[p_measurements.element]).values]
-        ix_from = [map_line[l] for l in meas_from.element.values.astype(int)]
-        ix_to = [map_line[l] for l in meas_to.element.values.astype(int)]
-        branch_append[ix_from, P_FROM] = meas_from.value.values * 1e3 / s_ref
-        branch_append[ix_from, P_FROM_STD] = meas_from.std_dev.values * 1e3 / s_ref
-        branch_append[ix_from, P_FROM_IDX] = meas_from.index.values
-        branch_append[ix_to, P_TO] = meas_to.value.values * 1e3 / s_ref
-        branch_append[ix_to, P_TO_STD] = meas_to.std_dev.values * 1e3 / s_ref
-        branch_append[ix_to, P_TO_IDX] = meas_to.index.values
-
-    q_measurements = net.measurement[(net.measurement.type == "q")
-                                     & (net.measurement.element_type == "line")]
-    if len(q_measurements):
-        meas_from = q_measurements[(q_measurements.bus.values.astype(int) ==
-                                    net.line.from_bus[q_measurements.element]).values]
-        meas_to = q_measurements[(q_measurements.bus.values.astype(int) ==
-                                  net.line.to_bus[q_measurements.element]).values]
-        ix_from = [map_line[l] for l in meas_from.element.values.astype(int)]
-        ix_to = [map_line[l] for l in meas_to.element.values.astype(int)]
-        branch_append[ix_from, Q_FROM] = meas_from.value.values * 1e3 / s_ref
-        branch_append[ix_from, Q_FROM_STD] = meas_from.std_dev.values * 1e3 / s_ref
-        branch_append[ix_from, Q_FROM_IDX] = meas_from.index.values
-        branch_append[ix_to, Q_TO] = meas_to.value.values * 1e3 / s_ref
-        branch_append[ix_to, Q_TO_STD] = meas_to.std_dev.values * 1e3 / s_ref
-        branch_append[ix_to, Q_TO_IDX] = meas_to.index.values
-
-    # determine number of lines in ppci["branch"]
-    # out of service lines and lines with open switches at both ends are not in the ppci
-    _is_elements = net["_is_elements"]
-    if "line" not in _is_elements:
-        get_is_lines(net)
-    lines_is = _is_elements['line']
-    bus_is_idx = _is_elements['bus_is_idx']
-    slidx = (net["switch"]["closed"].values == 0) \
-            & (net["switch"]["et"].values == "l") \
-            & (np.in1d(net["switch"]["element"].values, lines_is.index)) \
-            & (np.in1d(net["switch"]["bus"].values, bus_is_idx))
-    ppci_lines = len(lines_is) - np.count_nonzero(slidx)
-
-    i_tr_measurements = net.measurement[(net.measurement.type == "i")
-                                        & (net.measurement.element_type == "trafo")]
-    if len(i_tr_measurements):
-        meas_from = i_tr_measurements[(i_tr_measurements.bus.values.astype(int) ==
-                                       net.trafo.hv_bus[i_tr_measurements.element]).values]
-        meas_to = i_tr_measurements[(i_tr_measurements.bus.values.astype(int) ==
-                                     net.trafo.lv_bus[i_tr_measurements.element]).values]
-        ix_from = [map_trafo[t] for t in meas_from.element.values.astype(int)]
-        ix_to = [map_trafo[t] for t in meas_to.element.values.astype(int)]
-        i_a_to_pu_from = (net.bus.vn_kv[meas_from.bus] * 1e3 / s_ref).values
-        i_a_to_pu_to = (net.bus.vn_kv[meas_to.bus] * 1e3 / s_ref).values
-        branch_append[ix_from, IM_FROM] = meas_from.value.values * i_a_to_pu_from
-        branch_append[ix_from, IM_FROM_STD] = meas_from.std_dev.values * i_a_to_pu_from
-        branch_append[ix_from, IM_FROM_IDX] = meas_from.index.values
-        branch_append[ix_to, IM_TO] = meas_to.value.values * i_a_to_pu_to
-        branch_append[ix_to, IM_TO_STD] = meas_to.std_dev.values * i_a_to_pu_to
-        branch_append[ix_to, IM_TO_IDX] = meas_to.index.values
-
-    p_tr_measurements = net.measurement[(net.measurement.type == "p") &
-                                        (net.measurement.element_type == "trafo")]
-
-    if len(p_tr_measurements):
-        meas_from = p_tr_measurements[(p_tr_measurements.bus.values.astype(int) ==
-                                       net.trafo.hv_bus[p_tr_measurements.element]).values]
-        meas_to = p_tr_measurements[(p_tr_measurements.bus.values.astype(int) ==
-                                     net.trafo.lv_bus[p_tr_measurements.element]).values]
-        ix_from = [map_trafo[t] for t in meas_from.element.values.astype(int)]
-        ix_to = [map_trafo[t] for t in meas_to.element.values.astype(int)]
-        branch_append[ix_from, P_FROM] = meas_from.value.values * 1e3 / s_ref
-        branch_append[ix_from, P_FROM_STD] = meas_from.std_dev.values * 1e3 / s_ref
-        branch_append[ix_from, P_FROM_IDX] = meas_from.index.values
-        branch_append[ix_to, P_TO] = meas_to.value.values * 1e3 / s_ref
-        branch_append[ix_to, P_TO_STD] = meas_to.std_dev.values * 1e3 / s_ref
-        branch_append[ix_to, P_TO_IDX] = meas_to.index.values
-
-    q_tr_measurements = net.measurement[(net.measurement.type == "q") &
-                                        (net.measurement.element_type == "trafo")]
-    if len(q_tr_measurements):
-        meas_from = q_tr_measurements[(q_tr_measurements.bus.values.astype(int) ==
-                                       net.trafo.hv_bus[q_tr_measurements.element]).values]
-        meas_to = q_tr_measurements[(q_tr_measurements.bus.values.astype(int) ==
-                                     net.trafo.lv_bus[q_tr_measurements.element]).values]
-        ix_from = [map_trafo[t] for t in meas_from.element.values.astype(int)]
-        ix_to = [map_trafo[t] for t in meas_to.element.values.astype(int)]
-        branch_append[ix_from, Q_FROM] = meas_from.value.values * 1e3 / s_ref
-        branch_append[ix_from, Q_FROM_STD] = meas_from.std_dev.values * 1e3 / s_ref
-        branch_append[ix_from, Q_FROM_IDX] = meas_from.index.values
-        branch_append[ix_to, Q_TO] = meas_to.value.values * 1e3 / s_ref
-        branch_append[ix_to, Q_TO_STD] = meas_to.std_dev.values * 1e3 / s_ref
-        branch_append[ix_to, Q_TO_IDX] = meas_to.index.values
+    # current measurements are converted with the voltage level of the measured bus
+    i_to_pu = np.ones(len(meas))
+    is_i = meas_type == "i"
+    if np.any(is_i):
+        bus_positions = _index_positions(net.bus.index.values, meas_bus[is_i])
+        i_to_pu[is_i] = net.bus.vn_kv.values[bus_positions] * 1e3 / s_ref * np.sqrt(3)
+
+    branch_lookup = net["_pd2ppc_lookups"]["branch"]
+    for element, from_bus, to_bus in [("line", "from_bus", "to_bus"),
+                                      ("trafo", "hv_bus", "lv_bus")]:
+        is_element = element_type == element
+        if not np.any(is_element) or element not in branch_lookup:
+            continue
+        # positions of the measured elements in the element table and the ppc branches
+        elements = meas.element.values[is_element].astype(np.int64)
+        positions = _index_positions(net[element].index.values, elements)
+        branches = branch_lookup[element][0] + positions
+        # the side of the branch is given by the measured bus
+        buses = meas_bus[is_element]
+        from_side = buses == net[element][from_bus].values[positions]
+        to_side = buses == net[element][to_bus].values[positions]
+        e_type, e_value, e_std = meas_type[is_element], value[is_element], std_dev[is_element]
+        e_idx, e_i_to_pu = meas_idx[is_element], i_to_pu[is_element]
+        for m_type, at_side, (col, std_col, idx_col) in [
+                ("i", from_side, (IM_FROM, IM_FROM_STD, IM_FROM_IDX)),
+                ("i", to_side, (IM_TO, IM_TO_STD, IM_TO_IDX)),
+                ("p", from_side, (P_FROM, P_FROM_STD, P_FROM_IDX)),
+                ("p", to_side, (P_TO, P_TO_STD, P_TO_IDX)),
+                ("q", from_side, (Q_FROM, Q_FROM_STD, Q_FROM_IDX)),
+                ("q", to_side, (Q_TO, Q_TO_STD, Q_TO_IDX))]:
+            m = at_side & (e_type == m_type)
+            to_pu = e_i_to_pu[m] if m_type == "i" else 1e3 / s_ref
+            branch_append[branches[m], col] = e_value[m] * to_pu
+            branch_append[branches[m], std_col] = e_std[m] * to_pu
+            branch_append[branches[m], idx_col] = e_idx[m]
 
     ppci["bus"] = np.hstack((ppci["bus"], bus_append))
     ppci["branch"] = np.hstack((ppci["branch"], branch_append))
     return ppci
 
 
+def _index_positions(index, values):
+    """
+    Positions of the values in the (unsorted) pandas index given as an array. The positions are
+    found by binary search in the sorted index, so that no lookup array over the range of the
+    index values is needed for sparse, large indices.
+    """
+    order = np.argsort(index, kind="mergesort")
+    positions = np.searchsorted(index, values, sorter=order)
+    positions[positions == len(index)] = 0
+    found = order[positions] if len(index) else positions
+    if len(values) and (not len(index) or np.any(index[found] != values)):
+        missing = values[~np.in1d(values, index)]
+        raise UserWarning("Measured element %s does not exist" % missing[0])
+    return found
+
+
 def _build_measurement_vectors(ppci):
     """
     Building measurement vector z, pandapower to ppci measurement mapping and covariance matrix R
@@ -249,7 +170,8 @@ def _build_measurement_vectors(ppci):
                         ppci["branch"][i_line_f_not_nan, branch_cols + IM_FROM],
                         ppci["branch"][i_line_t_not_nan, branch_cols + IM_TO]
                         )).real.astype(np.float64)
-    # conserve the pandapower indices of measurements in the ppci order
+    # conserve the pandapower indices of measurements in the ppci order, virtual measurements
+    # without pandapower index get -1
     pp_meas_indices = np.concatenate((ppci["bus"][p_bus_not_nan, bus_cols + P_IDX],
                                       ppci["branch"][p_line_f_not_nan, branch_cols + P_FROM_IDX],
                                       ppci["branch"][p_line_t_not_nan, branch_cols + P_TO_IDX],
@@ -259,7 +181,8 @@ def _build_measurement_vectors(ppci):
                                       ppci["bus"][v_bus_not_nan, bus_cols + VM_IDX],
                                       ppci["branch"][i_line_f_not_nan, branch_cols + IM_FROM_IDX],
                                       ppci["branch"][i_line_t_not_nan, branch_cols + IM_TO_IDX]
-                                      )).real.astype(int)
+                                      )).real
+    pp_meas_indices = np.where(np.isnan(pp_meas_indices), -1, pp_meas_indices).astype(int)
     # Covariance matrix R
     r_cov = np.concatenate((ppci["bus"][p_bus_not_nan, bus_cols + P_STD],
                             ppci["branch"][p_line_f_not_nan, branch_cols + P_FROM_STD],
@@ -47,7 +47,7 @@ def to_pickle(net, filename):
 
     """
     if hasattr(filename, 'write'):
-        pickle.dump(dict(net), filename, protocol=2)
+        pickle.dump(dict(net.items()), filename, protocol=2)
         return
     if not filename.endswith(".p"):
         raise Exception("Please use .p to save pandapower networks!")
@@ -190,6 +190,8 @@ def from_pickle(filename, convert=True):
         with open(filename, "rb") as f:
             net = read(f)
     net = pandapowerNet(net)
+    # the internal variables of a power flow with result_mode="arrays" are not restored
+    net.pop("_pending_results", None)
 
     try:
         epsg = net.gis_epsg_code
@@ -16,7 +16,8 @@ from numpy import array, Inf, any, isnan, ones, r_, finfo, \
 from numpy.linalg import norm
 from pypower.pipsver import pipsver
 from scipy.sparse import vstack, hstack, eye, csr_matrix as sparse
-from scipy.sparse.linalg import spsolve
+
+from pandapower.pf.linear_solver import solve_sparse
 
 
 EPS = finfo(float).eps
@@ -143,6 +144,8 @@ def pips(f_fcn, x0=None, A=None, l=None, u=None, xmin=None, xmax=None,
                     value is also passed as the 3rd argument to the Hessian
                     evaluation function so that it can appropriately scale the
                     objective function term in the Hessian of the Lagrangian.
+                  - C{linear_solver} ("superlu") - sparse linear solver for
+                    the Newton steps, see L{get_linear_solver}
     @type opt: dict
 
     @rtype: dict
@@ -221,6 +224,8 @@ def pips(f_fcn, x0=None, A=None, l=None, u=None, xmin=None, xmax=None,
         opt["cost_mult"] = 1
     if "verbose" not in opt:
         opt["verbose"] = 0
+    if "linear_solver" not in opt:
+        opt["linear_solver"] = "superlu"
 
     # initialize history
     hist = []
@@ -391,7 +396,7 @@ def pips(f_fcn, x0=None, A=None, l=None, u=None, xmin=None, xmax=None,
         ])
         bb = r_[-N, -g]
 
-        dxdlam = spsolve(Ab.tocsr(), bb)
+        dxdlam = solve_sparse(Ab.tocsr(), bb, opt["linear_solver"])
 
         if any(isnan(dxdlam)):
             if opt["verbose"]:
@@ -91,7 +91,8 @@ def pipsopf_solver(om, ppopt, out_opt=None):
              'max_red': max_red,
              'step_control': step_control,
              'cost_mult': 1e-4,
-             'verbose': verbose  }
+             'verbose': verbose,
+             'linear_solver': ppopt.get('LINEAR_SOLVER', 'superlu')  }
 
     ## unpack data
     ppc = om.get_ppc()
@@ -31,7 +31,8 @@ def _optimal_powerflow(net, verbose, suppress_warnings, **kwargs):
     ac = net["_options"]["ac"]
     init = net["_options"]["init"]
 
-    ppopt = ppoption(VERBOSE=verbose, OPF_FLOW_LIM=2, PF_DC=not ac, INIT=init, **kwargs)
+    ppopt = ppoption(VERBOSE=verbose, OPF_FLOW_LIM=2, PF_DC=not ac, INIT=init,
+                     LINEAR_SOLVER=net["_options"]["linear_solver"], **kwargs)
     net["OPF_converged"] = False
     net["converged"] = False
     _add_auxiliary_elements(net)
@@ -96,4 +97,6 @@ def _run_pf_before_opf(net, ppci):
     net._options["tolerance_kva"] = 1e-5
     net._options["max_iteration"] = 10
     net._options["algorithm"] = "nr"
+    net._options["reuse_ordering"] = False
+    net._options["chord"] = False
     return _run_newton_raphson_pf(ppci, net["_options"])
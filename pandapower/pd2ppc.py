@@ -5,8 +5,10 @@
 
 
 import copy
+import hashlib
 
 import numpy as np
+import pandas as pd
 
 from pandapower.idx_area import PRICE_REF_BUS
 from pandapower.idx_brch import F_BUS, T_BUS, BR_STATUS
@@ -21,7 +23,7 @@ except ImportError:
 
 import pandapower.auxiliary as aux
 from pandapower.build_branch import _build_branch_ppc, _switch_branches, _branches_with_oos_buses, \
-    _update_trafo_trafo3w_ppc
+    _update_trafo_trafo3w_ppc, _update_branch_parameters_ppc
 from pandapower.build_bus import _build_bus_ppc, _calc_pq_elements_and_add_on_ppc, \
     _calc_shunts_and_add_on_ppc, _add_gen_impedances_ppc, _add_motor_impedances_ppc
 from pandapower.build_gen import _build_gen_ppc, _update_gen_ppc, _check_voltage_setpoints_at_same_bus, \
@@ -71,6 +73,7 @@ def _pd2ppc(net):
     check_connectivity = net["_options"]["check_connectivity"]
     calculate_voltage_angles = net["_options"]["calculate_voltage_angles"]
 
+    bfsw_cache = _get_bfsw_cache(net)
     ppc = _init_ppc(net)
 
     if mode == "opf":
@@ -79,6 +82,9 @@ def _pd2ppc(net):
 
     # init empty ppci
     ppci = copy.deepcopy(ppc)
+    # the DLF matrix of the last backward/forward sweep power flow is reused by _run_bfswpf if
+    # the branches are unchanged
+    ppci["internal"].update(bfsw_cache)
     # generate ppc['bus'] and the bus lookup
     _build_bus_ppc(net, ppc)
     # generate ppc['gen'] and fills ppc['bus'] with generator values (PV, REF nodes)
@@ -127,6 +133,17 @@ def _pd2ppc(net):
     return ppc, ppci
 
 
+# entries of ppc["internal"] with the cached DLF matrix of the backward/forward sweep power flow
+BFSW_CACHE_KEYS = ["DLF", "buses_ord_bfs_nets", "bfsw_bus_shift", "bfsw_key"]
+
+
+def _get_bfsw_cache(net):
+    ppc = net.get("_ppc")
+    if ppc is None or "bfsw_key" not in ppc.get("internal", {}):
+        return {}
+    return {key: ppc["internal"][key] for key in BFSW_CACHE_KEYS}
+
+
 def _init_ppc(net):
     # init empty ppc
     ppc = {"baseMVA": net.sn_kva * 1e-3
@@ -292,7 +309,8 @@ def _update_ppc(net):
     recycle = net["_options"]["recycle"]
     # get the old ppc and lookup
     ppc = net["_ppc"]
-    ppci = copy.deepcopy(ppc)
+    # the cached DLF matrix is shared instead of copied
+    ppci = copy.deepcopy(ppc, {id(cached): cached for cached in _get_bfsw_cache(net).values()})
     # adds P and Q for loads / sgens in ppc['bus'] (PQ nodes)
     _calc_pq_elements_and_add_on_ppc(net, ppc)
     # adds P and Q for shunts, wards and xwards (to PQ nodes)
@@ -302,7 +320,10 @@ def _update_ppc(net):
     # check if any generators connected to the same bus have different voltage setpoints
     _check_voltage_setpoints_at_same_bus(ppc)
 
-    if not recycle["Ybus"]:
+    if recycle.get("branch_parameters", False):
+        # updates the electrical parameters of lines, trafos and trafo3w
+        _update_branch_parameters_ppc(net, ppc)
+    elif not recycle["Ybus"]:
         # updates trafo and trafo3w values
         _update_trafo_trafo3w_ppc(net, ppc)
 
@@ -318,3 +339,129 @@ def _update_ppc(net):
     ppci["gen"] = ppc["gen"][gs]
 
     return ppc, ppci
+
+
+# element tables that are converted to the ppc
+TRACKED_TABLES = ["bus", "load", "sgen", "storage", "gen", "ext_grid", "shunt", "ward", "xward",
+                  "line", "trafo", "trafo3w", "impedance", "switch", "dcline"]
+
+# columns without influence on the ppc
+IGNORED_COLUMNS = ["name", "std_type", "zone"]
+
+# columns that _update_ppc writes to the bus loads and generator setpoints of a recycled ppc
+INJECTION_COLUMNS = {
+    "load": ["p_kw", "q_kvar", "const_z_percent", "const_i_percent", "sn_kva", "scaling",
+             "in_service", "type"],
+    "sgen": ["p_kw", "q_kvar", "sn_kva", "scaling", "in_service", "type"],
+    "storage": ["p_kw", "q_kvar", "sn_kva", "soc_percent", "min_e_kwh", "max_e_kwh", "scaling",
+                "in_service", "type"],
+    "gen": ["p_kw", "vm_pu", "sn_kva", "min_q_kvar", "max_q_kvar", "scaling", "type"],
+    "ext_grid": ["vm_pu", "va_degree"],
+    "ward": ["ps_kw", "qs_kvar"]}
+
+# columns that only change the electrical parameters of the branches (updated by
+# _update_branch_parameters_ppc) and shunts (updated by _update_ppc), so that the admittance
+# matrices have to be rebuilt
+BRANCH_PARAMETER_COLUMNS = {
+    "shunt": ["p_kw", "q_kvar", "vn_kv", "step", "max_step", "in_service"],
+    "ward": ["pz_kw", "qz_kvar", "in_service"],
+    "line": ["length_km", "r_ohm_per_km", "x_ohm_per_km", "c_nf_per_km", "g_us_per_km",
+             "max_i_ka", "df", "parallel", "type"],
+    "trafo": ["sn_kva", "vn_hv_kv", "vn_lv_kv", "vsc_percent", "vscr_percent", "pfe_kw",
+              "i0_percent", "shift_degree", "tp_side", "tp_mid", "tp_min", "tp_max",
+              "tp_st_percent", "tp_st_degree", "tp_pos", "tp_phase_shifter", "parallel", "df"],
+    "trafo3w": ["sn_hv_kva", "sn_mv_kva", "sn_lv_kva", "vn_hv_kv", "vn_mv_kv", "vn_lv_kv",
+                "vsc_hv_percent", "vsc_mv_percent", "vsc_lv_percent", "vscr_hv_percent",
+                "vscr_mv_percent", "vscr_lv_percent", "pfe_kw", "i0_percent", "shift_mv_degree",
+                "shift_lv_degree", "tp_side", "tp_mid", "tp_min", "tp_max", "tp_st_percent",
+                "tp_st_degree", "tp_pos", "tap_at_star_point"]}
+
+# options that are used in the conversion to the ppc. The initial voltages are not compared,
+# since a recycled ppc always starts from the results of the last power flow.
+PPC_OPTIONS = ["calculate_voltage_angles", "trafo_model", "check_connectivity", "mode",
+               "copy_constraints_to_ppc", "r_switch", "enforce_q_lims", "voltage_depend_loads",
+               "delta", "trafo3w_losses", "ac"]
+
+RECYCLE_LEVELS = {
+    "injections": dict(_is_elements=True, ppc=True, Ybus=True, bfsw=True),
+    "branch_parameters": dict(_is_elements=True, ppc=True, Ybus=False, bfsw=False,
+                              branch_parameters=True),
+    "full": dict(_is_elements=False, ppc=False, Ybus=False, bfsw=False)}
+
+
+def _get_recycle_from_changes(net):
+    """
+    Compares the element tables with the state of the last conversion with recycle="auto" and
+    returns the recycle dict of the least expensive update of the ppc:
+
+        - "injections": only loads, generation and voltage setpoints changed. The ppc and the
+          admittance matrices are reused.
+        - "branch_parameters": additionally, electrical parameters of lines or trafos (e.g. tap
+          positions) or shunts changed. The ppc is reused and the admittance matrices are rebuilt.
+        - "full": the topology (buses, switches, in service status of branches and generators,
+          connections of elements) or the options changed. The ppc is rebuilt from scratch.
+
+    The changes are detected with a hash of every column of the element tables, so that changes
+    made in any way (e.g. with .loc, .values or by replacing the table) are found. Returns the
+    recycle dict, the name of the level and the state of the net that has to be stored with
+    _store_change_tracking after a successful power flow.
+    """
+    state = {"hashes": {table: _get_column_hashes(net[table]) for table in TRACKED_TABLES},
+             "options": {key: net["_options"].get(key) for key in PPC_OPTIONS},
+             "sn_kva": net.sn_kva, "f_hz": net.f_hz}
+    level = "full"
+    tracking = net.get("_change_tracking")
+    # the ppc and the lookups might have been replaced by other calculations in the meantime
+    if tracking is not None and tracking["ppc"] is net.get("_ppc") and \
+            tracking["lookups"] is net.get("_pd2ppc_lookups") and not len(net["xward"]) and \
+            all(_option_equal(tracking["state"][key], state[key]) for key in
+                ["options", "sn_kva", "f_hz"]):
+        level = _get_change_level(tracking["state"]["hashes"], state["hashes"])
+    return dict(RECYCLE_LEVELS[level]), level, state
+
+
+def _store_change_tracking(net, state, level):
+    net["_change_tracking"] = {"ppc": net["_ppc"], "lookups": net["_pd2ppc_lookups"],
+                               "state": state, "level": level}
+
+
+def _get_change_level(old_hashes, new_hashes):
+    level = "injections"
+    for table, new in new_hashes.items():
+        old = old_hashes[table]
+        if set(old) != set(new):
+            return "full"
+        changed = {column for column in new if old[column] != new[column]}
+        if not changed:
+            continue
+        if changed.issubset(INJECTION_COLUMNS.get(table, [])):
+            continue
+        if changed.issubset(INJECTION_COLUMNS.get(table, []) +
+                            BRANCH_PARAMETER_COLUMNS.get(table, [])):
+            level = "branch_parameters"
+        else:
+            return "full"
+    return level
+
+
+def _get_column_hashes(df):
+    hashes = {"index": _hash_values(df.index.values)}
+    for column in df.columns:
+        if column not in IGNORED_COLUMNS:
+            hashes[column] = _hash_values(df[column].values)
+    return hashes
+
+
+def _hash_values(values):
+    if values.dtype == object:
+        values = pd.util.hash_pandas_object(pd.Series(values), index=False).values
+    return hashlib.sha1(np.ascontiguousarray(values).view(np.uint8)).hexdigest() + str(values.dtype)
+
+
+def _option_equal(a, b):
+    if isinstance(a, dict):
+        return isinstance(b, dict) and set(a) == set(b) and all(_option_equal(a[k], b[k]) for k in a)
+    try:
+        return bool(np.all(a == b)) and np.shape(a) == np.shape(b)
+    except (TypeError, ValueError):
+        return a is b
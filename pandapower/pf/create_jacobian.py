@@ -1,4 +1,4 @@
-from numpy import complex128, float64, int32
+from numpy import complex128, float64, int64, arange, repeat, diff, conj, take, array_equal
 from numpy.core.multiarray import zeros, empty, array
 from scipy.sparse import csr_matrix as sparse, vstack, hstack
 
@@ -6,38 +6,12 @@ from pandapower.pf.dSbus_dV_pypower import dSbus_dV
 
 try:
     # numba functions
-    from pandapower.pf.create_jacobian_numba import create_J, create_J2
+    from pandapower.pf.create_jacobian_numba import fill_J_from_template
     from pandapower.pf.dSbus_dV_numba import dSbus_dV_numba_sparse
 except ImportError:
     pass
 
 
-def _create_J_with_numba(Ybus, V, pvpq, pq, createJ, pvpq_lookup, npv, npq):
-    Ibus = zeros(len(V), dtype=complex128)
-    # create Jacobian from fast calc of dS_dV
-    dVm_x, dVa_x = dSbus_dV_numba_sparse(Ybus.data, Ybus.indptr, Ybus.indices, V, V / abs(V), Ibus)
-
-    # data in J, space preallocated is bigger than acutal Jx -> will be reduced later on
-    Jx = empty(len(dVm_x) * 4, dtype=float64)
-    # row pointer, dimension = pvpq.shape[0] + pq.shape[0] + 1
-    Jp = zeros(pvpq.shape[0] + pq.shape[0] + 1, dtype=int32)
-    # indices, same with the preallocated space (see Jx)
-    Jj = empty(len(dVm_x) * 4, dtype=int32)
-
-    # fill Jx, Jj and Jp
-    createJ(dVm_x, dVa_x, Ybus.indptr, Ybus.indices, pvpq_lookup, pvpq, pq, Jx, Jj, Jp)
-
-    # resize before generating the scipy sparse matrix
-    Jx.resize(Jp[-1], refcheck=False)
-    Jj.resize(Jp[-1], refcheck=False)
-
-    # generate scipy sparse matrix
-    dimJ = npv + npq + npq
-    J = sparse((Jx, Jj, Jp), shape=(dimJ, dimJ))
-
-    return J
-
-
 def _create_J_without_numba(Ybus, V, pvpq, pq):
     # create Jacobian with standard pypower implementation.
     dS_dVm, dS_dVa = dSbus_dV(Ybus, V)
@@ -59,20 +33,103 @@ def _create_J_without_numba(Ybus, V, pvpq, pq):
     return J
 
 
-def create_jacobian_matrix(Ybus, V, pvpq, pq, createJ, pvpq_lookup, npv, npq, numba):
-    if numba:
-        J = _create_J_with_numba(Ybus, V, pvpq, pq, createJ, pvpq_lookup, npv, npq)
-    else:
-        J = _create_J_without_numba(Ybus, V, pvpq, pq)
-    return J
+def _get_J_template(ppci, Ybus, pvpq, pq):
+    """
+    Returns the Jacobian template for the pattern of Ybus and the bus types pvpq / pq.
 
+    The template is stored in ppci["internal"], so that it is reused in all Newton iterations and
+    in later power flows (e.g. with recycle) as long as the pattern of Ybus and the bus types do
+    not change. Otherwise a new template is created.
+    """
+    J_template = ppci["internal"].get("J_template")
+    if J_template is None or not _J_template_matches(J_template, Ybus, pvpq, pq):
+        J_template = _create_J_template(Ybus, pvpq, pq)
+        ppci["internal"]["J_template"] = J_template
+    return J_template
 
-def get_fastest_jacobian_function(pvpq, pq, numba):
+
+def _J_template_matches(J_template, Ybus, pvpq, pq):
+    return array_equal(J_template["pvpq"], pvpq) and array_equal(J_template["pq"], pq) and \
+           array_equal(J_template["Yp"], Ybus.indptr) and array_equal(J_template["Yj"], Ybus.indices)
+
+
+def _create_J_template(Ybus, pvpq, pq):
+    """
+    Creates the sparsity pattern of the Jacobian for the pattern of Ybus and the given bus types.
+
+    Returns a dict with the CSR matrix J, whose data is refilled in place by
+    _create_J_from_template, and Jsrc, which holds for every nonzero of J the position of the
+    dS_dV entry it is taken from:
+
+        Jsrc = 4 * k + (0: dS_dVa.real | 1: dS_dVm.real | 2: dS_dVa.imag | 3: dS_dVm.imag)
+
+    with k being the position of the entry in Ybus.data. The pattern of Ybus and the bus types
+    the template was created for are stored as well (see _get_J_template). newtonpf adds the
+    linear solver, that keeps the factorization of J for the options "reuse_ordering" and "chord".
+    """
+    # encode the position of every Ybus entry in the data of a matrix with the same pattern
+    # (+1 so that no entry becomes an explicit zero)
+    k = arange(len(Ybus.data), dtype=int64)
+    Yk = sparse((4 * k + 1, Ybus.indices, Ybus.indptr), shape=Ybus.shape)
+    Yk_pvpq = Yk[pvpq, :]
+    J11 = Yk_pvpq[:, pvpq]
+    J12 = _shift_data(Yk_pvpq[:, pq], 1)
+    if len(pq) > 0:
+        Yk_pq = Yk[pq, :]
+        J21 = _shift_data(Yk_pq[:, pvpq], 2)
+        J22 = _shift_data(Yk_pq[:, pq], 3)
+        J = vstack([hstack([J11, J12]), hstack([J21, J22])], format="csr")
+    else:
+        J = vstack([hstack([J11, J12])], format="csr")
+    J.sort_indices()
+    Jsrc = J.data - 1
+    J.data = empty(len(Jsrc), dtype=float64)
+    return {"J": J, "Jsrc": Jsrc, "Yp": Ybus.indptr.copy(), "Yj": Ybus.indices.copy(),
+            "pvpq": pvpq.copy(), "pq": pq.copy()}
+
+
+def _shift_data(M, shift):
+    M = M.tocsr()
+    M.data += shift
+    return M
+
+
+def _dSbus_dV_data(Ybus, V):
+    """
+    Computes the data of dS_dVm and dS_dVa for the CSR pattern of Ybus (see dSbus_dV_numba_sparse)
+    with vectorized numpy operations.
+    """
+    rows = repeat(arange(Ybus.shape[0]), diff(Ybus.indptr))
+    cols = Ybus.indices
+    Ibus = Ybus * V
+    Vnorm = V / abs(V)
+    dS_dVm = V[rows] * conj(Ybus.data * Vnorm[cols])
+    dS_dVa = -1j * V[rows] * conj(Ybus.data * V[cols])
+    diag = rows == cols
+    rd = rows[diag]
+    dS_dVm[diag] += conj(Ibus[rd]) * Vnorm[rd]
+    dS_dVa[diag] += 1j * V[rd] * conj(Ibus[rd])
+    return dS_dVm, dS_dVa
+
+
+def _create_J_from_template(Ybus, V, J_template, numba):
+    """
+    Refills the data of the Jacobian in the template in place and returns it.
+    """
+    J = J_template["J"]
     if numba:
-        if len(pvpq) == len(pq):
-            create_jacobian = create_J2
-        else:
-            create_jacobian = create_J
+        Ibus = zeros(len(V), dtype=complex128)
+        dVm_x, dVa_x = dSbus_dV_numba_sparse(Ybus.data, Ybus.indptr, Ybus.indices, V, V / abs(V),
+                                             Ibus)
+        fill_J_from_template(dVm_x, dVa_x, J_template["Jsrc"], J.data)
     else:
-        create_jacobian = None
-    return create_jacobian
+        dVm_x, dVa_x = _dSbus_dV_data(Ybus, V)
+        # interleave the parts of dS_dV in the order of the Jsrc encoding and gather the entries
+        dS = empty(4 * len(dVm_x), dtype=float64)
+        dS[0::4] = dVa_x.real
+        dS[1::4] = dVm_x.real
+        dS[2::4] = dVa_x.imag
+        dS[3::4] = dVm_x.imag
+        take(dS, J_template["Jsrc"], out=J.data)
+    return J
+
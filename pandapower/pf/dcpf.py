@@ -11,10 +11,12 @@
 """Solves a DC power flow.
 """
 
-from numpy import copy, r_, transpose, real, array
-from scipy.sparse.linalg import spsolve
+from numpy import copy, r_, transpose, real, array, array_equal
 
-def dcpf(B, Pbus, Va0, ref, pv, pq):
+from pandapower.pf.linear_solver import get_linear_solver
+
+
+def dcpf(B, Pbus, Va0, ref, pv, pq, linear_solver="superlu", cache=None):
     """Solves a DC power flow.
 
     Solves for the bus voltage angles at all but the reference bus, given the
@@ -22,6 +24,11 @@ def dcpf(B, Pbus, Va0, ref, pv, pq):
     initial vector of bus voltage angles (in radians), and column vectors with
     the lists of bus indices for the swing bus, PV buses, and PQ buses,
     respectively. Returns a vector of bus voltage angles in radians.
+    The linear system is solved with linear_solver (see L{get_linear_solver}).
+    If a dict C{cache} is given (e.g. ppci["internal"]), the factorization of
+    the reduced B matrix is stored in it and reused as long as the matrix does
+    not change. C{Pbus} can also be a matrix with one column per injection
+    vector, then C{Va0} has to be a matrix of the same shape.
 
     @see: L{rundcpf}, L{runpf}
 
@@ -41,6 +48,36 @@ def dcpf(B, Pbus, Va0, ref, pv, pq):
         pvpq = array(pvpq).flatten()
     pvpq_matrix = B[pvpq.T,:].tocsc()[:,pvpq]
     ref_matrix = transpose(Pbus[pvpq] - B[pvpq.T,:].tocsc()[:,ref] * Va0[ref])
-    Va[pvpq] = real(spsolve(pvpq_matrix, ref_matrix))
+    solver = _get_B_solver(pvpq_matrix, linear_solver, cache)
+    if ref_matrix.ndim == 2:
+        Va[pvpq] = real(solver.solve_matrix(transpose(ref_matrix)))
+    else:
+        Va[pvpq] = real(solver.solve(ref_matrix))
 
     return Va
+
+
+def _get_B_solver(B, linear_solver, cache=None):
+    """Returns a linear solver with the factorization of the reduced B matrix.
+
+    The solver is stored in cache["B_solver"] together with the matrix it was
+    factorized for. As long as B and linear_solver do not change (i.e. for an
+    unchanged topology), the factorization is reused and a DC power flow only
+    needs the triangular solves.
+    """
+    if cache is not None and "B_solver" in cache:
+        cached = cache["B_solver"]
+        if cached["linear_solver"] == linear_solver and _same_matrix(cached["B"], B) \
+                and cached["solver"].is_factorized():
+            return cached["solver"]
+    solver = get_linear_solver(linear_solver)
+    if cache is not None:
+        # the solver might change the matrix it factorizes (e.g. the order of the indices)
+        cache["B_solver"] = {"B": B.copy(), "linear_solver": linear_solver, "solver": solver}
+    solver.factorize(B)
+    return solver
+
+
+def _same_matrix(A, B):
+    return A.shape == B.shape and array_equal(A.indptr, B.indptr) and \
+        array_equal(A.indices, B.indices) and array_equal(A.data, B.data)
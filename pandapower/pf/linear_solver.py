@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+"""Sparse linear solvers for the power flow, DC power flow, OPF and state estimation.
+
+All solvers share the interface
+
+    solver.factorize(A)     full factorization (ordering / symbolic analysis and numerical part)
+    solver.refactorize(A)   numerical factorization of a matrix with the same sparsity pattern as
+                            in the last factorize call
+    solver.solve(b)         solves A * x = b with the last factorization
+    solver.solve_matrix(B)  solves A * X = B for a dense matrix B with the last factorization
+
+and are selected by name with get_linear_solver, e.g. with the runpp option linear_solver.
+"""
+
+from numpy import argsort, empty_like, int64, full, nan, iscomplexobj
+from scipy.sparse.linalg import splu
+
+try:
+    from scikits.umfpack import UmfpackContext, UMFPACK_A
+    umfpack_available = True
+except ImportError:
+    umfpack_available = False
+
+try:
+    from sksparse.cholmod import cholesky
+    cholmod_available = True
+except ImportError:
+    cholmod_available = False
+
+try:
+    from pypardiso import PyPardisoSolver
+    pardiso_available = True
+except ImportError:
+    pardiso_available = False
+
+try:
+    import pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LinearSolver(object):
+    """
+    Base class of the sparse linear solvers. Subclasses implement factorize and solve and may
+    implement a cheaper refactorize.
+    """
+
+    def __init__(self):
+        self.factorized = False
+
+    def factorize(self, A):
+        raise NotImplementedError
+
+    def refactorize(self, A):
+        self.factorize(A)
+
+    def solve(self, b):
+        raise NotImplementedError
+
+    def solve_matrix(self, B):
+        """
+        Solves A * X = B for a dense matrix B with one solve per column.
+        """
+        X = empty_like(B)
+        for j in range(B.shape[1]):
+            X[:, j] = self.solve(B[:, j])
+        return X
+
+    def is_factorized(self):
+        return self.factorized
+
+    def __getstate__(self):
+        # the factorizations of the solver libraries cannot be pickled (e.g. in net["_ppc"] with
+        # to_pickle), so that an unpickled solver has to factorize again
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+
+class SuperLUSolver(LinearSolver):
+    """
+    Sparse LU factorization with scipy SuperLU (default).
+
+    refactorize keeps the column ordering of the last factorize call, so that only the numerical
+    factorization is repeated. A deepcopy keeps the ordering and shares the last factorization,
+    which is not changed in place, so that both survive the copy of ppci["internal"] in recycled
+    power flows.
+    """
+
+    def __init__(self):
+        super(SuperLUSolver, self).__init__()
+        self.col_order = None
+        self.lu = None
+        # True if lu is the factorization of A[:, col_order] instead of A
+        self.permuted = False
+        self.complex = False
+
+    def factorize(self, A):
+        self._splu(A.tocsc(), "COLAMD")
+        if self.lu is not None:
+            # splu factorizes A[:, argsort(perm_c)]
+            self.col_order = argsort(self.lu.perm_c)
+
+    def refactorize(self, A):
+        if self.col_order is None:
+            self.factorize(A)
+            return
+        self._splu(A.tocsc()[:, self.col_order], "NATURAL")
+
+    def _splu(self, A, permc_spec):
+        try:
+            self.lu = splu(A, permc_spec=permc_spec)
+        except RuntimeError:
+            # singular matrix: solve returns nan, as scipy's spsolve does
+            logger.debug("Matrix is exactly singular")
+            self.lu = None
+        self.permuted = permc_spec == "NATURAL"
+        self.complex = iscomplexobj(A.data)
+        self.factorized = self.lu is not None
+
+    def solve(self, b):
+        if self.lu is None:
+            return full(len(b), nan)
+        if iscomplexobj(b) and not self.complex:
+            # SuperLU cannot solve a real factorization for complex right hand sides
+            return self.solve(b.real) + 1j * self.solve(b.imag)
+        if not self.permuted:
+            return self.lu.solve(b)
+        x = empty_like(b)
+        x[self.col_order] = self.lu.solve(b)
+        return x
+
+    def solve_matrix(self, B):
+        # SuperLU solves all columns at once
+        if self.lu is None:
+            return full(B.shape, nan)
+        return self.solve(B)
+
+    def __deepcopy__(self, memo):
+        solver = SuperLUSolver()
+        solver.col_order = self.col_order
+        solver.lu = self.lu
+        solver.permuted = self.permuted
+        solver.complex = self.complex
+        solver.factorized = self.factorized
+        return solver
+
+    def __getstate__(self):
+        return {"col_order": self.col_order}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.col_order = state["col_order"]
+
+
+class UmfpackSolver(LinearSolver):
+    """
+    Sparse LU factorization with UMFPACK (package scikit-umfpack). refactorize keeps the symbolic
+    analysis.
+    """
+
+    def __init__(self):
+        super(UmfpackSolver, self).__init__()
+        self.context = None
+        self.A = None
+
+    def factorize(self, A):
+        self.A = A.tocsc()
+        self.A.sort_indices()
+        self.context = UmfpackContext("dl" if self.A.indices.dtype == int64 else "di")
+        self.context.symbolic(self.A)
+        self.context.numeric(self.A)
+        self.factorized = True
+
+    def refactorize(self, A):
+        if self.context is None:
+            self.factorize(A)
+            return
+        self.A = A.tocsc()
+        self.A.sort_indices()
+        self.context.numeric(self.A)
+
+    def solve(self, b):
+        return self.context.solve(UMFPACK_A, self.A, b, autoTranspose=True)
+
+    def __deepcopy__(self, memo):
+        return UmfpackSolver()
+
+
+class CholmodSolver(LinearSolver):
+    """
+    Sparse Cholesky factorization with CHOLMOD (package scikit-sparse). Only for symmetric
+    positive definite matrices, e.g. the gain matrix of the state estimation or the B matrix of
+    the DC power flow. refactorize keeps the symbolic analysis.
+    """
+
+    def __init__(self):
+        super(CholmodSolver, self).__init__()
+        self.factor = None
+
+    def factorize(self, A):
+        self.factor = cholesky(A.tocsc())
+        self.factorized = True
+
+    def refactorize(self, A):
+        if self.factor is None:
+            self.factorize(A)
+            return
+        self.factor.cholesky_inplace(A.tocsc())
+
+    def solve(self, b):
+        return self.factor(b)
+
+    def __deepcopy__(self, memo):
+        return CholmodSolver()
+
+
+class PardisoSolver(LinearSolver):
+    """
+    Sparse LU factorization with the Intel MKL PARDISO solver (package pypardiso).
+    """
+
+    def __init__(self):
+        super(PardisoSolver, self).__init__()
+        self.pardiso = None
+        self.A = None
+
+    def factorize(self, A):
+        if self.pardiso is None:
+            self.pardiso = PyPardisoSolver()
+        self.A = A.tocsr()
+        self.pardiso.factorize(self.A)
+        self.factorized = True
+
+    def solve(self, b):
+        return self.pardiso.solve(self.A, b)
+
+    def __deepcopy__(self, memo):
+        return PardisoSolver()
+
+
+# name: (solver class, optional package is installed)
+LINEAR_SOLVERS = {"superlu": (SuperLUSolver, True),
+                  "umfpack": (UmfpackSolver, umfpack_available),
+                  "cholmod": (CholmodSolver, cholmod_available),
+                  "pardiso": (PardisoSolver, pardiso_available)}
+
+
+def register_linear_solver(name, solver_class):
+    """
+    Registers a linear solver class (with the interface of LinearSolver) under the given name, so
+    that it can be selected with the option linear_solver.
+    """
+    LINEAR_SOLVERS[name] = (solver_class, True)
+
+
+def get_linear_solver(name="superlu"):
+    """
+    Returns a new instance of the linear solver with the given name. If the package of the solver
+    is not installed, a warning is logged and SuperLU is used instead.
+    """
+    if name not in LINEAR_SOLVERS:
+        raise ValueError("Unknown linear solver %s. Available are %s"
+                         % (name, sorted(LINEAR_SOLVERS.keys())))
+    solver_class, available = LINEAR_SOLVERS[name]
+    if not available:
+        logger.warning("The package for the linear solver %s cannot be imported. SuperLU is used "
+                       "instead." % name)
+        solver_class = SuperLUSolver
+    return solver_class()
+
+
+def solve_sparse(A, b, linear_solver="superlu"):
+    """
+    Solves A * x = b with a single factorization of the given linear solver.
+    """
+    solver = get_linear_solver(linear_solver)
+    solver.factorize(A)
+    return solver.solve(b)
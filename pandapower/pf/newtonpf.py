@@ -11,12 +11,12 @@
 """Solves the power flow using a full Newton's method.
 """
 
-from numpy import angle, exp, linalg, conj, r_, Inf, arange, zeros, max, zeros_like, column_stack
-from scipy.sparse.linalg import spsolve
+from numpy import angle, exp, linalg, conj, r_, Inf, zeros_like, column_stack
 
 from pandapower.pf.iwamoto_multiplier import _iwamoto_step
 from pandapower.pf.makeSbus import makeSbus
-from pandapower.pf.create_jacobian import create_jacobian_matrix, get_fastest_jacobian_function
+from pandapower.pf.create_jacobian import _get_J_template, _create_J_from_template
+from pandapower.pf.linear_solver import get_linear_solver
 
 
 def newtonpf(Ybus, Sbus, V0, pv, pq, ppci, options):
@@ -33,6 +33,15 @@ def newtonpf(Ybus, Sbus, V0, pv, pq, ppci, options):
 
     @see: L{runpf}
 
+    The sparsity pattern of the Jacobian is taken from the template in ppci["internal"] (see
+    L{_get_J_template}), so only the data of J is recomputed in every iteration.
+
+    J is solved with the linear solver options["linear_solver"] (see L{get_linear_solver}).
+    With options["reuse_ordering"], the ordering / symbolic analysis of the first factorization
+    is kept and only the numerical factorization is repeated. With options["chord"], the LU factorization of J is
+    also reused in the following iterations and power flows as long as the mismatch decreases
+    by at least half in every iteration (chord / dishonest Newton method).
+
     @author: Ray Zimmerman (PSERC Cornell)
     @author: Richard Lincoln
 
@@ -46,6 +55,9 @@ def newtonpf(Ybus, Sbus, V0, pv, pq, ppci, options):
     iwamoto = options["algorithm"] == "iwamoto_nr"
     voltage_depend_loads = options["voltage_depend_loads"]
     v_debug = options["v_debug"]
+    chord = options["chord"]
+    reuse_ordering = chord or options["reuse_ordering"]
+    linear_solver = options["linear_solver"]
 
     baseMVA = ppci['baseMVA']
     bus = ppci['bus']
@@ -69,12 +81,6 @@ def newtonpf(Ybus, Sbus, V0, pv, pq, ppci, options):
 
     ## set up indexing for updating V
     pvpq = r_[pv, pq]
-    # generate lookup pvpq -> index pvpq (used in createJ)
-    pvpq_lookup = zeros(max(Ybus.indices) + 1, dtype=int)
-    pvpq_lookup[pvpq] = arange(len(pvpq))
-
-    # get jacobian function
-    createJ = get_fastest_jacobian_function(pvpq, pq, numba)
 
     npv = len(pv)
     npq = len(pq)
@@ -91,15 +97,30 @@ def newtonpf(Ybus, Sbus, V0, pv, pq, ppci, options):
 
     Ybus = Ybus.tocsr()
     J = None
+    # get the sparsity pattern of the jacobian (created once per topology and bus types)
+    J_template = _get_J_template(ppci, Ybus, pvpq, pq)
+    if J_template.get("linear_solver") != linear_solver:
+        J_template["solver"] = get_linear_solver(linear_solver)
+        J_template["linear_solver"] = linear_solver
+    solver = J_template["solver"]
+    # a factorization from an earlier power flow is only reused in chord mode
+    refactorize = not (chord and solver.is_factorized())
+    if not refactorize:
+        J = J_template["J"]
 
     ## do Newton iterations
     while (not converged and i < max_it):
         ## update iteration counter
         i = i + 1
 
-        J = create_jacobian_matrix(Ybus, V, pvpq, pq, createJ, pvpq_lookup, npv, npq, numba)
+        if refactorize:
+            J = _create_J_from_template(Ybus, V, J_template, numba)
+            if reuse_ordering:
+                solver.refactorize(J)
+            else:
+                solver.factorize(J)
 
-        dx = -1 * spsolve(J, F)
+        dx = -1 * solver.solve(F)
         ## update voltage
         if npv and not iwamoto:
             Va[pv] = Va[pv] + dx[j1:j2]
@@ -122,9 +143,12 @@ def newtonpf(Ybus, Sbus, V0, pv, pq, ppci, options):
         if voltage_depend_loads:
             Sbus = makeSbus(baseMVA, bus, gen, vm=Vm)
 
+        F_norm = linalg.norm(F, Inf)
         F = _evaluate_Fx(Ybus, V, Sbus, pv, pq)
 
         converged = _check_for_convergence(F, tol)
+        # keep the factorization as long as the mismatch converges fast enough
+        refactorize = not chord or linalg.norm(F, Inf) > 0.5 * F_norm
 
     return V, converged, i, J, Vm_it, Va_it
 
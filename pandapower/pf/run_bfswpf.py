@@ -13,8 +13,7 @@ from pandapower.idx_brch import F_BUS, T_BUS, BR_R, BR_X, BR_B, TAP, BR_STATUS,
 from pandapower.idx_bus import BUS_I, BUS_TYPE, GS, BS
 from pandapower.idx_gen import GEN_BUS, QG, QMAX, QMIN, GEN_STATUS, VG
 from pandapower.pf.makeSbus import makeSbus
-from scipy.sparse import csr_matrix, csgraph
-from six import iteritems
+from scipy.sparse import csr_matrix
 
 from pandapower.auxiliary import ppException
 from pandapower.pf.bustypes import bustypes
@@ -24,6 +23,11 @@ from pandapower.pf.run_newton_raphson_pf import _get_Y_bus
 from pandapower.pf.runpf_pypower import _import_numba_extensions_if_flag_is_true
 from pandapower.pf.ppci_variables import _get_pf_variables_from_ppci
 
+try:
+    from numba import jit
+except ImportError:
+    from pandapower.pf.no_numba import jit
+
 
 class LoadflowNotConverged(ppException):
     """
@@ -32,155 +36,264 @@ class LoadflowNotConverged(ppException):
     pass
 
 
-def _make_bibc_bcbv(bus, branch, graph):
+@jit(nopython=True, cache=True)
+def _tree_traversal(indptr, indices, edge_branch, roots, nobus):  # pragma: no cover
+    """
+    traverses all subnetworks from their root buses at once and creates a spanning tree of each
+    subnetwork. A bus is connected to the tree by the first visited neighbour. The buses are
+    ordered by their removal from the stack, so that the buses of the subtree of each bus are
+    contiguous in this order: subtree(bus) = order[position[bus]:position[bus] + size[bus]]
+    """
+    order = np.empty(nobus, dtype=np.int64)
+    position = -np.ones(nobus, dtype=np.int64)
+    size = np.ones(nobus, dtype=np.int64)
+    parent = -np.ones(nobus, dtype=np.int64)
+    parent_branch = -np.ones(nobus, dtype=np.int64)
+    net_ptr = np.zeros(len(roots) + 1, dtype=np.int64)
+    visited = np.zeros(nobus, dtype=np.bool_)
+    stack = np.empty(nobus, dtype=np.int64)
+    pos = 0
+    for r in range(len(roots)):
+        root = roots[r]
+        if not visited[root]:
+            visited[root] = True
+            stack[0] = root
+            top = 1
+            while top > 0:
+                top -= 1
+                v = stack[top]
+                order[pos] = v
+                position[v] = pos
+                pos += 1
+                for k in range(indptr[v], indptr[v + 1]):
+                    u = indices[k]
+                    if not visited[u]:
+                        visited[u] = True
+                        parent[u] = v
+                        parent_branch[u] = edge_branch[k]
+                        stack[top] = u
+                        top += 1
+        net_ptr[r + 1] = pos
+    order = order[:pos]
+    # subtree sizes from the leaves to the roots
+    for p in range(pos - 1, -1, -1):
+        v = order[p]
+        if parent[v] >= 0:
+            size[parent[v]] += size[v]
+    return order, position, size, parent, parent_branch, net_ptr
+
+
+@jit(nopython=True, cache=True)
+def _path_sums(order, parent, values):  # pragma: no cover
+    """
+    sums of the values of the buses on the path from the root bus to each bus in the tree
+    """
+    sums = np.zeros_like(values)
+    for p in range(len(order)):
+        v = order[p]
+        if parent[v] >= 0:
+            sums[v] = sums[parent[v]] + values[v]
+    return sums
+
+
+@jit(nopython=True, cache=True)
+def _tree_dlf(order, position, size, parent, z_path, col, ntree):  # pragma: no cover
+    """
+    creates the DLF matrix of the spanning tree in csr format. DLF[i, j] is the sum of the
+    impedances of the branches on the common path of bus i and bus j to the root bus, i.e. the
+    impedance of the path to their lowest common ancestor a. For a fixed bus i, the buses j with
+    the common ancestor a are subtree(a) without the subtree of the next ancestor of i, which are
+    two intervals in the traversal order.
+    """
+    nobus = len(z_path)
+    top = -np.ones(nobus, dtype=np.int64)  # ancestor of the bus that is connected to the root
+    indptr = np.zeros(ntree + 1, dtype=np.int64)
+    for p in range(len(order)):
+        v = order[p]
+        u = parent[v]
+        if u < 0:
+            continue
+        top[v] = v if parent[u] < 0 else top[u]
+        indptr[col[v] + 1] = size[top[v]]
+    for i in range(ntree):
+        indptr[i + 1] += indptr[i]
+
+    indices = np.empty(indptr[ntree], dtype=np.int64)
+    data = np.empty(indptr[ntree], dtype=np.complex128)
+    for p in range(len(order)):
+        v = order[p]
+        if parent[v] < 0:
+            continue
+        k = indptr[col[v]]
+        a = v
+        # subtree of the previous ancestor, which is empty for the bus itself
+        c_start = c_end = position[v] + size[v]
+        while True:
+            for q in range(position[a], c_start):
+                indices[k] = col[order[q]]
+                data[k] = z_path[a]
+                k += 1
+            for q in range(c_end, position[a] + size[a]):
+                indices[k] = col[order[q]]
+                data[k] = z_path[a]
+                k += 1
+            if a == top[v]:
+                break
+            c_start, c_end = position[a], position[a] + size[a]
+            a = parent[a]
+    return data, indices, indptr
+
+
+def _make_bibc_bcbv(bus, branch):
     """
     performs depth-first-search bus ordering and creates Direct Load Flow (DLF) matrix
     which establishes direct relation between bus current injections and voltage drops from each bus to the root bus
 
-    :param ppc: matpower-type case data
+    The DLF matrix of the spanning trees is created directly from the subtree intervals of one
+    traversal of all subnetworks, since DLF[i, j] is the impedance of the common path of i and j
+    to the root bus. The matrices BIBC and BCBV are only created for the branches of loops, which
+    are included with Kron's reduction.
+
+    :param bus: ppci bus matrix
+    :param branch: ppci branch matrix
     :return: DLF matrix DLF = BIBC * BCBV where
                     BIBC - Bus Injection to Branch-Current
                     BCBV - Branch-Current to Bus-Voltage
-            ppc with bfs ordering
-            original bus names bfs ordered (used to convert voltage array back to normal)
+            buses of each subnetwork in traversal order, starting with its reference bus
+            phase shift of each bus from its reference bus in degree
     """
 
     nobus = bus.shape[0]
     nobranch = branch.shape[0]
 
     # reference bus is assumed as root bus for a radial network
-    refs = bus[bus[:, BUS_TYPE] == 3, BUS_I]
-    norefs = len(refs)
-
-    G = graph.copy()  # network graph
-
-    # dictionary with impedance values keyed by branch tuple (frombus, tobus)
-    # TODO use list or array, not both
-    branches_lst = list(zip(branch[:, F_BUS].real.astype(int), branch[:, T_BUS].real.astype(int)))
-    branches_arr = branch[:, F_BUS:T_BUS + 1].real.astype(int)
-    branches_ind_dict = dict(zip(zip(branches_arr[:, 0], branches_arr[:, 1]), range(0, nobranch)))
-    branches_ind_dict.update(dict(zip(zip(branches_arr[:, 1], branches_arr[:, 0]), range(0, nobranch))))
+    refs = bus[bus[:, BUS_TYPE] == 3, BUS_I].real.astype(np.int64)
+    # rows and columns of the DLF matrix are the buses without the reference buses
+    mask_root = ~(bus[:, BUS_TYPE] == 3)
+    col = np.cumsum(mask_root) - 1
+    ntree = int(mask_root.sum())
+
+    # adjacency of the network graph with the branch index of each edge
+    f = branch[:, F_BUS].real.astype(np.int64)
+    t = branch[:, T_BUS].real.astype(np.int64)
+    ends = np.concatenate((f, t))
+    adj = np.argsort(ends, kind="mergesort")
+    indices = np.concatenate((t, f))[adj]
+    edge_branch = np.concatenate((np.arange(nobranch), np.arange(nobranch)))[adj]
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(ends, minlength=nobus))))
+
+    order, position, size, parent, parent_branch, net_ptr = _tree_traversal(
+        indptr, indices, edge_branch, refs, nobus)
+    # a reference bus that was reached from another reference bus is not the root of a subnetwork
+    if np.any(parent[refs] >= 0):
+        raise NotImplementedError("The backward/forward sweep power flow (bfsw) does not support "
+                                  "more than one reference bus (e.g. ext_grid) in a connected "
+                                  "subnetwork. Use another algorithm, e.g. 'nr'.")
+    buses_ordered_bfs_nets = [order[net_ptr[i]:net_ptr[i + 1]] for i in range(len(refs))]
 
     tap = branch[:, TAP]  # * np.exp(1j * np.pi / 180 * branch[:, SHIFT])
     z_ser = (branch[:, BR_R].real + 1j * branch[:, BR_X].real) * tap  # series impedance
-    z_brch_dict = dict(zip(branches_lst, z_ser))
-
-    # initialization of lists for building sparse BIBC and BCBV matrices
-    rowi_BIBC = []
-    coli_BIBC = []
-    data_BIBC = []
-    data_BCBV = []
-
-    buses_ordered_bfs_nets = []
-    for ref in refs:
-        # ordering buses according to breadth-first-search (bfs)
-        buses_ordered_bfs, predecs_bfs = csgraph.breadth_first_order(G, ref, directed=False, return_predecessors=True)
-        buses_ordered_bfs_nets.append(buses_ordered_bfs)
-        branches_ordered_bfs = list(zip(predecs_bfs[buses_ordered_bfs[1:]], buses_ordered_bfs[1:]))
-        G_tree = csgraph.breadth_first_tree(G, ref, directed=False)
-
-        # if multiple networks get subnetwork branches
-        if norefs > 1:
-            branches_sub_mask = (np.in1d(branches_arr[:, 0], buses_ordered_bfs) &
-                                 np.in1d(branches_arr[:, 1], buses_ordered_bfs))
-            branches = np.sort(branches_arr[branches_sub_mask, :], axis=1)
-        else:
-            branches = np.sort(branches_arr, axis=1)
-
-        # identify loops if graph is not a tree
-        branches_loops = []
-        if G_tree.nnz < branches.shape[0]:
-            G_tree_nnzs = G_tree.nonzero()
-            branches_tree = np.sort(np.array([G_tree_nnzs[0], G_tree_nnzs[1]]).T, axis=1)
-            branches_loops = (set(zip(branches[:, 0], branches[:, 1])) -
-                              set(zip(branches_tree[:, 0], branches_tree[:, 1])))
-
-        # #------ building BIBC and BCBV martrices ------
-        # branches in trees
-        brchi = 0
-        for brch in branches_ordered_bfs:
-            tree_down, predecs = csgraph.breadth_first_order(G_tree, brch[1], directed=True, return_predecessors=True)
-            if len(tree_down) == 1:  # If at leaf
-                pass
-            if brch in z_brch_dict:
-                z_br = z_brch_dict[brch]
-            else:
-                z_br = z_brch_dict[brch[::-1]]
-            rowi_BIBC += [branches_ind_dict[brch]] * len(tree_down)
-            coli_BIBC += list(tree_down)
-            data_BCBV += [z_br] * len(tree_down)
-            data_BIBC += [1] * len(tree_down)
-
-        # branches from loops
+    in_tree = parent_branch >= 0
+    z_bus = np.zeros(nobus, dtype=np.complex128)
+    z_bus[in_tree] = z_ser[parent_branch[in_tree]]
+
+    z_path = _path_sums(order, parent, z_bus)
+    data, indices, indptr = _tree_dlf(order, position, size, parent, z_path, col, ntree)
+    DLF = csr_matrix((data, indices, indptr), shape=(ntree, ntree))
+
+    # branches of loops are the branches of the subnetworks that are not part of the trees
+    is_tree_branch = np.zeros(nobranch, dtype=bool)
+    is_tree_branch[parent_branch[in_tree]] = True
+    branches_loops = np.flatnonzero(~is_tree_branch & (position[f] >= 0) & (position[t] >= 0))
+    if len(branches_loops):
+        # each loop consists of the loop branch and the path from its to bus back to its from
+        # bus in the tree (BIBC and BCBV entries of the loop currents)
+        depth = _path_sums(order, parent, np.ones(nobus, dtype=np.int64))
+        M = np.zeros((len(branches_loops), ntree), dtype=np.complex128)
+        rowi_BIBC, coli_BIBC, data_BIBC = [], [], []
         for loop_i, brch_loop in enumerate(branches_loops):
-            path_lens, path_preds = csgraph.shortest_path(G_tree, directed=False,
-                                                          indices=brch_loop, return_predecessors=True)
-            init, end = brch_loop
-            loop = [end]
+            init, end = f[brch_loop], t[brch_loop]
+            # buses below the branches from end up to the common ancestor are passed upwards
+            # (direction -1), the ones from there down to init are passed downwards
+            loop_buses, directions = [], []
             while init != end:
-                end = path_preds[0, end]
-                loop.append(end)
-
-            loop_size = len(loop)
-            coli_BIBC += [nobus + loop_i] * loop_size
-            for i in range(len(loop)):
-                brch = (loop[i - 1], loop[i])
-                if np.argwhere(buses_ordered_bfs == brch[0]) < np.argwhere(buses_ordered_bfs == brch[1]):
-                    brch_direct = 1
-                else:
-                    brch_direct = -1
-                data_BIBC.append(brch_direct)
-
-                if brch in branches_ind_dict:
-                    rowi_BIBC.append(branches_ind_dict[brch])
-                else:
-                    rowi_BIBC.append(branches_ind_dict[brch[::-1]])
-
-                if brch in z_brch_dict:
-                    data_BCBV.append(z_brch_dict[brch] * brch_direct)
+                if depth[end] >= depth[init]:
+                    loop_buses.append(end)
+                    directions.append(-1)
+                    end = parent[end]
                 else:
-                    data_BCBV.append(z_brch_dict[brch[::-1]] * brch_direct)
-
-                brchi += 1
-
-    # construction of the BIBC matrix
-    # column indices correspond to buses: assuming root bus is always 0 after ordering indices are subtracted by 1
-    BIBC = csr_matrix((data_BIBC, (rowi_BIBC, np.array(coli_BIBC) - norefs)),
-                      shape=(nobranch, nobranch))
-    BCBV = csr_matrix((data_BCBV, (rowi_BIBC, np.array(coli_BIBC) - norefs)),
-                      shape=(nobranch, nobranch)).transpose()
-
-    if BCBV.shape[0] > nobus - 1:  # if nbrch > nobus - 1 -> network has loops
-        DLF_loop = BCBV * BIBC
+                    loop_buses.append(init)
+                    directions.append(1)
+                    init = parent[init]
+            loop_buses = np.array(loop_buses, dtype=np.int64)
+            directions = np.array(directions)
+            rowi_BIBC += [brch_loop] + list(parent_branch[loop_buses])
+            coli_BIBC += [loop_i] * (len(loop_buses) + 1)
+            data_BIBC += [1] + list(directions)
+            # M = BCBV_loop * BIBC_tree: the loop impedances of the tree branches with the
+            # buses of their subtrees, added as differences over the traversal order
+            z_dir = z_bus[loop_buses] * directions
+            diff = np.zeros(len(order) + 1, dtype=np.complex128)
+            np.add.at(diff, position[loop_buses], z_dir)
+            np.add.at(diff, position[loop_buses] + size[loop_buses], -z_dir)
+            m_row = np.cumsum(diff)[:-1]
+            is_bus = mask_root[order]
+            M[loop_i, col[order[is_bus]]] = m_row[is_bus]
+        BIBC_loop = csr_matrix((data_BIBC, (rowi_BIBC, coli_BIBC)),
+                               shape=(nobranch, len(branches_loops)))
+        N = (BIBC_loop.T * sp.sparse.diags(z_ser) * BIBC_loop).A
+        M = csr_matrix(M)
         # DLF = [A  M.T ]
         #       [M  N   ]
-        A = DLF_loop[0:nobus - 1, 0:nobus - 1]
-        M = DLF_loop[nobus - 1:, 0:nobus - 1]
-        N = DLF_loop[nobus - 1:, nobus - 1:].A
         # considering the fact that number of loops is relatively small, N matrix is expected to be small and dense
         # ...in that case dense version is more efficient, i.e. N is transformed to dense and
         # inverted using sp.linalg.inv(N)
-        DLF = A - M.T * csr_matrix(sp.linalg.inv(N)) * M  # Kron's Reduction
-    else:  # no loops -> radial network
-        DLF = BCBV * BIBC
+        DLF = DLF - M.T * csr_matrix(sp.linalg.inv(N)) * M  # Kron's Reduction
 
-    return DLF, buses_ordered_bfs_nets
+    # phase shift of the trafos on the path from the root bus: buses below a trafo that is passed
+    # from its hv side are shifted by -shift_degree, buses below its lv side by +shift_degree
+    shift = np.zeros(nobus)
+    tree_shift = branch[parent_branch[in_tree], SHIFT].real
+    passed_from_hv = f[parent_branch[in_tree]] == parent[in_tree]
+    shift[in_tree] = np.where(passed_from_hv, -tree_shift, tree_shift)
+    bus_shift_degree = _path_sums(order, parent, shift)
 
+    return DLF, buses_ordered_bfs_nets, bus_shift_degree
 
-def _get_bibc_bcbv(ppci, options, bus, branch, graph):
+
+def _get_bibc_bcbv(ppci, options, bus, branch):
+    """
+    returns the DLF matrix of the ppci. The matrix is cached in ppci["internal"] with the branch
+    data and reference buses it was built for and is reused as long as they are unchanged, also
+    in the following power flows of the net (see _pd2ppc). With recycle["bfsw"], the cached
+    matrix is reused without checking the branch data.
+    """
     recycle = options["recycle"]
+    internal = ppci["internal"]
+    key = _get_dlf_key(bus, branch)
 
-    if recycle["bfsw"] and ppci["internal"]["DLF"].size:
-        DLF, buses_ordered_bfs_nets = ppci["internal"]['DLF'], \
-                                      ppci["internal"]['buses_ord_bfs_nets']
+    if "bfsw_key" in internal and (recycle["bfsw"] or _dlf_keys_equal(internal["bfsw_key"], key)):
+        DLF, buses_ordered_bfs_nets, bus_shift_degree = \
+            internal['DLF'], internal['buses_ord_bfs_nets'], internal['bfsw_bus_shift']
     else:
         ## build matrices
-        DLF, buses_ordered_bfs_nets = _make_bibc_bcbv(bus, branch, graph)
-        if recycle["bfsw"]:
-            ppci["internal"]['DLF'], \
-            ppci["internal"]['buses_ord_bfs_nets'] = DLF, buses_ordered_bfs_nets
+        DLF, buses_ordered_bfs_nets, bus_shift_degree = _make_bibc_bcbv(bus, branch)
+        internal['DLF'], internal['buses_ord_bfs_nets'], internal['bfsw_bus_shift'], \
+            internal['bfsw_key'] = DLF, buses_ordered_bfs_nets, bus_shift_degree, key
+
+    return ppci, DLF, buses_ordered_bfs_nets, bus_shift_degree
 
-    return ppci, DLF, buses_ordered_bfs_nets
+
+def _get_dlf_key(bus, branch):
+    # the DLF matrix depends on the connections, series impedances, taps and phase shifts of the
+    # branches and on the reference buses
+    return (bus.shape[0], np.flatnonzero(bus[:, BUS_TYPE] == 3),
+            branch[:, [F_BUS, T_BUS, BR_R, BR_X, TAP, SHIFT]].copy())
+
+
+def _dlf_keys_equal(key1, key2):
+    return key1[0] == key2[0] and all(k1.shape == k2.shape and np.array_equal(k1, k2)
+                                      for k1, k2 in zip(key1[1:], key2[1:]))
 
 
 def _makeYsh_bfsw(bus, branch, baseMVA):
@@ -256,7 +369,8 @@ def _bfswpf(DLF, bus, gen, branch, baseMVA, Ybus, Sbus, V0, ref, pv, pq, buses_o
     ngen = gen.shape[0]
 
     mask_root = ~ (bus[:, BUS_TYPE] == 3)  # mask for eliminating root bus
-    norefs = len(ref)
+    # DLF indices of the buses
+    dlf_index = np.cumsum(mask_root) - 1
 
     Ysh = _makeYsh_bfsw(bus, branch, baseMVA)
 
@@ -268,9 +382,11 @@ def _bfswpf(DLF, bus, gen, branch, baseMVA, Ybus, Sbus, V0, ref, pv, pq, buses_o
 
     # initiate reference voltage vector
     V_ref = np.ones(nobus, dtype=complex)
-    for neti, buses_ordered_bfs in enumerate(buses_ordered_bfs_nets):
-        V_ref[buses_ordered_bfs] *= V0[ref[neti]]
+    net_sizes = [len(buses_ordered_bfs) for buses_ordered_bfs in buses_ordered_bfs_nets]
+    V_ref[np.concatenate(buses_ordered_bfs_nets)] = np.repeat(V0[ref], net_sizes)
     V = V0.copy()
+    if len(pv):
+        DLF_diag = DLF.diagonal()
 
     n_iter = 0
     converged = 0
@@ -290,11 +406,10 @@ def _bfswpf(DLF, bus, gen, branch, baseMVA, Ybus, Sbus, V0, ref, pv, pq, buses_o
         inner_loop_converged = False
         while not inner_loop_converged and len(pv) > 0:
 
-            pvi = pv - norefs  # internal PV buses indices, assuming reference node is always 0
+            pvi = dlf_index[pv]  # internal PV buses indices
 
             Vmis = (np.abs(gen[gen_pv, VG])) ** 2 - (np.abs(V[pv])) ** 2
-            # TODO improve getting values from sparse DLF matrix - DLF[pvi, pvi] is unefficient
-            dQ = (Vmis / (2 * DLF[pvi, pvi].A1.imag)).flatten()
+            dQ = (Vmis / (2 * DLF_diag[pvi].imag)).flatten()
 
             gen[gen_pv, QG] += dQ
 
@@ -385,28 +500,16 @@ def _run_bfswpf(ppci, options, **kwargs):
 
     numba, makeYbus = _import_numba_extensions_if_flag_is_true(numba)
 
-    nobus = bus.shape[0]
-    nobranch = branch.shape[0]
-
     # generate Sbus
     Sbus = makeSbus(baseMVA, bus, gen)
     # generate results for original bus ordering
     # Ybus, Yf, Yt = makeYbus(baseMVA, bus, branch)
     ppci, Ybus, Yf, Yt = _get_Y_bus(ppci, options, makeYbus, baseMVA, bus, branch)
 
-    # creating network graph from list of branches
-    bus_from = branch[:, F_BUS].real.astype(int)
-    bus_to = branch[:, T_BUS].real.astype(int)
-    G = csr_matrix((np.ones(nobranch), (bus_from, bus_to)),
-                   shape=(nobus, nobus))
-    # create spanning trees using breadth-first-search
+    # depth-first-search bus ordering and generating Direct Load Flow matrix DLF = BCBV * BIBC
     # TODO add efficiency warning if a network is heavy-meshed
-    G_trees = []
-    for refbus in ref:
-        G_trees.append(csgraph.breadth_first_tree(G, refbus, directed=False))
-
-        # depth-first-search bus ordering and generating Direct Load Flow matrix DLF = BCBV * BIBC
-        ppci, DLF, buses_ordered_bfs_nets = _get_bibc_bcbv(ppci, options, bus, branch, G)
+    ppci, DLF, buses_ordered_bfs_nets, bus_shift_degree = _get_bibc_bcbv(ppci, options, bus,
+                                                                         branch)
 
     # if there are trafos with phase-shift calculate Ybus without phase-shift for bfswpf
     any_trafo_shift = (branch[:, SHIFT] != 0).any()
@@ -424,30 +527,7 @@ def _run_bfswpf(ppci, options, **kwargs):
 
     # if phase-shifting trafos are present adjust final state vector angles accordingly
     if calculate_voltage_angles and any_trafo_shift:
-        brch_shift_mask = branch[:, SHIFT] != 0
-        trafos_shift = dict(list(zip(list(zip(branch[brch_shift_mask, F_BUS].real.astype(int),
-                                              branch[brch_shift_mask, T_BUS].real.astype(int))),
-                                     branch[brch_shift_mask, SHIFT].real)))
-        for trafo_ind, shift_degree in iteritems(trafos_shift):
-            neti = 0
-            # if multiple reference nodes, find in which network trafo is located
-            if len(ref) > 0:
-                for refbusi in range(len(ref)):
-                    if trafo_ind[0] in buses_ordered_bfs_nets[refbusi]:
-                        neti = refbusi
-                        break
-            G_tree = G_trees[neti]
-            buses_ordered_bfs = buses_ordered_bfs_nets[neti]
-            if (np.argwhere(buses_ordered_bfs == trafo_ind[0]) <
-                    np.argwhere(buses_ordered_bfs == trafo_ind[1])):
-                lv_bus = trafo_ind[1]
-                shift_degree *= -1
-            else:
-                lv_bus = trafo_ind[0]
-
-            buses_shifted_from_root = csgraph.breadth_first_order(G_tree, lv_bus,
-                                                                  directed=True, return_predecessors=False)
-            V_final[buses_shifted_from_root] *= np.exp(1j * np.pi / 180 * shift_degree)
+        V_final *= np.exp(1j * np.pi / 180 * bus_shift_degree)
 
     # #----- output results to ppc ------
     ppci["et"] = time() - time_start  # pf time end
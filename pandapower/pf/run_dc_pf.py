@@ -7,17 +7,17 @@
 
 from time import time
 
-from numpy import flatnonzero as find, pi, zeros, real, bincount
+from numpy import flatnonzero as find, pi, zeros, real, bincount, newaxis, tile
 
 from pandapower.idx_brch import PF, PT, QF, QT
-from pandapower.idx_bus import VA, GS
+from pandapower.idx_bus import VA, GS, PD
 from pandapower.idx_gen import PG, GEN_BUS
 from pandapower.pf.dcpf import dcpf
 from pandapower.pf.makeBdc import makeBdc
 from pandapower.pf.makeSbus import makeSbus
 from pandapower.pf.ppci_variables import _get_pf_variables_from_ppci, _store_results_from_pf_in_ppci
 
-def _run_dc_pf(ppci):
+def _run_dc_pf(ppci, linear_solver="superlu"):
     t0 = time()
     baseMVA, bus, gen, branch, ref, pv, pq, on, gbus, _, refgen = _get_pf_variables_from_ppci(ppci)
 
@@ -32,7 +32,7 @@ def _run_dc_pf(ppci):
     Pbus = makeSbus(baseMVA, bus, gen) - Pbusinj - bus[:, GS] / baseMVA
 
     ## "run" the power flow
-    Va = dcpf(B, Pbus, Va0, ref, pv, pq)
+    Va = dcpf(B, Pbus, Va0, ref, pv, pq, linear_solver, cache=ppci.get("internal"))
 
     ## update data matrices with solution
     branch[:, [QF, QT]] = zeros((branch.shape[0], 2))
@@ -56,3 +56,25 @@ def _run_dc_pf(ppci):
     iterations = 1
     ppci = _store_results_from_pf_in_ppci(ppci, bus, gen, branch, success, iterations, et)
     return ppci
+
+
+def _run_dc_pf_batch(ppci, pd_mw, linear_solver="superlu"):
+    """
+    Solves the DC power flow for the bus loads pd_mw (scenarios x ppci buses) with one
+    factorization of the reduced B matrix, which is cached in ppci["internal"]. Returns the bus
+    voltage angles in radians (scenarios x ppci buses) and the active power flows at the from side
+    of the branches in MW (scenarios x ppci branches).
+    """
+    baseMVA, bus, gen, branch, ref, pv, pq, _, _, _, _ = _get_pf_variables_from_ppci(ppci)
+    n_scenarios = pd_mw.shape[0]
+
+    Va0 = tile((bus[:, VA] * (pi / 180.))[:, newaxis], (1, n_scenarios))
+    B, Bf, Pbusinj, Pfinj = makeBdc(bus, branch)
+
+    # injections without the bus loads, which are given per scenario
+    Pbus = real(makeSbus(baseMVA, bus, gen)) + bus[:, PD] / baseMVA - Pbusinj - bus[:, GS] / baseMVA
+    Pbus = Pbus[:, newaxis] - pd_mw.T / baseMVA
+
+    Va = dcpf(B, Pbus, Va0, ref, pv, pq, linear_solver, cache=ppci["internal"])
+    p_from = (Bf * Va + Pfinj[:, newaxis]) * baseMVA
+    return Va.T, p_from.T
@@ -7,7 +7,7 @@
 
 from time import time
 
-from numpy import flatnonzero as find, r_, zeros, argmax, setdiff1d
+from numpy import flatnonzero as find, r_, zeros, argmax, setdiff1d, empty, complex128
 
 from pandapower.idx_bus import PD, QD, BUS_TYPE, PQ, REF
 from pandapower.idx_gen import PG, QG, QMAX, QMIN, GEN_BUS, GEN_STATUS
@@ -42,7 +42,7 @@ def _run_newton_raphson_pf(ppci, options):
 
     t0 = time()
     if options["init_va_degree"] == "dc":
-        ppci = _run_dc_pf(ppci)
+        ppci = _run_dc_pf(ppci, options["linear_solver"])
     if options["enforce_q_lims"]:
         ppci, success, iterations, bus, gen, branch = _run_ac_pf_with_qlims_enforced(ppci, options)
     else:
@@ -51,6 +51,35 @@ def _run_newton_raphson_pf(ppci, options):
     ppci = _store_results_from_pf_in_ppci(ppci, bus, gen, branch, success, iterations, et)
     return ppci
 
+def _run_newton_raphson_pf_batch(ppci, options, pd_mw, qd_mvar):
+    """Runs a newton raphson power flow for every row (scenario) of the bus load matrices pd_mw and
+    qd_mvar (scenarios x ppci buses).
+
+    Ybus and the Jacobian template are only built once for all scenarios. Every
+    scenario is started from the initial voltage vector of the base case.
+    """
+    t0 = time()
+    if options["init_va_degree"] == "dc":
+        ppci = _run_dc_pf(ppci, options["linear_solver"])
+    makeYbus, _ = _get_numba_functions(ppci, options)
+
+    baseMVA, bus, gen, branch, ref, pv, pq, _, _, V0, ref_gens = _get_pf_variables_from_ppci(ppci)
+    ppci, Ybus, Yf, Yt = _get_Y_bus(ppci, options, makeYbus, baseMVA, bus, branch)
+    Ybus = Ybus.tocsr()
+
+    n_scenarios = pd_mw.shape[0]
+    V = empty((n_scenarios, bus.shape[0]), dtype=complex128)
+    success = zeros(n_scenarios, dtype=bool)
+    iterations = zeros(n_scenarios, dtype=int)
+    for s in range(n_scenarios):
+        bus[:, PD] = pd_mw[s]
+        bus[:, QD] = qd_mvar[s]
+        Sbus = makeSbus(baseMVA, bus, gen)
+        V[s], success[s], iterations[s], _, _, _ = newtonpf(Ybus, Sbus, V0, pv, pq, ppci, options)
+    ppci["et"] = time() - t0
+    return ppci, V, success, iterations
+
+
 def _get_Y_bus(ppci, options, makeYbus, baseMVA, bus, branch):
     recycle = options["recycle"]
 
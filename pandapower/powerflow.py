@@ -3,21 +3,32 @@
 # Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
 # and Energy System Technology (IEE), Kassel. All rights reserved.
 
-from pandapower.idx_bus import VM
+import numpy as np
+from scipy.sparse import coo_matrix
+
+from pandapower.idx_bus import VM, PD, QD
 from pandapower.auxiliary import ppException, _clean_up
 from pandapower.create import create_gen
-from pandapower.pd2ppc import _pd2ppc, _update_ppc
+from pandapower.pd2ppc import _pd2ppc, _update_ppc, _get_recycle_from_changes, \
+    _store_change_tracking
 from pandapower.pf.run_bfswpf import _run_bfswpf
-from pandapower.pf.run_dc_pf import _run_dc_pf
-from pandapower.pf.run_newton_raphson_pf import _run_newton_raphson_pf
+from pandapower.pf.run_dc_pf import _run_dc_pf, _run_dc_pf_batch
+from pandapower.pf.run_newton_raphson_pf import _run_newton_raphson_pf, _run_newton_raphson_pf_batch
 from pandapower.pf.runpf_pypower import _runpf_pypower
-from pandapower.results import _extract_results, _copy_results_ppci_to_ppc, reset_results, verify_results
+from pandapower.results import _extract_results, _copy_results_ppci_to_ppc, reset_results, \
+    verify_results, _extract_results_batch
 from pandapower.pf.makeYbus_pypower import makeYbus as makeYbus_pypower
 from pandapower.pf.pfsoln_pypower import pfsoln as pfsoln_pypower
 from pandapower.pf.ppci_variables import _get_pf_variables_from_ppci
 import pandas as pd
 
 
+# internal variables of a power flow that are needed to create the res_* tables
+PENDING_RESULTS_KEYS = ["_ppc", "_options", "_pd2ppc_lookups", "_is_elements"]
+# elements with P/Q injections that can be changed in batch power flows and sessions
+PQ_ELEMENTS = ["load", "sgen", "storage"]
+
+
 class AlgorithmUnknown(ppException):
     """
     Exception being raised in case optimal powerflow did not converge.
@@ -44,9 +55,23 @@ def _powerflow(net, **kwargs):
     mode = net["_options"]["mode"]
     algorithm = net["_options"]["algorithm"]
     max_iteration = net["_options"]["max_iteration"]
+    result_mode = net["_options"]["result_mode"]
+    if result_mode not in ["tables", "arrays"]:
+        raise ValueError("result_mode has to be 'tables' or 'arrays', not %s" % result_mode)
 
     net["converged"] = False
     net["OPF_converged"] = False
+    if init_results:
+        # the results of the last power flow are the initial values
+        _extract_pending_results(net)
+    else:
+        net.pop("_pending_results", None)
+    tracking = None
+    if isinstance(recycle, str) and recycle == "auto":
+        # the parts of the ppc that have to be rebuilt are found from the changes in the net
+        recycle, level, state = _get_recycle_from_changes(net)
+        net["_options"]["recycle"] = recycle
+        tracking = (state, level)
     _add_auxiliary_elements(net)
 
     if not ac or init_results:
@@ -80,14 +105,132 @@ def _powerflow(net, **kwargs):
     # raise if PF was not successful. If DC -> success is always 1
     if result["success"] != 1:
         _clean_up(net, res=False)
+        net.pop("_change_tracking", None)
         raise LoadflowNotConverged("Power Flow {0} did not converge after "
                                    "{1} iterations!".format(algorithm, max_iteration))
     else:
         net["_ppc"] = result
         net["converged"] = True
+        if tracking is not None:
+            _store_change_tracking(net, *tracking)
+
+    if result_mode == "arrays":
+        # the res_* tables are only created on access (see pandapowerNet.__getitem__)
+        net["_pending_results"] = {key: net[key] for key in PENDING_RESULTS_KEYS}
+        _clean_up(net, res=False)
+    else:
+        _extract_results(net, result)
+        _clean_up(net)
+
 
-    _extract_results(net, result)
+def _extract_pending_results(net):
+    """
+    Creates the res_* tables of the last power flow with result_mode="arrays" from the results in
+    the ppc of this power flow, if they have not been created yet.
+    """
+    pending = net.pop("_pending_results", None)
+    if pending is None:
+        return
+    # the internal variables might have been replaced by other calculations in the meantime
+    current = {key: net.get(key) for key in PENDING_RESULTS_KEYS}
+    net.update(pending)
+    _add_auxiliary_elements(net)
+    if not net["_options"]["ac"] or net["_options"]["init_results"]:
+        verify_results(net)
+    else:
+        reset_results(net)
+    _extract_results(net, net["_ppc"])
     _clean_up(net)
+    net.update(current)
+
+
+def _powerflow_batch(net, p_kw, q_kvar, element):
+    """
+    Gets called by runpp_batch. Converts the net once and solves one power flow for every row of
+    p_kw / q_kvar (scenarios x elements of net[element]).
+    """
+    net["converged"] = False
+    bus_index = net["bus"].index.values
+    _add_auxiliary_elements(net)
+
+    ppc, ppci = _pd2ppc(net)
+    net["_ppc"] = ppc
+    pd_mw, qd_mvar = _get_batch_bus_loads(net, ppci, p_kw, q_kvar, element)
+
+    # ----- run the power flows -----
+    ppci, V, success, iterations = _run_newton_raphson_pf_batch(ppci, net["_options"], pd_mw,
+                                                                qd_mvar)
+
+    results = _extract_results_batch(net, ppc, ppci, V, bus_index)
+    _clean_up(net, res=False)
+    results["converged"] = success
+    results["iterations"] = iterations
+    net["converged"] = bool(success.all())
+    return results
+
+
+def _powerflow_dc_batch(net, p_kw, element):
+    """
+    Gets called by rundcpp_batch. Converts the net once and solves the DC power flows for all rows
+    of p_kw (scenarios x elements of net[element]) with one factorization of the B matrix.
+    """
+    net["converged"] = False
+    bus_index = net["bus"].index.values
+    # the factorization of the last dc power flow is reused if the B matrix has not changed
+    B_solver = None
+    if net.get("_ppc") is not None:
+        B_solver = net["_ppc"].get("internal", {}).get("B_solver")
+    _add_auxiliary_elements(net)
+
+    ppc, ppci = _pd2ppc(net)
+    net["_ppc"] = ppc
+    if B_solver is not None:
+        ppci["internal"]["B_solver"] = B_solver
+    pd_mw, _ = _get_batch_bus_loads(net, ppci, p_kw, None, element)
+
+    # ----- run the power flows -----
+    Va, p_from_mw = _run_dc_pf_batch(ppci, pd_mw, net["_options"]["linear_solver"])
+    ppc["internal"] = ppci["internal"]
+
+    n_scenarios = Va.shape[0]
+    bus_idx = net["_pd2ppc_lookups"]["bus"][bus_index]
+    bus_is = bus_idx < ppci["bus"].shape[0]
+    va_degree = np.full((n_scenarios, len(bus_index)), np.nan)
+    va_degree[:, bus_is] = np.rad2deg(Va[:, bus_idx[bus_is]])
+    p_from_kw = np.zeros((n_scenarios, ppc["branch"].shape[0]))
+    p_from_kw[:, ppci["internal"]["branch_is"]] = p_from_mw * 1e3
+    _clean_up(net, res=False)
+    net["converged"] = True
+    return {"va_degree": va_degree, "p_from_kw": p_from_kw, "p_to_kw": -p_from_kw}
+
+
+def _get_injection_connection_matrix(net, element, n_bus, bus_lookup):
+    """
+    Returns the connection matrix (ppci bus x element) of the PQ elements in net[element], which
+    already includes the scaling and the conversion from kW to MW. Out of service elements and
+    elements at out of service buses have no entries.
+    """
+    el = net[element]
+    vl = net["_is_elements"][element] * el["scaling"].values / np.float64(1000.)
+    b = bus_lookup[el["bus"].values]
+    connected = (vl != 0) & (b < n_bus)
+    return coo_matrix((vl[connected], (b[connected], np.arange(len(el))[connected])),
+                      shape=(n_bus, len(el))).tocsr()
+
+
+def _get_batch_bus_loads(net, ppci, p_kw, q_kvar, element):
+    """
+    Returns the bus loads PD / QD (scenarios x ppci buses) in MW / MVAr if the power of the elements
+    in net[element] is replaced by the rows of p_kw / q_kvar. If q_kvar is None, QD is None.
+    """
+    el = net[element]
+    C = _get_injection_connection_matrix(net, element, ppci["bus"].shape[0],
+                                         net["_pd2ppc_lookups"]["bus"])
+    pd_mw = ppci["bus"][:, PD] - C * el["p_kw"].values + (C * p_kw.T).T
+    qd_mvar = None
+    if q_kvar is not None:
+        qd_mvar = ppci["bus"][:, QD] - C * el["q_kvar"].values + (C * q_kvar.T).T
+    return pd_mw, qd_mvar
 
 
 def _run_pf_algorithm(ppci, options, **kwargs):
@@ -107,7 +250,7 @@ def _run_pf_algorithm(ppci, options, **kwargs):
         else:
             raise AlgorithmUnknown("Algorithm {0} is unknown!".format(algorithm))
     else:
-        result = _run_dc_pf(ppci)
+        result = _run_dc_pf(ppci, options["linear_solver"])
 
     return result
 
@@ -125,6 +268,8 @@ def _pf_without_branches(ppci, options):
 
 
 def _add_auxiliary_elements(net):
+    # results of a power flow with result_mode="arrays" refer to the net without auxiliary elements
+    _extract_pending_results(net)
     # TODO: include directly in pd2ppc so that buses are only in ppc, not in pandapower
     if len(net["trafo3w"]) > 0:
         _create_trafo3w_buses(net)
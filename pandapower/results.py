@@ -9,6 +9,8 @@ import copy
 import numpy as np
 import pandas as pd
 
+from pandapower.idx_brch import F_BUS, T_BUS
+from pandapower.idx_bus import BASE_KV
 from pandapower.results_branch import _get_branch_results
 from pandapower.results_bus import _get_bus_results, _get_p_q_results, _set_buses_out_of_service, \
     _get_shunt_results, _get_p_q_results_opf, _get_bus_v_results
@@ -49,6 +51,43 @@ def _extract_results_se(net, ppc):
     _get_branch_results(net, ppc, bus_lookup_aranged, bus_pq)
 
 
+def _extract_results_batch(net, ppc, ppci, V, bus_index):
+    """
+    Calculates bus voltages and branch flows for the voltage matrix V (scenarios x ppci buses).
+    Bus results are ordered as bus_index, branch results as the branches in ppc (see
+    net._pd2ppc_lookups["branch"]). Out of service buses get nan, out of service branches zero.
+    """
+    baseMVA = ppci["baseMVA"]
+    n_scenarios, n_bus_ppci = V.shape
+
+    bus_idx = net["_pd2ppc_lookups"]["bus"][bus_index]
+    bus_is = bus_idx < n_bus_ppci
+    vm_pu = np.full((n_scenarios, len(bus_index)), np.nan)
+    va_degree = np.full((n_scenarios, len(bus_index)), np.nan)
+    vm_pu[:, bus_is] = np.abs(V[:, bus_idx[bus_is]])
+    va_degree[:, bus_is] = np.angle(V[:, bus_idx[bus_is]], deg=True)
+
+    # branch flows of all scenarios at once: Sf = V[f] * conj(Yf * V)
+    branch_is = ppci["internal"]["branch_is"]
+    f = ppci["branch"][:, F_BUS].real.astype(int)
+    t = ppci["branch"][:, T_BUS].real.astype(int)
+    Yf, Yt = ppci["internal"]["Yf"], ppci["internal"]["Yt"]
+    s_ft = np.zeros((2, n_scenarios, ppc["branch"].shape[0]), dtype=np.complex128)
+    s_ft[0][:, branch_is] = V[:, f] * np.conj(Yf * V.T).T * baseMVA
+    s_ft[1][:, branch_is] = V[:, t] * np.conj(Yt * V.T).T * baseMVA
+
+    # currents in kA (S in MVA, V in kV)
+    base_kv = ppci["bus"][:, BASE_KV]
+    i_ft = np.zeros((2, n_scenarios, ppc["branch"].shape[0]))
+    i_ft[0][:, branch_is] = np.abs(s_ft[0][:, branch_is]) / (np.abs(V[:, f]) * base_kv[f]) / np.sqrt(3)
+    i_ft[1][:, branch_is] = np.abs(s_ft[1][:, branch_is]) / (np.abs(V[:, t]) * base_kv[t]) / np.sqrt(3)
+
+    return {"vm_pu": vm_pu, "va_degree": va_degree,
+            "p_from_kw": s_ft[0].real * 1e3, "q_from_kvar": s_ft[0].imag * 1e3,
+            "p_to_kw": s_ft[1].real * 1e3, "q_to_kvar": s_ft[1].imag * 1e3,
+            "i_from_ka": i_ft[0], "i_to_ka": i_ft[1]}
+
+
 def _get_costs(net, ppc):
     net.res_cost = ppc['obj']
 
@@ -100,6 +139,8 @@ def get_elements_to_init():
 
 
 def reset_results(net):
+    # results of an earlier power flow with result_mode="arrays" are replaced as well
+    net.pop("_pending_results", None)
     elements_to_empty = get_elements_to_empty()
     for element in elements_to_empty:
         empty_res_element(net, "res_" + element)
@@ -280,3 +280,39 @@ def _get_switch_results(net, i_ft):
         i_ka = np.max(i_ft[f:t], axis=1)
     net["res_switch"] = pd.DataFrame(data=i_ka, columns=["i_ka"],
                                      index=net.switch[net._closed_bb_switches].index)
+
+
+def _get_branch_results_batch(net, res, element):
+    """
+    Calculates the result columns of res_line / res_trafo from the branch flow arrays (scenarios x
+    ppc branches) returned by _extract_results_batch. Returns a dict column -> array (scenarios x
+    elements).
+    """
+    if element not in net._pd2ppc_lookups["branch"]:
+        return {}
+    f, t = net._pd2ppc_lookups["branch"][element]
+    p_f, q_f = res["p_from_kw"][:, f:t], res["q_from_kvar"][:, f:t]
+    p_t, q_t = res["p_to_kw"][:, f:t], res["q_to_kvar"][:, f:t]
+    i_f, i_t = res["i_from_ka"][:, f:t], res["i_to_ka"][:, f:t]
+    if element == "line":
+        line_df = net["line"]
+        i_ka = np.maximum(i_f, i_t)
+        i_max = line_df["max_i_ka"].values * line_df["df"].values * line_df["parallel"].values
+        return {"p_from_kw": p_f, "q_from_kvar": q_f, "p_to_kw": p_t, "q_to_kvar": q_t,
+                "pl_kw": p_f + p_t, "ql_kvar": q_f + q_t, "i_from_ka": i_f, "i_to_ka": i_t,
+                "i_ka": i_ka, "loading_percent": i_ka / i_max * 100}
+    elif element == "trafo":
+        trafo_df = net["trafo"]
+        if net["_options"]["trafo_loading"] == "power":
+            ld_hv = np.sqrt(p_f ** 2 + q_f ** 2)
+            ld_lv = np.sqrt(p_t ** 2 + q_t ** 2)
+        else:
+            ld_hv = i_f * trafo_df["vn_hv_kv"].values * 1000. * np.sqrt(3)
+            ld_lv = i_t * trafo_df["vn_lv_kv"].values * 1000. * np.sqrt(3)
+        loading_percent = np.maximum(ld_hv, ld_lv) / trafo_df["sn_kva"].values * 100. / \
+            trafo_df["parallel"].values / trafo_df["df"].values
+        return {"p_hv_kw": p_f, "q_hv_kvar": q_f, "p_lv_kw": p_t, "q_lv_kvar": q_t,
+                "pl_kw": p_f + p_t, "ql_kvar": q_f + q_t, "i_hv_ka": i_f, "i_lv_ka": i_t,
+                "loading_percent": loading_percent}
+    raise NotImplementedError("Batch results are only available for lines and trafos, not for %s"
+                              % element)
@@ -11,7 +11,7 @@ from pandapower.auxiliary import _add_pf_options, _add_ppc_options, _add_opf_opt
     _check_gen_index_and_print_warning_if_high
 from pandapower.optimal_powerflow import _optimal_powerflow
 from pandapower.opf.validate_opf_input import _check_necessary_opf_parameters
-from pandapower.powerflow import _powerflow
+from pandapower.powerflow import _powerflow, _powerflow_batch, _powerflow_dc_batch, PQ_ELEMENTS
 import inspect
 
 try:
@@ -39,7 +39,8 @@ def set_user_pf_options(net, overwrite=False, **kwargs):
                            'copy_constraints_to_ppc', 'r_switch', 'init', 'enforce_q_lims',
                            'recycle', 'voltage_depend_loads', 'delta', 'tolerance_kva',
                            'trafo_loading', 'numba', 'ac', 'algorithm', 'max_iteration',
-                           'trafo3w_losses', 'init_vm_pu', 'init_va_degree']
+                           'trafo3w_losses', 'init_vm_pu', 'init_va_degree', 'reuse_ordering',
+                           'chord', 'linear_solver', 'result_mode']
 
     if overwrite or 'user_pf_options' not in net.keys():
         net['user_pf_options'] = dict()
@@ -183,6 +184,14 @@ def runpp(net, algorithm='nr', calculate_voltage_angles="auto", init="auto",
 
         **v_debug** (bool, False) - if True, voltage values in each newton-raphson iteration are logged in the ppc
 
+        **linear_solver** (str, "superlu") - sparse linear solver for the jacobian (and the dc initialization). Available are "superlu" (scipy) and, if the optional package is installed, "umfpack" (scikit-umfpack) and "pardiso" (pypardiso). Further solvers can be added with pandapower.pf.linear_solver.register_linear_solver.
+
+        **reuse_ordering** (bool, False) - if True, the ordering (symbolic analysis) of the first factorization of the jacobian is kept in ppc["internal"] and only the numerical factorization is repeated in later iterations and power flows with the same jacobian pattern
+
+        **chord** (bool, False) - if True, the LU factorization of the jacobian is reused in the following newton-raphson iterations (and in later power flows with recycle) as long as the mismatch is at least halved in every iteration (chord method). Fewer factorizations are needed at the cost of more, but cheaper iterations, so max_iteration might have to be increased.
+
+        **result_mode** (str, "tables") - "tables" writes the results to the res_* tables. With "arrays", the results are only kept as arrays in net._ppc (in the order of the ppc, see net._pd2ppc_lookups) and the res_* tables are only calculated when one of them is accessed for the first time or the net is copied or saved. This saves the result extraction in loops that only need a few values of each power flow. The element tables should not be changed before the res_* tables are accessed, since values like res_load.p_kw are taken from them.
+
         **init_vm_pu** (string/float/array/Series, None) - Allows to define initialization specifically for voltage magnitudes. Only works with init == "auto"!
 
             - "auto": all buses are initialized with the mean value of all voltage controlled elements in the grid
@@ -202,20 +211,125 @@ def runpp(net, algorithm='nr', calculate_voltage_angles="auto", init="auto",
             - an iterable with a voltage angle value for each bus (length and order has to match with the buses in net.bus)
             - a pandas Series with a voltage angle value for each bus (indexes have to match the indexes in net.bus)
 
-        **recycle** (dict, none) - Reuse of internal powerflow variables for time series calculation
+        **recycle** (dict/str, none) - Reuse of internal powerflow variables for time series calculation
 
             Contains a dict with the following parameters:
             _is_elements: If True in service elements are not filtered again and are taken from the last result in net["_is_elements"]
             ppc: If True the ppc is taken from net["_ppc"] and gets updated instead of reconstructed entirely
             Ybus: If True the admittance matrix (Ybus, Yf, Yt) is taken from ppc["internal"] and not reconstructed
 
+            With "auto", the changes of the element tables since the last power flow with recycle="auto" are detected (with a hash of every column) and only the necessary parts are rebuilt: if only loads, generation and voltage setpoints changed, the ppc and the admittance matrices are reused. If electrical parameters of lines, trafos (e.g. tp_pos) or shunts changed, the ppc is updated and the admittance matrices are rebuilt. Changes of the topology (buses, switches, connections and in service status of branches and generators) or of the options lead to a full conversion. A recycled ppc starts from the results of the last power flow.
+
+            Independent of recycle, the DLF matrix of the "bfsw" algorithm is kept in net["_ppc"] and reused by the next power flows as long as the branch parameters and the slack buses are unchanged.
+
     """
 
     # if dict 'user_pf_options' is present in net, these options overrule the net.__internal_options
     # except for parameters that are passed by user
-    overrule_options = {}
+    passed_parameters = None
     if "user_pf_options" in net.keys() and len(net.user_pf_options) > 0:
         passed_parameters = _passed_runpp_parameters(locals())
+    kwargs = _init_runpp_options(net, algorithm=algorithm,
+                                 calculate_voltage_angles=calculate_voltage_angles, init=init,
+                                 max_iteration=max_iteration, tolerance_kva=tolerance_kva,
+                                 trafo_model=trafo_model, trafo_loading=trafo_loading,
+                                 enforce_q_lims=enforce_q_lims,
+                                 check_connectivity=check_connectivity,
+                                 voltage_depend_loads=voltage_depend_loads,
+                                 passed_parameters=passed_parameters, **kwargs)
+    _check_bus_index_and_print_warning_if_high(net)
+    _check_gen_index_and_print_warning_if_high(net)
+    _powerflow(net, **kwargs)
+
+
+def runpp_batch(net, p_kw_matrix, q_kvar_matrix=None, element="load", algorithm='nr',
+                calculate_voltage_angles="auto", init="auto", max_iteration="auto",
+                tolerance_kva=1e-5, trafo_model="t", check_connectivity=True,
+                voltage_depend_loads=True, **kwargs):
+    """
+    Runs a power flow for many load / generation scenarios of the same grid.
+
+    The network is converted only once and the admittance matrices as well as the sparsity pattern
+    of the jacobian matrix are shared by all scenarios. The results are not written to the res_*
+    tables, but returned as arrays with one row per scenario.
+
+    INPUT:
+        **net** - The pandapower format network
+
+        **p_kw_matrix** (array) - active power of the elements in net[element] with the shape
+        (number of scenarios, len(net[element])). The values replace the p_kw column of the
+        element table (scaling is still considered).
+
+    OPTIONAL:
+        **q_kvar_matrix** (array, None) - reactive power of the elements in the same shape as
+        p_kw_matrix. If None, the q_kvar values of the element table are used in every scenario.
+
+        **element** (str, "load") - element table the power values refer to ("load", "sgen" or
+        "storage")
+
+        **algorithm** (str, "nr") - only "nr" and "iwamoto_nr" are available for batch power flows
+
+        All other parameters have the same meaning as in runpp. enforce_q_lims is not available.
+
+    OUTPUT:
+        **results** (dict) - contains the following arrays:
+
+            - "vm_pu", "va_degree" (scenarios x buses) - bus voltages in the order of net.bus
+            - "p_from_kw", "q_from_kvar", "p_to_kw", "q_to_kvar", "i_from_ka", "i_to_ka"
+              (scenarios x branches) - branch flows in the order of the ppc branches. The rows that
+              belong to an element type are given by net._pd2ppc_lookups["branch"], e.g.
+              results["i_from_ka"][:, f:t] with f, t = net._pd2ppc_lookups["branch"]["line"]
+            - "converged" (scenarios) - convergence of every power flow
+            - "iterations" (scenarios) - number of newton iterations of every power flow
+
+    EXAMPLE:
+        p_kw = np.outer(np.linspace(0.5, 1.5, 100), net.load.p_kw.values)
+
+        res = pp.runpp_batch(net, p_kw)
+
+        max_vm_pu = np.nanmax(res["vm_pu"], axis=1)
+    """
+    if algorithm not in ['nr', 'iwamoto_nr']:
+        raise NotImplementedError("Batch power flows are only implemented for the newton raphson "
+                                  "algorithm, not for %s" % algorithm)
+    if element not in PQ_ELEMENTS:
+        raise ValueError("element has to be one of %s, not %s" % (PQ_ELEMENTS, element))
+    p_kw_matrix = np.atleast_2d(np.asarray(p_kw_matrix, dtype=float))
+    if q_kvar_matrix is None:
+        q_kvar_matrix = np.tile(net[element]["q_kvar"].values.astype(float),
+                                (p_kw_matrix.shape[0], 1))
+    q_kvar_matrix = np.atleast_2d(np.asarray(q_kvar_matrix, dtype=float))
+    n_elements = len(net[element])
+    if p_kw_matrix.shape[1] != n_elements or q_kvar_matrix.shape != p_kw_matrix.shape:
+        raise ValueError("The power matrices need one column for every element in net.%s (%u), "
+                         "but have the shapes %s / %s" % (element, n_elements, p_kw_matrix.shape,
+                                                          q_kvar_matrix.shape))
+
+    passed_parameters = None
+    if "user_pf_options" in net.keys() and len(net.user_pf_options) > 0:
+        passed_parameters = _passed_runpp_parameters(locals())
+    _init_runpp_options(net, algorithm=algorithm,
+                        calculate_voltage_angles=calculate_voltage_angles, init=init,
+                        max_iteration=max_iteration, tolerance_kva=tolerance_kva,
+                        trafo_model=trafo_model, trafo_loading="current", enforce_q_lims=False,
+                        check_connectivity=check_connectivity,
+                        voltage_depend_loads=voltage_depend_loads,
+                        passed_parameters=passed_parameters, **kwargs)
+    _check_bus_index_and_print_warning_if_high(net)
+    _check_gen_index_and_print_warning_if_high(net)
+    return _powerflow_batch(net, p_kw_matrix, q_kvar_matrix, element)
+
+
+def _init_runpp_options(net, algorithm='nr', calculate_voltage_angles="auto", init="auto",
+                        max_iteration="auto", tolerance_kva=1e-5, trafo_model="t",
+                        trafo_loading="current", enforce_q_lims=False, check_connectivity=True,
+                        voltage_depend_loads=True, passed_parameters=None, **kwargs):
+    """
+    Resolves the runpp arguments ("auto" values, user_pf_options, kwargs) and writes them to
+    net._options. Returns kwargs updated with the options from net.user_pf_options.
+    """
+    overrule_options = {}
+    if passed_parameters is not None:
         overrule_options = {key: val for key, val in net.user_pf_options.items()
                             if key not in passed_parameters.keys()}
 
@@ -223,6 +337,10 @@ def runpp(net, algorithm='nr', calculate_voltage_angles="auto", init="auto",
 
     trafo3w_losses = kwargs.get("trafo3w_losses", "hv")
     v_debug = kwargs.get("v_debug", False)
+    reuse_ordering = kwargs.get("reuse_ordering", False)
+    chord = kwargs.get("chord", False)
+    linear_solver = kwargs.get("linear_solver", "superlu")
+    result_mode = kwargs.get("result_mode", "tables")
     delta_q = kwargs.get("delta_q", 0)
     r_switch = kwargs.get("r_switch", 0.0)
     numba = kwargs.get("numba", True)
@@ -287,15 +405,15 @@ def runpp(net, algorithm='nr', calculate_voltage_angles="auto", init="auto",
                      trafo3w_losses=trafo3w_losses)
     _add_pf_options(net, tolerance_kva=tolerance_kva, trafo_loading=trafo_loading,
                     numba=numba, ac=ac, algorithm=algorithm, max_iteration=max_iteration,
-                    v_debug=v_debug)
+                    v_debug=v_debug, reuse_ordering=reuse_ordering, chord=chord,
+                    linear_solver=linear_solver, result_mode=result_mode)
     net._options.update(overrule_options)
-    _check_bus_index_and_print_warning_if_high(net)
-    _check_gen_index_and_print_warning_if_high(net)
-    _powerflow(net, **kwargs)
+    return kwargs
 
 
 def rundcpp(net, trafo_model="t", trafo_loading="current", recycle=None, check_connectivity=True,
-            r_switch=0.0, trafo3w_losses="hv", **kwargs):
+            r_switch=0.0, trafo3w_losses="hv", linear_solver="superlu", result_mode="tables",
+            **kwargs):
     """
     Runs PANDAPOWER DC Flow
 
@@ -316,13 +434,15 @@ def rundcpp(net, trafo_model="t", trafo_loading="current", recycle=None, check_c
             - "current"- transformer loading is given as ratio of current flow and rated current of the transformer. This is the recommended setting, since thermal as well as magnetic effects in the transformer depend on the current.
             - "power" - transformer loading is given as ratio of apparent power flow to the rated apparent power of the transformer.
 
-        **recycle** (dict, none) - Reuse of internal powerflow variables for time series calculation
+        **recycle** (dict/str, none) - Reuse of internal powerflow variables for time series calculation
 
             Contains a dict with the following parameters:
             _is_elements: If True in service elements are not filtered again and are taken from the last result in net["_is_elements"]
             ppc: If True the ppc (PYPOWER case file) is taken from net["_ppc"] and gets updated instead of reconstructed entirely
             Ybus: If True the admittance matrix (Ybus, Yf, Yt) is taken from ppc["internal"] and not reconstructed
 
+            With "auto", only the parts of the ppc that are affected by changes of the element tables are rebuilt, see runpp
+
         **check_connectivity** (bool, False) - Perform an extra connectivity test after the conversion from pandapower to PYPOWER
 
             If true, an extra connectivity test based on SciPy Compressed Sparse Graph Routines is perfomed.
@@ -330,8 +450,81 @@ def rundcpp(net, trafo_model="t", trafo_loading="current", recycle=None, check_c
 
         **r_switch** (float, 0.0) - resistance of bus-bus-switches. If impedance is zero, buses connected by a closed bus-bus switch are fused to model an ideal bus. Otherwise, they are modelled as branches with resistance r_switch
 
+        **linear_solver** (str, "superlu") - sparse linear solver for the B matrix, see runpp. As B is symmetric positive definite, "cholmod" (scikit-sparse) can be used as well.
+
+        **result_mode** (str, "tables") - "tables" or "arrays", see runpp
+
         ****kwargs** - options to use for PYPOWER.runpf
     """
+    _init_rundcpp_options(net, trafo_model=trafo_model, trafo_loading=trafo_loading,
+                          recycle=recycle, check_connectivity=check_connectivity,
+                          r_switch=r_switch, trafo3w_losses=trafo3w_losses,
+                          linear_solver=linear_solver, result_mode=result_mode)
+    _check_bus_index_and_print_warning_if_high(net)
+    _check_gen_index_and_print_warning_if_high(net)
+    _powerflow(net, **kwargs)
+
+
+def rundcpp_batch(net, p_kw_matrix, element="load", trafo_model="t", check_connectivity=True,
+                  r_switch=0.0, trafo3w_losses="hv", linear_solver="superlu"):
+    """
+    Runs a DC power flow for many load / generation scenarios of the same grid.
+
+    The network is converted only once and the reduced B matrix is factorized only once. All
+    scenarios are then solved at once with the factorization and a matrix right hand side. The
+    factorization is kept in net._ppc, so that further calls of rundcpp_batch or rundcpp with
+    recycle=dict(ppc=True, ...) on the same topology only need the triangular solves. The results
+    are not written to the res_* tables, but returned as arrays with one row per scenario.
+
+    INPUT:
+        **net** - The pandapower format network
+
+        **p_kw_matrix** (array) - active power of the elements in net[element] with the shape
+        (number of scenarios, len(net[element])). The values replace the p_kw column of the
+        element table (scaling is still considered).
+
+    OPTIONAL:
+        **element** (str, "load") - element table the power values refer to ("load", "sgen" or
+        "storage")
+
+        All other parameters have the same meaning as in rundcpp.
+
+    OUTPUT:
+        **results** (dict) - contains the following arrays:
+
+            - "va_degree" (scenarios x buses) - bus voltage angles in the order of net.bus
+            - "p_from_kw", "p_to_kw" (scenarios x branches) - branch flows in the order of the ppc
+              branches. The rows that belong to an element type are given by
+              net._pd2ppc_lookups["branch"], e.g. results["p_from_kw"][:, f:t] with
+              f, t = net._pd2ppc_lookups["branch"]["line"]
+
+    EXAMPLE:
+        p_kw = np.outer(np.linspace(0.5, 1.5, 8760), net.load.p_kw.values)
+
+        res = pp.rundcpp_batch(net, p_kw)
+
+        f, t = net._pd2ppc_lookups["branch"]["line"]
+
+        max_p_kw = np.abs(res["p_from_kw"][:, f:t]).max(axis=0)
+    """
+    if element not in PQ_ELEMENTS:
+        raise ValueError("element has to be one of %s, not %s" % (PQ_ELEMENTS, element))
+    p_kw_matrix = np.atleast_2d(np.asarray(p_kw_matrix, dtype=float))
+    n_elements = len(net[element])
+    if p_kw_matrix.shape[1] != n_elements:
+        raise ValueError("The power matrix needs one column for every element in net.%s (%u), "
+                         "but has the shape %s" % (element, n_elements, p_kw_matrix.shape))
+    _init_rundcpp_options(net, trafo_model=trafo_model, trafo_loading="current", recycle=None,
+                          check_connectivity=check_connectivity, r_switch=r_switch,
+                          trafo3w_losses=trafo3w_losses, linear_solver=linear_solver,
+                          result_mode="tables")
+    _check_bus_index_and_print_warning_if_high(net)
+    _check_gen_index_and_print_warning_if_high(net)
+    return _powerflow_dc_batch(net, p_kw_matrix, element)
+
+
+def _init_rundcpp_options(net, trafo_model, trafo_loading, recycle, check_connectivity, r_switch,
+                          trafo3w_losses, linear_solver, result_mode):
     ac = False
     numba = True
     mode = "pf"
@@ -356,15 +549,13 @@ def rundcpp(net, trafo_model="t", trafo_loading="current", recycle=None, check_c
                      enforce_q_lims=enforce_q_lims, recycle=recycle,
                      voltage_depend_loads=False, delta=0, trafo3w_losses=trafo3w_losses)
     _add_pf_options(net, tolerance_kva=tolerance_kva, trafo_loading=trafo_loading,
-                    numba=numba, ac=ac, algorithm=algorithm, max_iteration=max_iteration)
-    _check_bus_index_and_print_warning_if_high(net)
-    _check_gen_index_and_print_warning_if_high(net)
-    _powerflow(net, **kwargs)
+                    numba=numba, ac=ac, algorithm=algorithm, max_iteration=max_iteration,
+                    linear_solver=linear_solver, result_mode=result_mode)
 
 
 def runopp(net, verbose=False, calculate_voltage_angles=False, check_connectivity=False,
            suppress_warnings=True, r_switch=0.0, delta=1e-10, init="flat", numba=True,
-           trafo3w_losses="hv", **kwargs):
+           trafo3w_losses="hv", linear_solver="superlu", **kwargs):
     """
     Runs the  pandapower Optimal Power Flow.
     Flexibilities, constraints and cost parameters are defined in the pandapower element tables.
@@ -415,6 +606,8 @@ def runopp(net, verbose=False, calculate_voltage_angles=False, check_connectivit
             "pf": a power flow is executed prior to the opf and the pf solution is the starting vector. This may improve
             convergence, but takes a longer runtime (which are probably neglectible for opf calculations)
 
+        **linear_solver** (str, "superlu") - sparse linear solver for the newton systems of the interior point method (and the initial power flow), see runpp
+
          **kwargs** - Pypower / Matpower keyword arguments: - OPF_VIOLATION (5e-6) constraint violation tolerance
                                                             - PDIPM_COSTTOL (1e-6) optimality tolerance
                                                             - PDIPM_GRADTOL (1e-6) gradient tolerance
@@ -442,7 +635,8 @@ def runopp(net, verbose=False, calculate_voltage_angles=False, check_connectivit
                      r_switch=r_switch, init_vm_pu=init, init_va_degree=init,
                      enforce_q_lims=enforce_q_lims, recycle=recycle,
                      voltage_depend_loads=False, delta=delta, trafo3w_losses=trafo3w_losses)
-    _add_opf_options(net, trafo_loading=trafo_loading, ac=ac, init=init, numba=numba)
+    _add_opf_options(net, trafo_loading=trafo_loading, ac=ac, init=init, numba=numba,
+                     linear_solver=linear_solver)
     _check_bus_index_and_print_warning_if_high(net)
     _check_gen_index_and_print_warning_if_high(net)
     _optimal_powerflow(net, verbose, suppress_warnings, **kwargs)
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+
+from pandapower.auxiliary import _add_ppc_options, _add_pf_options, _clean_up, \
+    _check_if_numba_is_installed
+from pandapower.idx_brch import F_BUS, T_BUS, BR_X, TAP, SHIFT, BR_STATUS
+from pandapower.pd2ppc import _pd2ppc
+from pandapower.pf.linear_solver import get_linear_solver
+from pandapower.pf.makeBdc import makeBdc
+from pandapower.pf.ppci_variables import _get_pf_variables_from_ppci
+from pandapower.powerflow import _add_auxiliary_elements
+
+try:
+    import pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+BRANCH_ELEMENTS = ["line", "trafo", "impedance"]
+OUTPUTS = ["dense", "sparse", "blocks"]
+
+
+def calc_ptdf(net, monitored=None, injection_buses=None, output="dense", block_size=1000,
+              threshold=1e-5, linear_solver="superlu", trafo_model="t", r_switch=0.0,
+              trafo3w_losses="hv"):
+    """
+    Calculates the power transfer distribution factors (PTDF) of the DC power flow model.
+
+    PTDF[i, j] is the change of the active power flow at the from side of monitored branch i for an
+    injection of 1 MW at injection bus j that is taken by the reference buses (ext_grids). The
+    matrices are calculated from the B matrices of the DC power flow (see makeBdc) with one
+    factorization of B. The factorization and the last dense result are cached in the net as long
+    as the topology and the branch reactances do not change.
+
+    INPUT:
+        **net** - The pandapower format network
+
+    OPTIONAL:
+        **monitored** (dict, None) - indices of the monitored branch elements for "line", "trafo"
+        and "impedance", e.g. {"line": [0, 1], "trafo": [0]}. The rows of the PTDF are in this
+        order. If None, all lines, trafos and impedances are monitored.
+
+        **injection_buses** (iterable, None) - bus indices of the injections (columns of the
+        PTDF). If None, all buses in the order of net.bus are used.
+
+        **output** (str, "dense") - "dense" returns an array, "sparse" a scipy csr matrix without
+        the entries smaller than threshold and "blocks" a generator that yields the rows of the
+        PTDF in blocks of block_size rows as tuples (first row, array)
+
+        **block_size** (int, 1000) - number of rows that are calculated at once, which bounds the
+        memory of the outputs "sparse" and "blocks"
+
+        **threshold** (float, 1e-5) - entries of the sparse output with a smaller absolute value
+        are omitted
+
+        **linear_solver** (str, "superlu") - sparse linear solver for B, see runpp
+
+        **trafo_model**, **r_switch**, **trafo3w_losses** - see rundcpp
+
+    OUTPUT:
+        **ptdf** (array / csr_matrix / generator) - PTDF (monitored branches x injection buses).
+        Out of service branches have zero rows, out of service buses nan columns.
+
+    EXAMPLE:
+        ptdf = pp.calc_ptdf(net, monitored={"line": net.line.index}, injection_buses=[3, 5])
+    """
+    base = _get_sensitivity_base(net, linear_solver, trafo_model, r_switch, trafo3w_losses)
+    rows = _get_monitored_rows(net, base, monitored)
+    cols = _get_injection_columns(net, base, injection_buses)
+    return _get_output(base, "ptdf", rows, cols, output, block_size, threshold)
+
+
+def calc_lodf(net, monitored=None, outages=None, output="dense", block_size=1000, threshold=1e-5,
+              linear_solver="superlu", trafo_model="t", r_switch=0.0, trafo3w_losses="hv"):
+    """
+    Calculates the line outage distribution factors (LODF) of the DC power flow model.
+
+    LODF[i, k] is the change of the active power flow of monitored branch i relative to the flow
+    of branch k before the outage of branch k. The outaged branch itself has an LODF of -1.
+    Outages that split the network (bridges) have nan columns.
+
+    INPUT:
+        **net** - The pandapower format network
+
+    OPTIONAL:
+        **monitored** (dict, None) - monitored branch elements (rows), see calc_ptdf
+
+        **outages** (dict, None) - outaged branch elements (columns) in the same format. If None,
+        the outages of all lines, trafos and impedances are calculated.
+
+        **output**, **block_size**, **threshold**, **linear_solver**, **trafo_model**,
+        **r_switch**, **trafo3w_losses** - see calc_ptdf
+
+    OUTPUT:
+        **lodf** (array / csr_matrix / generator) - LODF (monitored branches x outaged
+        branches). Out of service branches have zero rows and nan columns.
+
+    EXAMPLE:
+        lodf = pp.calc_lodf(net, outages={"line": [0, 4]})
+
+        p_after_outage = p_base + lodf * p_base[[0, 4]]
+    """
+    base = _get_sensitivity_base(net, linear_solver, trafo_model, r_switch, trafo3w_losses)
+    rows = _get_monitored_rows(net, base, monitored)
+    cols = _get_monitored_rows(net, base, outages)
+    return _get_output(base, "lodf", rows, cols, output, block_size, threshold)
+
+
+def _get_sensitivity_base(net, linear_solver, trafo_model, r_switch, trafo3w_losses):
+    """
+    Converts the net as in rundcpp and returns the B matrices of the ppci with the factorization
+    of B at the non reference buses. The factorization and the dense results are taken from
+    net["_sensitivity_cache"] if the topology and branch reactances are the same as in the last
+    call.
+    """
+    net._options = {}
+    _add_ppc_options(net, calculate_voltage_angles=True, trafo_model=trafo_model,
+                     check_connectivity=True, mode="pf", copy_constraints_to_ppc=False,
+                     r_switch=r_switch, init_vm_pu="flat", init_va_degree="flat",
+                     enforce_q_lims=False, recycle=None, voltage_depend_loads=False, delta=0,
+                     trafo3w_losses=trafo3w_losses)
+    _add_pf_options(net, tolerance_kva=None, trafo_loading="current",
+                    numba=_check_if_numba_is_installed(True), ac=False, algorithm=None,
+                    max_iteration=None, linear_solver=linear_solver, result_mode="tables")
+    _add_auxiliary_elements(net)
+    try:
+        _, ppci = _pd2ppc(net)
+        lookups = net["_pd2ppc_lookups"]
+    finally:
+        _clean_up(net, res=False)
+
+    bus, branch = ppci["bus"], ppci["branch"]
+    ref = _get_pf_variables_from_ppci(ppci)[4]
+    topology = {"n_bus": bus.shape[0], "ref": ref, "linear_solver": linear_solver,
+                "branch": branch[:, [F_BUS, T_BUS, BR_X, TAP, SHIFT, BR_STATUS]].real}
+    cache = net.get("_sensitivity_cache")
+    if cache is None or not _topology_matches(cache["topology"], topology):
+        B, Bf, _, _ = makeBdc(bus, branch)
+        nonref = np.setdiff1d(np.arange(bus.shape[0]), ref)
+        solver = get_linear_solver(linear_solver)
+        solver.factorize(B[nonref, :][:, nonref])
+        n_branch = branch.shape[0]
+        f, t = branch[:, F_BUS].real.astype(np.int64), branch[:, T_BUS].real.astype(np.int64)
+        Cft = csr_matrix((np.r_[np.ones(n_branch), -np.ones(n_branch)],
+                          (np.r_[np.arange(n_branch), np.arange(n_branch)], np.r_[f, t])),
+                         shape=(n_branch, bus.shape[0]))
+        cache = {"topology": topology, "Bf": Bf.tocsr()[:, nonref], "Cft": Cft[:, nonref],
+                 "nonref": nonref, "solver": solver, "results": dict()}
+        net["_sensitivity_cache"] = cache
+    base = dict(cache)
+    base["lookups"] = lookups
+    base["branch_is"] = ppci["internal"]["branch_is"]
+    return base
+
+
+def _topology_matches(cached, topology):
+    return cached["n_bus"] == topology["n_bus"] and \
+           cached["linear_solver"] == topology["linear_solver"] and \
+           np.array_equal(cached["ref"], topology["ref"]) and \
+           np.array_equal(cached["branch"], topology["branch"])
+
+
+def _get_monitored_rows(net, base, elements):
+    """
+    Returns the ppci branch rows of the given branch elements (-1 for out of service elements).
+    """
+    if elements is None:
+        elements = {element: net[element].index for element in BRANCH_ELEMENTS}
+    branch_is = base["branch_is"]
+    ppci_rows = np.cumsum(branch_is) - 1
+    rows = []
+    for element, index in elements.items():
+        if element not in BRANCH_ELEMENTS:
+            raise NotImplementedError("Sensitivities are only available for %s, not for %s"
+                                      % (BRANCH_ELEMENTS, element))
+        pos = net[element].index.get_indexer(np.asarray(index))
+        if np.any(pos < 0):
+            raise UserWarning("Unknown %s indices" % element)
+        if not len(pos):
+            continue
+        ppc_rows = base["lookups"]["branch"][element][0] + pos
+        rows.append(np.where(branch_is[ppc_rows], ppci_rows[ppc_rows], -1))
+    return np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+
+
+def _get_injection_columns(net, base, buses):
+    """
+    Returns the positions of the injection buses in the non reference ppci buses. Reference buses
+    get -1, out of service buses -2.
+    """
+    if buses is None:
+        buses = net["bus"].index.values
+    buses = np.asarray(buses)
+    if not set(buses).issubset(net["bus"].index):
+        raise UserWarning("Unknown bus indices")
+    n_bus = base["topology"]["n_bus"]
+    ppci_bus = base["lookups"]["bus"][buses]
+    nonref_pos = np.full(n_bus, -1)
+    nonref_pos[base["nonref"]] = np.arange(len(base["nonref"]))
+    cols = np.full(len(buses), -2)
+    in_service = ppci_bus < n_bus
+    cols[in_service] = nonref_pos[ppci_bus[in_service]]
+    return cols
+
+
+def _get_output(base, kind, rows, cols, output, block_size, threshold):
+    if output not in OUTPUTS:
+        raise ValueError("output has to be one of %s, not %s" % (OUTPUTS, output))
+    if output == "blocks":
+        return _iter_blocks(base, kind, rows, cols, block_size)
+    if output == "sparse":
+        return vstack([_sparsify(block, threshold)
+                       for _, block in _iter_blocks(base, kind, rows, cols, block_size)] or
+                      [csr_matrix((0, len(cols)))], format="csr")
+    key = (rows.tobytes(), cols.tobytes())
+    cached = base["results"].get(kind)
+    if cached is None or cached[0] != key:
+        blocks = [block for _, block in _iter_blocks(base, kind, rows, cols, block_size)]
+        result = np.vstack(blocks) if blocks else np.zeros((0, len(cols)))
+        # only the last dense result of each kind is kept, so that the cache stays bounded
+        base["results"][kind] = (key, result)
+    # a copy, so that changes of the returned array do not change the cached result
+    return base["results"][kind][1].copy()
+
+
+def _iter_blocks(base, kind, rows, cols, block_size):
+    own = _calc_own_flows(base, cols, block_size) if kind == "lodf" else None
+    for start in range(0, len(rows), block_size):
+        yield start, _calc_block(base, kind, rows[start:start + block_size], cols, own)
+
+
+def _solve_rows(base, rows):
+    """
+    Returns Bf[rows] * inv(B) at the non reference buses. Since B is symmetric, this is the
+    transpose of the solution of B * X = Bf[rows].T. Out of service rows (-1) are zero.
+    """
+    Z = np.zeros((len(rows), len(base["nonref"])))
+    valid = rows >= 0
+    if valid.any():
+        Z[valid] = base["solver"].solve_matrix(base["Bf"][rows[valid]].T.toarray()).T
+    return Z
+
+
+def _calc_own_flows(base, cols, block_size):
+    """
+    Calculates the flow change of the outaged branches for a transfer over themselves (nan for
+    out of service branches), with the outaged branches solved in blocks of block_size.
+    """
+    own = np.full(len(cols), np.nan)
+    valid = np.where(cols >= 0)[0]
+    for start in range(0, len(valid), block_size):
+        pos = valid[start:start + block_size]
+        Z = _solve_rows(base, cols[pos])
+        own[pos] = np.asarray(base["Cft"][cols[pos]].multiply(Z).sum(axis=1)).ravel()
+    return own
+
+
+def _calc_block(base, kind, rows, cols, own):
+    """
+    Calculates the result for the given monitored ppci branch rows with one solve per row. For
+    the LODF, own are the flow changes of the outaged branches from _calc_own_flows.
+    """
+    Z = _solve_rows(base, rows)
+    block = np.zeros((len(rows), len(cols)))
+    valid_cols = cols >= 0
+    if kind == "ptdf":
+        block[:, valid_cols] = Z[:, cols[valid_cols]]
+        block[:, cols == -2] = np.nan
+        return block
+
+    # flow change of the monitored branches for a transfer over the outaged branches
+    block[:, valid_cols] = (base["Cft"][cols[valid_cols]] * Z.T).T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denominator = 1. - own
+        # bridges cannot transfer power over other branches
+        denominator[np.isclose(denominator, 0., atol=1e-10)] = np.nan
+        block /= denominator
+    valid_rows = rows >= 0
+    block[(rows[:, np.newaxis] == cols[np.newaxis, :]) & valid_rows[:, np.newaxis] &
+          np.isfinite(denominator)[np.newaxis, :]] = -1.
+    return block
+
+
+def _sparsify(block, threshold):
+    block = np.where(np.abs(block) < threshold, 0., block)
+    return csr_matrix(block)
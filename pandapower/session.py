@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import numpy as np
+
+from pandapower.auxiliary import _clean_up, _check_bus_index_and_print_warning_if_high, \
+    _check_gen_index_and_print_warning_if_high
+from pandapower.idx_bus import PD, QD
+from pandapower.idx_gen import PG, VG
+from pandapower.pd2ppc import _pd2ppc
+from pandapower.pf.makeSbus import makeSbus
+from pandapower.pf.newtonpf import newtonpf
+from pandapower.pf.ppci_variables import _get_pf_variables_from_ppci
+from pandapower.pf.run_dc_pf import _run_dc_pf
+from pandapower.pf.run_newton_raphson_pf import _get_Y_bus, _get_numba_functions
+from pandapower.powerflow import _add_auxiliary_elements, _get_injection_connection_matrix, \
+    LoadflowNotConverged, PQ_ELEMENTS
+from pandapower.results import _extract_results_batch
+from pandapower.results_branch import _get_branch_results_batch
+from pandapower.run import _init_runpp_options
+from pandapower.timeseries import _get_ppci_gen_rows
+
+try:
+    import pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+INJECTIONS = {"load": ["p_kw", "q_kvar"], "sgen": ["p_kw", "q_kvar"],
+              "storage": ["p_kw", "q_kvar"], "gen": ["p_kw", "vm_pu"], "ext_grid": ["vm_pu"]}
+
+
+class PowerFlowSession(object):
+    """
+    Repeated AC power flows (newton raphson) of one network with changing injections.
+
+    The power flow options are resolved, the network is checked and converted to the internal
+    pypower format and the admittance matrix is built only once when the session is created.
+    Every run() then only writes the changed injections to the cached internal case and solves the
+    power flow from the voltages of the last converged run. The jacobian pattern and the linear
+    solver (e.g. with chord=True) are kept between the runs as well.
+
+    Topology, branch parameters and the in service status are the ones of the net when the session
+    is created. The results are not written to the res_* tables, but returned by
+    results_as_arrays().
+
+    INPUT:
+        **net** - The pandapower format network
+
+    OPTIONAL:
+        ****kwargs** - power flow options as in runpp (e.g. calculate_voltage_angles, init,
+        tolerance_kva, max_iteration, numba, chord, linear_solver). Only the algorithms "nr" and
+        "iwamoto_nr" are available, enforce_q_lims is not available.
+
+    EXAMPLE:
+        session = pp.PowerFlowSession(net, calculate_voltage_angles=True)
+
+        for p_kw in load_p_kw:
+            session.update_injections("load", p_kw=p_kw)
+
+            session.run()
+
+            vm_pu = session.results_as_arrays()["bus"]["vm_pu"]
+    """
+
+    def __init__(self, net, **kwargs):
+        # explicitly passed options overrule net.user_pf_options, as in runpp
+        passed_parameters = None
+        if "user_pf_options" in net.keys() and len(net.user_pf_options) > 0:
+            passed_parameters = dict(kwargs)
+        _init_runpp_options(net, passed_parameters=passed_parameters, **kwargs)
+        self.options = net["_options"]
+        if self.options["algorithm"] not in ['nr', 'iwamoto_nr']:
+            raise NotImplementedError("A PowerFlowSession is only implemented for the newton "
+                                      "raphson algorithm, not for %s" % self.options["algorithm"])
+        if self.options["enforce_q_lims"]:
+            raise NotImplementedError("enforce_q_lims is not available in a PowerFlowSession")
+        _check_bus_index_and_print_warning_if_high(net)
+        _check_gen_index_and_print_warning_if_high(net)
+
+        self.net = net
+        self.bus_index = net["bus"].index.values
+        _add_auxiliary_elements(net)
+        try:
+            self.ppc, self.ppci = _pd2ppc(net)
+            net["_ppc"] = self.ppc
+            self.lookups = net["_pd2ppc_lookups"]
+            self._init_injections()
+            self._init_pf_variables()
+        finally:
+            _clean_up(net, res=False)
+        self.converged = False
+        self.iterations = 0
+
+    def _init_injections(self):
+        """
+        Creates the connection matrices (ppci bus x element, including scaling and unit conversion)
+        of the PQ elements and removes their current power from the bus loads, which are added
+        again with the updated values in every run.
+        """
+        net, bus = self.net, self.ppci["bus"]
+        n_bus = bus.shape[0]
+        self._pd_mw, self._qd_mvar = bus[:, PD].copy(), bus[:, QD].copy()
+        self._pq_injections = dict()
+        self._element_index = dict()
+        for element in PQ_ELEMENTS:
+            el = net[element]
+            self._element_index[element] = el.index
+            if not len(el):
+                continue
+            C = _get_injection_connection_matrix(net, element, n_bus, self.lookups["bus"])
+            p_kw = el["p_kw"].values.astype(float)
+            q_kvar = el["q_kvar"].values.astype(float)
+            self._pd_mw -= C * p_kw
+            self._qd_mvar -= C * q_kvar
+            self._pq_injections[element] = {"C": C, "p_kw": p_kw, "q_kvar": q_kvar}
+        for element in ["gen", "ext_grid"]:
+            self._element_index[element] = net[element].index
+        self._gen_scaling = net["gen"]["scaling"].values.astype(float)
+
+    def _init_pf_variables(self):
+        if self.options["init_va_degree"] == "dc":
+            self.ppci = _run_dc_pf(self.ppci, self.options["linear_solver"])
+        makeYbus, _ = _get_numba_functions(self.ppci, self.options)
+        baseMVA, bus, gen, branch, self.ref, self.pv, self.pq, self.on, self.gbus, self.V, _ = \
+            _get_pf_variables_from_ppci(self.ppci)
+        self.ppci, Ybus, _, _ = _get_Y_bus(self.ppci, self.options, makeYbus, baseMVA, bus, branch)
+        self.Ybus = Ybus.tocsr()
+        self._V_init = self.V.copy()
+
+    def update_injections(self, element, p_kw=None, q_kvar=None, vm_pu=None, index=None):
+        """
+        Changes the power or the voltage setpoint of elements for the following runs. The values
+        have the same meaning as the columns of the element table, i.e. p_kw and q_kvar are
+        scaled with the scaling of the element. Out of service elements are ignored.
+
+        INPUT:
+            **element** (str) - "load", "sgen" or "storage" (p_kw, q_kvar), "gen" (p_kw, vm_pu)
+            or "ext_grid" (vm_pu)
+
+        OPTIONAL:
+            **p_kw** (float/array, None) - active power of the elements
+
+            **q_kvar** (float/array, None) - reactive power of the elements
+
+            **vm_pu** (float/array, None) - voltage setpoint of the elements
+
+            **index** (iterable, None) - indices of the elements the values are given for. If
+            None, the values are given for all elements of net[element].
+        """
+        if element not in INJECTIONS:
+            raise NotImplementedError("Injections of %s cannot be updated in a PowerFlowSession"
+                                      % element)
+        values = {"p_kw": p_kw, "q_kvar": q_kvar, "vm_pu": vm_pu}
+        for column, value in values.items():
+            if value is not None and column not in INJECTIONS[element]:
+                raise NotImplementedError("%s of %s cannot be updated in a PowerFlowSession"
+                                          % (column, element))
+        element_index = self._element_index[element]
+        if index is None:
+            index = element_index.values
+        index = np.atleast_1d(np.asarray(index))
+        if element in PQ_ELEMENTS:
+            pos = element_index.get_indexer(index)
+            if np.any(pos < 0):
+                raise UserWarning("Unknown %s indices %s" % (element, index[pos < 0]))
+            injections = self._pq_injections.get(element)
+            for column in ["p_kw", "q_kvar"]:
+                if values[column] is not None and injections is not None:
+                    injections[column][pos] = values[column]
+            return
+
+        if not set(index).issubset(element_index):
+            raise UserWarning("Unknown %s indices %s" % (element, set(index) - set(element_index)))
+        gen_rows, pos = _get_ppci_gen_rows(self.net, self.ppci, element, index)
+        gen = self.ppci["gen"]
+        if p_kw is not None:
+            p_kw = np.broadcast_to(np.asarray(p_kw, dtype=float), index.shape)
+            scaling = self._gen_scaling[element_index.get_indexer(index[pos])]
+            gen[gen_rows, PG] = - p_kw[pos] * 1e-3 * scaling
+        if vm_pu is not None:
+            vm_pu = np.broadcast_to(np.asarray(vm_pu, dtype=float), index.shape)
+            gen[gen_rows, VG] = vm_pu[pos]
+
+    def run(self, warm_start=True):
+        """
+        Runs the power flow with the current injections.
+
+        OPTIONAL:
+            **warm_start** (bool, True) - if True, the power flow is started from the voltages of
+            the last converged run. Otherwise it is started from the initial voltages of the
+            session (given by the option init).
+
+        OUTPUT:
+            **converged** (bool) - True if the power flow converged. Otherwise a
+            LoadflowNotConverged error is raised and the voltages of the last converged run are
+            kept.
+        """
+        gen = self.ppci["gen"]
+        Sbus = self._get_Sbus()
+
+        V = self.V.copy() if warm_start else self._V_init.copy()
+        # voltage setpoints of the generators
+        V[self.gbus] = gen[self.on, VG] / abs(V[self.gbus]) * V[self.gbus]
+        V, success, iterations, _, _, _ = newtonpf(self.Ybus, Sbus, V, self.pv, self.pq,
+                                                   self.ppci, self.options)
+        self.converged = bool(success)
+        self.iterations = iterations
+        if not success:
+            raise LoadflowNotConverged("Power Flow did not converge after %u iterations!"
+                                       % iterations)
+        self.V = V
+        return self.converged
+
+    def _get_Sbus(self):
+        """
+        Writes the current injections to the bus loads of the ppci and returns the complex bus
+        power injections.
+        """
+        bus, gen = self.ppci["bus"], self.ppci["gen"]
+        bus[:, PD] = self._pd_mw
+        bus[:, QD] = self._qd_mvar
+        for injections in self._pq_injections.values():
+            bus[:, PD] += injections["C"] * injections["p_kw"]
+            bus[:, QD] += injections["C"] * injections["q_kvar"]
+        return makeSbus(self.ppci["baseMVA"], bus, gen)
+
+    def results_as_arrays(self):
+        """
+        Returns the results of the last run as arrays. If the last run did not converge (or no
+        run was done yet), a UserWarning is raised, since the injections of the session do not
+        fit to the voltages of an earlier converged run anymore.
+
+        OUTPUT:
+            **results** (dict) - dicts of arrays for "bus" (vm_pu, va_degree), "line" and
+            "trafo" (the columns of res_line / res_trafo) in the order of the element tables.
+            Out of service buses get nan, out of service branches zero flows.
+        """
+        if not self.converged:
+            raise UserWarning("There are no results, since the last run did not converge")
+        # the net might have been used for other calculations since the session was created
+        self.net["_pd2ppc_lookups"] = self.lookups
+        self.net["_options"] = self.options
+        res = _extract_results_batch(self.net, self.ppc, self.ppci, self.V[np.newaxis, :],
+                                     self.bus_index)
+        results = {"bus": {"vm_pu": res["vm_pu"][0], "va_degree": res["va_degree"][0]}}
+        for element in ["line", "trafo"]:
+            results[element] = {column: values[0] for column, values in
+                                _get_branch_results_batch(self.net, res, element).items()}
+        return results
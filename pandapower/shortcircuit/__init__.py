@@ -1 +1,2 @@
-from pandapower.shortcircuit.calc_sc import calc_sc
\ No newline at end of file
+from pandapower.shortcircuit.calc_sc import calc_sc
+from pandapower.shortcircuit.study import ShortCircuitStudy
\ No newline at end of file
@@ -12,20 +12,23 @@ except ImportError:
 logger = logging.getLogger(__name__)
 #import time
 
+import numpy as np
+
 from pandapower.auxiliary import _clean_up, _add_ppc_options, _add_sc_options
 from pandapower.pd2ppc import _pd2ppc
 from pandapower.pd2ppc_zero import _pd2ppc_zero
 from pandapower.powerflow import _add_auxiliary_elements
 from pandapower.results import _copy_results_ppci_to_ppc
 from pandapower.shortcircuit.currents import _calc_ikss, _calc_ikss_1ph, _calc_ip, _calc_ith, _calc_branch_currents
-from pandapower.shortcircuit.impedance import _calc_zbus, _calc_ybus, _calc_rx
+from pandapower.shortcircuit.impedance import _calc_zbus, _calc_ybus, _calc_rx, _set_fault_buses
 from pandapower.shortcircuit.kappa import _add_kappa_to_ppc
 from pandapower.shortcircuit.results import _extract_results
 
 
 def calc_sc(net, fault="3ph", case='max', lv_tol_percent=10, topology="auto", ip=False,
             ith=False, tk_s=1., kappa_method="C", r_fault_ohm=0., x_fault_ohm=0.,
-            branch_results=False):
+            branch_results=False, inverse_y=True, bus=None,
+            chunk_size=None):
     """
     Calculates minimal or maximal symmetrical short-circuit currents.
     The calculation is based on the method of the equivalent voltage source
@@ -81,6 +84,12 @@ def calc_sc(net, fault="3ph", case='max', lv_tol_percent=10, topology="auto", ip
 
         **consider_sgens** (bool, True) defines if short-circuit contribution of static generators should be considered or not
 
+        **inverse_y** (bool, True) if True, the bus impedance matrix is calculated as the dense inverse of the admittance matrix. Otherwise, the admittance matrix is only factorized and the diagonal and the columns of the bus impedance matrix that are needed are calculated by sparse solves, which is recommended for large networks
+
+        **bus** (list, None) indices of the fault buses. If None, faults at all buses are calculated. Otherwise, net.res_bus_sc only contains the given buses and the branch results are the minimal or maximal currents for faults at the given buses. With inverse_y=False, only the columns of the bus impedance matrix for the fault buses are calculated
+
+        **chunk_size** (int, None) number of fault buses for which the columns of the bus impedance matrix and the branch currents are calculated at once. The memory of the branch results grows with the number of buses times chunk_size. If None, the chunks are limited to about 4 million matrix entries
+
 
     OUTPUT:
 
@@ -104,6 +113,13 @@ def calc_sc(net, fault="3ph", case='max', lv_tol_percent=10, topology="auto", ip
         raise ValueError(
             'specify network structure as "meshed", "radial" or "auto"')
 
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError("chunk_size has to be a positive integer")
+    if bus is not None:
+        bus = np.atleast_1d(np.asarray(bus)).astype(np.int64)
+        if not set(bus).issubset(net.bus.index):
+            raise UserWarning("Unknown fault buses %s" % (set(bus) - set(net.bus.index)))
+
     if branch_results:
         logger.warning("Branch results are in beta mode and might not always be reliable, "
                        "especially for transformers")
@@ -117,7 +133,8 @@ def calc_sc(net, fault="3ph", case='max', lv_tol_percent=10, topology="auto", ip
     _add_sc_options(net, fault=fault, case=case, lv_tol_percent=lv_tol_percent, tk_s=tk_s,
                     topology=topology, r_fault_ohm=r_fault_ohm, kappa_method=kappa_method,
                     x_fault_ohm=x_fault_ohm, kappa=kappa, ip=ip, ith=ith,
-                    consider_sgens=False, branch_results=branch_results)
+                    consider_sgens=False, branch_results=branch_results,
+                    inverse_y=inverse_y, bus=bus, chunk_size=chunk_size)
     if fault == "3ph":
         _calc_sc(net)
     if fault == "2ph":
@@ -132,11 +149,12 @@ def _calc_sc(net):
     #    t0 = time.perf_counter()
     _add_auxiliary_elements(net)
     ppc, ppci = _pd2ppc(net)
+    _set_fault_buses(net, ppci)
 #    t1 = time.perf_counter()
     _calc_ybus(ppci)
 #    t2 = time.perf_counter()
     try:
-        _calc_zbus(ppci)
+        _calc_zbus(net, ppci)
     except Exception as e:
         _clean_up(net, res=False)
         raise(e)
@@ -166,9 +184,10 @@ def _calc_sc_1ph(net):
     _add_auxiliary_elements(net)
 # pos. seq bus impedance
     ppc, ppci = _pd2ppc(net)
+    _set_fault_buses(net, ppci)
     _calc_ybus(ppci)
     try:
-        _calc_zbus(ppci)
+        _calc_zbus(net, ppci)
     except Exception as e:
         _clean_up(net, res=False)
         raise(e)
@@ -176,9 +195,10 @@ def _calc_sc_1ph(net):
     _add_kappa_to_ppc(net, ppci)
 # zero seq bus impedance
     ppc_0, ppci_0 = _pd2ppc_zero(net)
+    _set_fault_buses(net, ppci_0)
     _calc_ybus(ppci_0)
     try:
-        _calc_zbus(ppci_0)
+        _calc_zbus(net, ppci_0)
     except Exception as e:
         _clean_up(net, res=False)
         raise(e)
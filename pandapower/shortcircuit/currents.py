@@ -11,6 +11,7 @@ import pandas as pd
 from pandapower.shortcircuit.idx_brch import IKSS_F, IKSS_T, IP_F, IP_T, ITH_F, ITH_T
 from pandapower.shortcircuit.idx_bus import C_MIN, C_MAX, KAPPA, R_EQUIV, IKSS1, IP, ITH, X_EQUIV, IKSS2, IKCV, M
 from pandapower.auxiliary import _sum_by_group
+from pandapower.shortcircuit.impedance import _zbus_blocks, _zbus_columns, _zbus_dot
 
 
 def _calc_ikss(net, ppc):
@@ -48,6 +49,22 @@ def _calc_ikss_1ph(net, ppc, ppc_0):
 def _current_source_current(net, ppc):
     ppc["bus"][:, IKCV] = 0
     ppc["bus"][:, IKSS2] = 0
+    buses, ikcv_pu = _current_source_injections(net)
+    if len(buses) == 0:
+        return
+    baseI = ppc["internal"]["baseI"]
+    z_equiv = ppc["bus"][:, R_EQUIV] + ppc["bus"][:, X_EQUIV] * 1j
+    ppc["bus"][buses, IKCV] = ikcv_pu
+    ppc["bus"][:, IKSS2] = abs(
+        1 / z_equiv * _zbus_dot(ppc, ppc["bus"][:, IKCV] * -1j) / baseI)
+    ppc["bus"][buses, IKCV] /= baseI[buses]
+
+
+def _current_source_injections(net):
+    """
+    Returns the ppc indices of the buses with static generators and the sum of their
+    short-circuit currents in per unit.
+    """
     bus_lookup = net["_pd2ppc_lookups"]["bus"]
     if not "motor" in net.sgen.type.values:
         sgen = net.sgen[net._is_elements["sgen"]]
@@ -55,20 +72,15 @@ def _current_source_current(net, ppc):
         sgen = net.sgen[(net._is_elements["sgen"]) &
                         (net.sgen.type != "motor")]
     if len(sgen) == 0:
-        return
+        return np.array([], dtype=np.int64), np.array([])
     if any(pd.isnull(sgen.sn_kva)):
         raise UserWarning(
             "sn_kva needs to be specified for all sgens in net.sgen.sn_kva")
-    baseI = ppc["internal"]["baseI"]
     sgen_buses = sgen.bus.values
     sgen_buses_ppc = bus_lookup[sgen_buses]
-    Zbus = ppc["internal"]["Zbus"]
     i_sgen_pu = sgen.sn_kva.values / net.sn_kva * sgen.k.values
     buses, ikcv_pu, _ = _sum_by_group(sgen_buses_ppc, i_sgen_pu, i_sgen_pu)
-    ppc["bus"][buses, IKCV] = ikcv_pu
-    ppc["bus"][:, IKSS2] = abs(
-        1 / np.diag(Zbus) * np.dot(Zbus, ppc["bus"][:, IKCV] * -1j) / baseI)
-    ppc["bus"][buses, IKCV] /= baseI[buses]
+    return buses, ikcv_pu
 
 
 def _calc_ip(net, ppc):
@@ -91,57 +103,72 @@ def _calc_ith(net, ppc):
 
 
 def _calc_branch_currents(net, ppc):
+    """
+    Calculates the minimal or maximal branch currents over the faults at the fault buses. The
+    fault buses are processed in chunks of Zbus columns and the branch currents are reduced after
+    every chunk, so that the memory of the dense intermediate arrays is O(n * chunk_size).
+    """
     case = net._options["case"]
-    Zbus = ppc["internal"]["Zbus"]
     Yf = ppc["internal"]["Yf"]
     Yt = ppc["internal"]["Yf"]
     baseI = ppc["internal"]["baseI"]
-    n = ppc["bus"].shape[0]
     fb = np.real(ppc["branch"][:, 0]).astype(int)
     tb = np.real(ppc["branch"][:, 1]).astype(int)
-    minmax = np.nanmin if case == "min" else np.nanmax
-    # calculate voltage source branch current
-    V_ikss = (ppc["bus"][:, IKSS1] * baseI) * Zbus
-    ikss1_all_f = np.conj(Yf.dot(V_ikss))
-    ikss1_all_t = np.conj(Yt.dot(V_ikss))
-    ikss1_all_f[abs(ikss1_all_f) < 1e-10] = np.nan
-    ikss1_all_t[abs(ikss1_all_t) < 1e-10] = np.nan
-
-    # add current source branch current if there is one
+    n_branch = ppc["branch"].shape[0]
+    nanminmax = np.nanmin if case == "min" else np.nanmax
+    fminmax = np.fmin if case == "min" else np.fmax
+    results = {column: np.full(n_branch, np.nan) for column in
+               ["ikss_f", "ikss_t", "ip_f", "ip_t", "ith_f", "ith_t"]}
+
     current_sources = any(ppc["bus"][:, IKCV]) > 0
     if current_sources:
-        current = np.tile(-ppc["bus"][:, IKCV], (n, 1))
-        np.fill_diagonal(current, current.diagonal() + ppc["bus"][:, IKSS2])
-        V = np.dot((current * baseI), Zbus).T
-        fb = np.real(ppc["branch"][:, 0]).astype(int)
-        tb = np.real(ppc["branch"][:, 1]).astype(int)
-        ikss2_all_f = np.conj(Yf.dot(V))
-        ikss2_all_t = np.conj(Yt.dot(V))
-        ikss_all_f = abs(ikss1_all_f + ikss2_all_f)
-        ikss_all_t = abs(ikss1_all_t + ikss2_all_t)
-    else:
-        ikss_all_f = abs(ikss1_all_f)
-        ikss_all_t = abs(ikss1_all_t)
-
-    ppc["branch"][:, IKSS_F] = minmax(ikss_all_f, axis=1) / baseI[fb]
-    ppc["branch"][:, IKSS_T] = minmax(ikss_all_t, axis=1) / baseI[tb]
-
-    if net._options["ip"]:
-        kappa = ppc["bus"][:, KAPPA]
+        # voltages from the current sources that are the same for every fault
+        V_ikcv = _zbus_dot(ppc, -ppc["bus"][:, IKCV] * baseI, transpose=True)
+    for faults in _zbus_blocks(ppc, net._options["chunk_size"]):
+        # calculate voltage source branch current
+        V_ikss = (ppc["bus"][faults, IKSS1] * baseI[faults]) * _zbus_columns(ppc, faults)
+        ikss1_all_f = np.conj(Yf.dot(V_ikss))
+        ikss1_all_t = np.conj(Yt.dot(V_ikss))
+        ikss1_all_f[abs(ikss1_all_f) < 1e-10] = np.nan
+        ikss1_all_t[abs(ikss1_all_t) < 1e-10] = np.nan
+
+        # add current source branch current if there is one
         if current_sources:
-            ip_all_f = np.sqrt(2) * (ikss1_all_f * kappa + ikss2_all_f)
-            ip_all_t = np.sqrt(2) * (ikss1_all_t * kappa + ikss2_all_t)
+            V = V_ikcv[:, np.newaxis] + _zbus_columns(ppc, faults, transpose=True) * \
+                (ppc["bus"][faults, IKSS2] * baseI[faults])
+            ikss2_all_f = np.conj(Yf.dot(V))
+            ikss2_all_t = np.conj(Yt.dot(V))
+            ikss_all_f = abs(ikss1_all_f + ikss2_all_f)
+            ikss_all_t = abs(ikss1_all_t + ikss2_all_t)
         else:
-            ip_all_f = np.sqrt(2) * ikss1_all_f * kappa
-            ip_all_t = np.sqrt(2) * ikss1_all_t * kappa
-
-        ppc["branch"][:, IP_F] = minmax(abs(ip_all_f), axis=1) / baseI[fb]
-        ppc["branch"][:, IP_T] = minmax(abs(ip_all_t), axis=1) / baseI[tb]
-
+            ikss_all_f = abs(ikss1_all_f)
+            ikss_all_t = abs(ikss1_all_t)
+        block = {"ikss_f": ikss_all_f, "ikss_t": ikss_all_t}
+
+        if net._options["ip"]:
+            kappa = ppc["bus"][faults, KAPPA]
+            if current_sources:
+                ip_all_f = np.sqrt(2) * (ikss1_all_f * kappa + ikss2_all_f)
+                ip_all_t = np.sqrt(2) * (ikss1_all_t * kappa + ikss2_all_t)
+            else:
+                ip_all_f = np.sqrt(2) * ikss1_all_f * kappa
+                ip_all_t = np.sqrt(2) * ikss1_all_t * kappa
+            block["ip_f"], block["ip_t"] = abs(ip_all_f), abs(ip_all_t)
+
+        if net._options["ith"]:
+            n = 1
+            m = ppc["bus"][faults, M]
+            block["ith_f"] = ikss_all_f * np.sqrt(m + n)
+            block["ith_t"] = ikss_all_t * np.sqrt(m + n)
+
+        for column, values in block.items():
+            results[column] = fminmax(results[column], nanminmax(values, axis=1))
+
+    ppc["branch"][:, IKSS_F] = results["ikss_f"] / baseI[fb]
+    ppc["branch"][:, IKSS_T] = results["ikss_t"] / baseI[tb]
+    if net._options["ip"]:
+        ppc["branch"][:, IP_F] = results["ip_f"] / baseI[fb]
+        ppc["branch"][:, IP_T] = results["ip_t"] / baseI[tb]
     if net._options["ith"]:
-        n = 1
-        m = ppc["bus"][:, M]
-        ith_all_f = ikss_all_f * np.sqrt(m + n)
-        ith_all_t = ikss_all_t * np.sqrt(m + n)
-        ppc["branch"][:, ITH_F] = minmax(ith_all_f, axis=1) / baseI[fb]
-        ppc["branch"][:, ITH_T] = minmax(ith_all_t, axis=1) / baseI[fb]
+        ppc["branch"][:, ITH_F] = results["ith_f"] / baseI[fb]
+        ppc["branch"][:, ITH_T] = results["ith_t"] / baseI[fb]
@@ -4,6 +4,7 @@
 # and Energy System Technology (IEE), Kassel. All rights reserved.
 
 
+import copy
 import warnings
 
 import numpy as np
@@ -11,6 +12,7 @@ from scipy.sparse.linalg import inv as inv_sparse
 from scipy.linalg import inv
 
 
+from pandapower.pf.linear_solver import get_linear_solver
 from pandapower.shortcircuit.idx_bus import R_EQUIV, X_EQUIV
 from pandapower.idx_bus import BASE_KV
 try:
@@ -18,18 +20,51 @@ try:
 except ImportError:
     from pandapower.pf.makeYbus_pypower import makeYbus
 
+# maximum number of entries of the dense chunks of Zbus columns that are calculated at once if no
+# chunk size is given
+ZBUS_BLOCK_ENTRIES = 2 ** 22
+
 
 def _calc_rx(net, ppc):
-    Zbus = ppc["internal"]["Zbus"]
     r_fault = net["_options"]["r_fault_ohm"]
     x_fault = net["_options"]["x_fault_ohm"]
     if r_fault > 0 or x_fault > 0:
         base_r = np.square(ppc["bus"][:, BASE_KV]) / ppc["baseMVA"]
         fault_impedance = (r_fault + x_fault * 1j) / base_r
+    else:
+        fault_impedance = np.zeros(ppc["bus"].shape[0])
+    fault_buses = ppc["internal"]["fault_buses"]
+    if "Zbus" in ppc["internal"]:
+        Zbus = ppc["internal"]["Zbus"]
         np.fill_diagonal(Zbus, Zbus.diagonal() + fault_impedance)
-    z_equiv = np.diag(Zbus)
-    ppc["bus"][:, R_EQUIV] = z_equiv.real
-    ppc["bus"][:, X_EQUIV] = z_equiv.imag
+        z_equiv = np.diag(Zbus)[fault_buses]
+    else:
+        # the fault impedance is added to the diagonal of Zbus in _zbus_dot and _zbus_columns
+        ppc["internal"]["z_fault"] = fault_impedance
+        if "zbus_diag" in ppc["internal"]:
+            # diagonal of Zbus that is calculated once for all buses, e.g. by ShortCircuitStudy
+            z_diag = ppc["internal"]["zbus_diag"][fault_buses]
+        else:
+            z_diag = _calc_zbus_diag(ppc, net["_options"]["chunk_size"])
+        z_equiv = z_diag + fault_impedance[fault_buses]
+    # buses without faults get nan results
+    ppc["bus"][:, R_EQUIV] = np.nan
+    ppc["bus"][:, X_EQUIV] = np.nan
+    ppc["bus"][fault_buses, R_EQUIV] = z_equiv.real
+    ppc["bus"][fault_buses, X_EQUIV] = z_equiv.imag
+
+def _set_fault_buses(net, ppc):
+    """
+    Stores the ppc indices of the fault buses given with the option bus (all buses if None) in
+    ppc["internal"]["fault_buses"]. Out of service buses are left out.
+    """
+    n = ppc["bus"].shape[0]
+    bus = net["_options"]["bus"]
+    if bus is None:
+        ppc["internal"]["fault_buses"] = np.arange(n)
+        return
+    fault_buses = net["_pd2ppc_lookups"]["bus"][bus]
+    ppc["internal"]["fault_buses"] = np.unique(fault_buses[fault_buses < n])
 
 def _calc_ybus(ppc):
     Ybus, Yf, Yt = makeYbus(ppc["baseMVA"], ppc["bus"],  ppc["branch"])
@@ -37,8 +72,35 @@ def _calc_ybus(ppc):
     ppc["internal"]["Yt"] = Yt
     ppc["internal"]["Ybus"] = Ybus
 
-def _calc_zbus(ppc):
+def _calc_zbus(net, ppc, inverse_y=None, solver=None):
+    """
+    Calculates the bus impedance matrix Zbus as the dense inverse of Ybus. With the option
+    inverse_y=False, Ybus is only factorized (ppc["internal"]["ybus_fact"]) and the parts of Zbus
+    that are needed are calculated by sparse solves in _calc_zbus_diag, _zbus_dot and
+    _zbus_columns.
+
+    inverse_y overrules the option of the net. A solver with the factorization of a Ybus with the
+    same sparsity pattern (e.g. of the base case for the equivalent frequency of kappa method C)
+    is refactorized with its ordering instead of a new factorization.
+    """
     Ybus = ppc["internal"]["Ybus"]
+    ppc["internal"].pop("Zbus", None)
+    ppc["internal"].pop("ybus_fact_t", None)
+    ppc["internal"].pop("zbus_diag", None)
+    if inverse_y is None:
+        inverse_y = net["_options"]["inverse_y"]
+    if not inverse_y:
+        if solver is None:
+            solver = get_linear_solver()
+            solver.factorize(Ybus)
+        else:
+            solver = copy.deepcopy(solver)
+            solver.refactorize(Ybus)
+        if not solver.is_factorized():
+            raise UserWarning("The admittance matrix of the short-circuit calculation is singular")
+        ppc["internal"]["ybus_fact"] = solver
+        return
+    ppc["internal"].pop("ybus_fact", None)
     sparsity = Ybus.nnz / Ybus.shape[0]**2
     if sparsity < 0.002:
         with warnings.catch_warnings():
@@ -46,3 +108,74 @@ def _calc_zbus(ppc):
             ppc["internal"]["Zbus"] = inv_sparse(Ybus).toarray()
     else:
         ppc["internal"]["Zbus"] = inv(Ybus.toarray())
+
+def _zbus_blocks(ppc, chunk_size=None):
+    """
+    Splits the fault buses into chunks of chunk_size buses. If chunk_size is None, the dense Zbus
+    columns of a chunk have at most ZBUS_BLOCK_ENTRIES entries.
+    """
+    n = ppc["bus"].shape[0]
+    fault_buses = ppc["internal"]["fault_buses"]
+    if chunk_size is None:
+        chunk_size = max(1, ZBUS_BLOCK_ENTRIES // max(n, 1))
+    return [fault_buses[i:i + chunk_size] for i in range(0, len(fault_buses), chunk_size)]
+
+def _calc_zbus_diag(ppc, chunk_size=None):
+    """
+    Calculates the diagonal entries of Zbus (without the fault impedance) of the fault buses by
+    solving Ybus * Z = I for chunks of unit vectors with the factorization of Ybus.
+    """
+    solver = _get_ybus_solver(ppc)
+    n = ppc["bus"].shape[0]
+    z_diag = []
+    for block in _zbus_blocks(ppc, chunk_size):
+        unit = np.zeros((n, len(block)), dtype=complex)
+        unit[block, np.arange(len(block))] = 1.
+        z_diag.append(solver.solve_matrix(unit)[block, np.arange(len(block))])
+    return np.concatenate(z_diag) if len(z_diag) else np.array([], dtype=complex)
+
+def _zbus_dot(ppc, x, transpose=False):
+    """
+    Returns Zbus * x (or Zbus.T * x with transpose=True) including the fault impedance on the
+    diagonal.
+    """
+    if "Zbus" in ppc["internal"]:
+        Zbus = ppc["internal"]["Zbus"]
+        return np.dot(Zbus.T if transpose else Zbus, x)
+    solver = _get_ybus_solver(ppc, transpose)
+    return solver.solve(x.astype(complex)) + ppc["internal"]["z_fault"] * x
+
+def _zbus_columns(ppc, columns, transpose=False):
+    """
+    Returns the columns of Zbus (or of Zbus.T with transpose=True) for the given buses as a dense
+    array including the fault impedance on the diagonal.
+    """
+    n = ppc["bus"].shape[0]
+    if "Zbus" in ppc["internal"]:
+        Zbus = ppc["internal"]["Zbus"]
+        if len(columns) == n:
+            return Zbus.T if transpose else Zbus
+        return Zbus[columns, :].T if transpose else Zbus[:, columns]
+    unit = np.zeros((n, len(columns)), dtype=complex)
+    unit[columns, np.arange(len(columns))] = 1.
+    Z = _get_ybus_solver(ppc, transpose).solve_matrix(unit)
+    Z[columns, np.arange(len(columns))] += ppc["internal"]["z_fault"][columns]
+    return Z
+
+def _get_ybus_solver(ppc, transpose=False):
+    """
+    Returns the factorization of Ybus (or of Ybus.T with transpose=True, which is only factorized
+    separately for an unsymmetric Ybus, e.g. with phase shifting transformers).
+    """
+    internal = ppc["internal"]
+    if not transpose:
+        return internal["ybus_fact"]
+    if "ybus_fact_t" not in internal:
+        Ybus = internal["Ybus"]
+        if (Ybus != Ybus.T).nnz == 0:
+            internal["ybus_fact_t"] = internal["ybus_fact"]
+        else:
+            solver = get_linear_solver()
+            solver.factorize(Ybus.T.tocsc())
+            internal["ybus_fact_t"] = solver
+    return internal["ybus_fact_t"]
@@ -4,9 +4,12 @@
 # and Energy System Technology (IEE), Kassel. All rights reserved.
 
 
-import copy
+from collections import defaultdict, deque
+
 import networkx as nx
 import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
 
 from pandapower.idx_brch import F_BUS, T_BUS, BR_R, BR_X
 from pandapower.idx_bus import BUS_I, GS, BS, BASE_KV
@@ -14,6 +17,9 @@ from pandapower.idx_bus import BUS_I, GS, BS, BASE_KV
 from pandapower.shortcircuit.idx_bus import KAPPA, R_EQUIV, X_EQUIV
 from pandapower.shortcircuit.impedance import _calc_ybus, _calc_zbus, _calc_rx
 
+# blocks of the meshing detection with up to this number of edges are checked with all simple paths
+MAX_ENUMERATED_BLOCK_EDGES = 12
+
 def _add_kappa_to_ppc(net, ppc):
     if not net._options["kappa"]:
         return
@@ -30,17 +36,40 @@ def _add_kappa_to_ppc(net, ppc):
     ppc["bus"][:, KAPPA] = kappa
 
 def _kappa_method_c(net, ppc):
+    fc = _equivalent_frequency(net)
+    if "ppc_c" in ppc["internal"]:
+        # equivalent frequency network that is reused for several calculations, e.g. by
+        # ShortCircuitStudy
+        ppc_c = ppc["internal"]["ppc_c"]
+        ppc_c["internal"]["fault_buses"] = ppc["internal"]["fault_buses"]
+    else:
+        ppc_c = _create_ppc_c(net, ppc)
+
+    zero_conductance = np.where(ppc["bus"][:,GS] == 0)
+    ppc["bus"][zero_conductance, BS] *= net.f_hz / fc
+
+    _calc_rx(net, ppc_c)
+    rx_equiv_c = ppc_c["bus"][:, R_EQUIV] / ppc_c["bus"][:, X_EQUIV] * fc / net.f_hz
+    return _kappa(rx_equiv_c)
+
+def _equivalent_frequency(net):
     if net.f_hz == 50:
-        fc = 20
+        return 20
     elif net.f_hz == 60:
-        fc = 24
+        return 24
     else:
         raise ValueError("Frequency has to be 50 Hz or 60 Hz according to the standard")
-    ppc_c = copy.deepcopy(ppc)
-    ppc_c["branch"][:, BR_X] *= fc / net.f_hz
 
-    zero_conductance = np.where(ppc["bus"][:,GS] == 0)
-    ppc["bus"][zero_conductance, BS] *= net.f_hz / fc
+def _create_ppc_c(net, ppc):
+    """
+    Creates the equivalent frequency network of kappa method C with its factorized Ybus.
+    """
+    fc = _equivalent_frequency(net)
+    # equivalent frequency network with copies of the bus and branch data only. Zbus of the base
+    # case is not copied, since only the diagonal of the equivalent frequency Zbus is needed.
+    ppc_c = {"baseMVA": ppc["baseMVA"], "bus": ppc["bus"].copy(), "branch": ppc["branch"].copy(),
+             "internal": {"fault_buses": ppc["internal"]["fault_buses"]}}
+    ppc_c["branch"][:, BR_X] *= fc / net.f_hz
 
     conductance = np.where(ppc["bus"][:,GS] != 0)
     z_shunt = 1 / (ppc_c["bus"][conductance, GS] + 1j * ppc_c["bus"][conductance, BS])
@@ -48,10 +77,9 @@ def _kappa_method_c(net, ppc):
     ppc_c["bus"][conductance, GS] = y_shunt.real[0]
     ppc_c["bus"][conductance, BS] = y_shunt.imag[0]
     _calc_ybus(ppc_c)
-    _calc_zbus(ppc_c)
-    _calc_rx(net, ppc_c)
-    rx_equiv_c = ppc_c["bus"][:, R_EQUIV] / ppc_c["bus"][:, X_EQUIV] * fc / net.f_hz
-    return _kappa(rx_equiv_c)
+    # sparse factorization with the ordering of the base case factorization if there is one
+    _calc_zbus(net, ppc_c, inverse_y=False, solver=ppc["internal"].get("ybus_fact"))
+    return ppc_c
 
 def _kappa(rx):
     return 1.02 + .98 * np.exp(-3 * rx)
@@ -68,18 +96,8 @@ def _kappa_method_b(net, ppc):
     else:
         kappa_korr = np.full(ppc["bus"].shape[0], 1.)
     if topology == "auto":
-        kappa_korr = np.full(ppc["bus"].shape[0], 1.)
-        mg = nxgraph_from_ppc(net, ppc)
-        for bidx in ppc["bus"][:, BUS_I].astype(int):
-            paths = list(nx.all_simple_paths(mg, bidx, "earth"))
-            if len(paths) > 1:
-                kappa_korr[bidx] = 1.15
-                for path in paths:
-                    r = sum([mg[b1][b2][0]["r"] for b1, b2 in zip(path, path[1:])])
-                    x = sum([mg[b1][b2][0]["x"] for b1, b2 in zip(path, path[1:])])
-                    if r / x < .3:
-                        kappa_korr[bidx] = 1.
-                        break
+        meshed, low_rx = _meshing_from_ppc(net, ppc)
+        kappa_korr = np.where(meshed & ~low_rx, 1.15, 1.)
     rx_equiv = ppc["bus"][:, R_EQUIV] / ppc["bus"][:, X_EQUIV]
     return np.clip(kappa_korr * _kappa(rx_equiv), 1, kappa_max)
 
@@ -96,4 +114,196 @@ def nxgraph_from_ppc(net, ppc):
     z = 1 / (ppc["bus"][vs_buses, GS] + ppc["bus"][vs_buses, BS] * 1j)
     mg.add_edges_from(("earth", int(bus), {"r": z.real, "x": z.imag})
                         for bus, z in zip(vs_buses, z))
-    return mg
\ No newline at end of file
+    return mg
+
+def _graph_from_ppc(net, ppc):
+    """
+    Returns the edges (from node, to node, r, x) of the graph of nxgraph_from_ppc as arrays. The
+    earth node gets the index ppc["bus"].shape[0].
+    """
+    bus_lookup = net._pd2ppc_lookups["bus"]
+    n = ppc["bus"].shape[0]
+    branch = ppc["branch"].real
+    vs_buses_pp = list(set(net["ext_grid"][net._is_elements["ext_grid"]].bus.values) |
+                       set(net["gen"][net._is_elements["gen"]].bus))
+    vs_buses = bus_lookup[vs_buses_pp].astype(int)
+    z = 1 / (ppc["bus"][vs_buses, GS] + ppc["bus"][vs_buses, BS] * 1j)
+    f = np.r_[branch[:, F_BUS].astype(int), np.full(len(vs_buses), n)]
+    t = np.r_[branch[:, T_BUS].astype(int), vs_buses]
+    r = np.r_[branch[:, BR_R], z.real]
+    x = np.r_[branch[:, BR_X], z.imag]
+    return f, t, r, x
+
+def _meshing_from_ppc(net, ppc):
+    """
+    Checks for every bus if it is supplied over more than one path from the earth node (meshed)
+    and if one of these paths has R/X < 0.3 (low_rx) without enumerating the paths.
+
+    Every simple path from a bus to the earth node passes the blocks (biconnected components) on
+    the path of the block-cut tree in the same order. A bus is meshed if one of these blocks has
+    more than one edge. The sum of r - 0.3 * x of the best path is the sum of the best paths
+    through the blocks, which are exact for single edges, parallel edges, rings and blocks with
+    up to MAX_ENUMERATED_BLOCK_EDGES edges. For larger blocks, the path with the shortest sum of
+    the positive parts of r - 0.3 * x is used.
+    """
+    n = ppc["bus"].shape[0]
+    f, t, r, x = _graph_from_ppc(net, ppc)
+    w = r - .3 * x
+    no_loop = f != t
+    f, t, w = f[no_loop], t[no_loop], w[no_loop]
+    n_blocks, block = _biconnected_components(n + 1, f, t)
+
+    # vertices of the blocks and blocks of the vertices
+    block_edges = [[] for _ in range(n_blocks)]
+    for e, b in enumerate(block):
+        block_edges[b].append(e)
+    block_nodes = [np.unique(np.r_[f[edges], t[edges]]) for edges in block_edges]
+    node_blocks = [[] for _ in range(n + 1)]
+    for b, nodes in enumerate(block_nodes):
+        for node in nodes:
+            node_blocks[node].append(b)
+
+    # breadth first search on the block-cut tree from the earth node
+    meshed = np.zeros(n + 1, dtype=bool)
+    path_w = np.full(n + 1, np.inf)
+    path_w[n] = 0.
+    visited_blocks = np.zeros(n_blocks, dtype=bool)
+    queue = deque([n])
+    while queue:
+        node = queue.popleft()
+        for b in node_blocks[node]:
+            if visited_blocks[b]:
+                continue
+            visited_blocks[b] = True
+            edges = np.array(block_edges[b])
+            nodes, block_w = _best_paths_in_block(node, f[edges], t[edges], w[edges])
+            for child, child_w in zip(nodes, block_w):
+                if child == node:
+                    continue
+                meshed[child] = meshed[node] or len(edges) > 1
+                path_w[child] = path_w[node] + child_w
+                queue.append(child)
+    return meshed[:n], path_w[:n] < 0
+
+def _best_paths_in_block(source, f, t, w):
+    """
+    Returns the nodes of a block and the smallest sum of w of the paths from source to the nodes
+    inside the block.
+    """
+    nodes = np.unique(np.r_[f, t])
+    if len(nodes) == 2:
+        # single or parallel edges
+        return nodes, np.where(nodes == source, 0., w.min())
+    if len(f) == len(nodes):
+        # ring: the two arcs from the source to every node
+        ring, ring_w = _ring_order(source, f, t, w)
+        clockwise = np.r_[0., np.cumsum(ring_w[:-1])]
+        counterclockwise = np.r_[0., ring_w.sum() - clockwise[1:]]
+        return ring, np.minimum(clockwise, counterclockwise)
+    # meshed block: parallel edges are reduced to the edge with the smallest w
+    pos = np.searchsorted(nodes, np.c_[f, t])
+    pos.sort(axis=1)
+    order = np.lexsort((w, pos[:, 1], pos[:, 0]))
+    pos, w = pos[order], w[order]
+    first = np.r_[True, np.any(pos[1:] != pos[:-1], axis=1)]
+    pos, w = pos[first], w[first]
+    m = len(nodes)
+    source_pos = np.searchsorted(nodes, source)
+    if len(w) <= MAX_ENUMERATED_BLOCK_EDGES:
+        # small blocks: all simple paths inside the block
+        graph = nx.Graph()
+        graph.add_weighted_edges_from(zip(pos[:, 0], pos[:, 1], w))
+        path_w = np.zeros(m)
+        for node in range(m):
+            if node != source_pos:
+                path_w[node] = min(sum(graph[a][b]["weight"] for a, b in zip(path, path[1:]))
+                                   for path in nx.all_simple_paths(graph, source_pos, node))
+        return nodes, path_w
+    # large blocks: shortest path tree with the positive parts of w
+    # zero weights would be missing edges in csgraph
+    graph = coo_matrix((np.maximum(w, 0.) + 1e-12, (pos[:, 0], pos[:, 1])), shape=(m, m))
+    dist, pred = dijkstra(graph.tocsr(), directed=False, indices=source_pos,
+                          return_predecessors=True)
+    edge_w = dict(zip(zip(pos[:, 0], pos[:, 1]), w))
+    path_w = np.zeros(m)
+    for node in np.argsort(dist):
+        if node != source_pos:
+            parent = pred[node]
+            path_w[node] = path_w[parent] + edge_w[min(node, parent), max(node, parent)]
+    return nodes, path_w
+
+def _ring_order(source, f, t, w):
+    """
+    Returns the nodes of a ring starting at source and the weights of the edges between them.
+    """
+    adjacent = defaultdict(list)
+    for e, (a, b) in enumerate(zip(f, t)):
+        adjacent[a].append((b, e))
+        adjacent[b].append((a, e))
+    ring, ring_w = [source], []
+    node, last_edge = source, -1
+    for _ in range(len(f)):
+        node_next, edge = [(b, e) for b, e in adjacent[node] if e != last_edge][0]
+        ring_w.append(w[edge])
+        if node_next == source:
+            break
+        ring.append(node_next)
+        node, last_edge = node_next, edge
+    return np.array(ring), np.array(ring_w)
+
+def _biconnected_components(n_nodes, f, t):
+    """
+    Returns the number of biconnected components (blocks) and the block of every edge with an
+    iterative version of the algorithm of Hopcroft and Tarjan on a CSR adjacency of the graph.
+    Parallel edges form a block.
+    """
+    n_edges = len(f)
+    nodes = np.r_[f, t]
+    order = np.argsort(nodes, kind="stable")
+    neighbors = np.r_[t, f][order]
+    edge_ids = np.r_[np.arange(n_edges), np.arange(n_edges)][order]
+    indptr = np.r_[0, np.cumsum(np.bincount(nodes, minlength=n_nodes))]
+
+    block = np.full(n_edges, -1)
+    disc = np.full(n_nodes, -1)
+    low = np.zeros(n_nodes, dtype=int)
+    n_blocks, counter = 0, 0
+    edge_stack = []
+    for root in range(n_nodes):
+        if disc[root] >= 0:
+            continue
+        disc[root] = low[root] = counter
+        counter += 1
+        # depth first search with (node, edge to the parent node, next adjacency position)
+        stack = [[root, -1, indptr[root]]]
+        while stack:
+            v, parent_edge, k = stack[-1]
+            if k < indptr[v + 1]:
+                stack[-1][2] += 1
+                u, e = neighbors[k], edge_ids[k]
+                if e == parent_edge:
+                    continue
+                if disc[u] < 0:
+                    edge_stack.append(e)
+                    disc[u] = low[u] = counter
+                    counter += 1
+                    stack.append([u, e, indptr[u]])
+                elif disc[u] < disc[v]:
+                    # back edge
+                    edge_stack.append(e)
+                    low[v] = min(low[v], disc[u])
+                continue
+            stack.pop()
+            if not stack:
+                continue
+            parent = stack[-1][0]
+            low[parent] = min(low[parent], low[v])
+            if low[v] >= disc[parent]:
+                # parent separates the block of the edge to v from the rest of the graph
+                while True:
+                    e = edge_stack.pop()
+                    block[e] = n_blocks
+                    if e == parent_edge:
+                        break
+                n_blocks += 1
+    return n_blocks, block
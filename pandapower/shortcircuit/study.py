@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+try:
+    import pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from pandapower.auxiliary import _clean_up, _add_ppc_options, _add_sc_options
+from pandapower.idx_bus import BASE_KV
+from pandapower.pd2ppc import _pd2ppc
+from pandapower.pd2ppc_zero import _pd2ppc_zero
+from pandapower.powerflow import _add_auxiliary_elements
+from pandapower.results import _copy_results_ppci_to_ppc
+from pandapower.shortcircuit.currents import _calc_ikss, _calc_ikss_1ph, _calc_ip, _calc_ith, \
+    _calc_branch_currents, _current_source_injections
+from pandapower.shortcircuit.idx_bus import C_MIN, C_MAX
+from pandapower.shortcircuit.impedance import _calc_zbus, _calc_ybus, _calc_rx, \
+    _set_fault_buses, _calc_zbus_diag
+from pandapower.shortcircuit.kappa import _add_kappa_to_ppc, _create_ppc_c
+from pandapower.shortcircuit.results import _extract_results
+
+
+class ShortCircuitStudy(object):
+    """
+    Short-circuit study of a network with several fault types, cases and fault impedances.
+
+    The positive sequence model (and the zero sequence model for 1ph faults) of each case is
+    converted and its admittance matrix is factorized only once. The diagonal of the bus
+    impedance matrix is also calculated only once, so that additional queries only add the fault
+    impedance and calculate the currents. The models are created when they are first needed, the
+    network must not be changed during the study.
+
+    INPUT:
+        **net** (pandapowerNet) pandapower Network
+
+    OPTIONAL:
+        **lv_tol_percent** (int, 10) voltage tolerance in low voltage grids
+
+        **topology** (str, "auto") define option for meshing (only relevant for ip and ith)
+
+        **tk_s** (float, 1) failure clearing time in seconds (only relevant for ith)
+
+        **kappa_method** (str, "C") method for the calculation of the peak factor kappa
+
+    EXAMPLE:
+        study = ShortCircuitStudy(net)
+
+        study.run(fault="3ph", case="max")
+
+        print(net.res_bus_sc)
+
+        ikss_ka = study.calc_ikss(fault="1ph", r_fault_ohm=[0., 5., 10.])
+    """
+
+    def __init__(self, net, lv_tol_percent=10, topology="auto", tk_s=1., kappa_method="C"):
+        if topology not in ["meshed", "radial", "auto"]:
+            raise ValueError(
+                'specify network structure as "meshed", "radial" or "auto"')
+        self.net = net
+        self.lv_tol_percent = lv_tol_percent
+        self.topology = topology
+        self.tk_s = tk_s
+        self.kappa_method = kappa_method
+        self._models = {}
+
+    def run(self, fault="3ph", case="max", r_fault_ohm=0., x_fault_ohm=0., ip=False, ith=False,
+            branch_results=False):
+        """
+        Calculates the short-circuit currents of faults at all buses with the cached models and
+        writes them to net.res_bus_sc (and the branch result tables) like calc_sc.
+
+        OPTIONAL:
+            **fault** (str, "3ph") type of fault ("3ph", "2ph" or "1ph")
+
+            **case** (str, "max") "max" or "min" for maximal or minimal short-circuit currents
+
+            **r_fault_ohm** (float, 0) fault resistance in Ohm
+
+            **x_fault_ohm** (float, 0) fault reactance in Ohm
+
+            **ip** (bool, False) if True, calculate aperiodic short-circuit current
+
+            **ith** (bool, False) if True, calculate equivalent thermal short-circuit current
+
+            **branch_results** (bool, False) if True, calculate branch short-circuit currents
+        """
+        net = self.net
+        self._check_query(fault, case)
+        if len(net.gen) and (ip or ith):
+            logger.warning("aperiodic and thermal short-circuit currents are only implemented "
+                           "for faults far from generators!")
+        if branch_results:
+            logger.warning("Branch results are in beta mode and might not always be reliable, "
+                           "especially for transformers")
+        self._set_options(fault, case, r_fault_ohm, x_fault_ohm, ip, ith, branch_results)
+        ppc, ppci = self._get_model(case)
+        _calc_rx(net, ppci)
+        _add_kappa_to_ppc(net, ppci)
+        if fault == "1ph":
+            # the zero sequence lookups are used for the results like in calc_sc
+            ppc_0, ppci_0 = self._get_model(case, zero_sequence=True)
+            _calc_rx(net, ppci_0)
+            _calc_ikss_1ph(net, ppci, ppci_0)
+            ppc_0 = _copy_results_ppci_to_ppc(ppci_0, ppc_0, "sc")
+            ppc = _copy_results_ppci_to_ppc(ppci, ppc, "sc")
+            _extract_results(net, ppc, ppc_0)
+        else:
+            _calc_ikss(net, ppci)
+            if ip:
+                _calc_ip(net, ppci)
+            if ith:
+                _calc_ith(net, ppci)
+            if branch_results:
+                _calc_branch_currents(net, ppci)
+            ppc = _copy_results_ppci_to_ppc(ppci, ppc, "sc")
+            _extract_results(net, ppc, ppc_0=None)
+
+    def calc_ikss(self, fault="3ph", case="max", r_fault_ohm=0., x_fault_ohm=0.):
+        """
+        Calculates the initial short-circuit currents of faults at all buses for several fault
+        impedances at once.
+
+        OPTIONAL:
+            **fault** (str, "3ph") type of fault ("3ph", "2ph" or "1ph")
+
+            **case** (str, "max") "max" or "min" for maximal or minimal short-circuit currents
+
+            **r_fault_ohm** (float or array, 0) fault resistances in Ohm
+
+            **x_fault_ohm** (float or array, 0) fault reactances in Ohm
+
+        OUTPUT:
+            **ikss_ka** (array) initial short-circuit currents in kA with one row per fault
+            impedance and one column per bus of net.bus. Out of service buses are nan.
+        """
+        net = self.net
+        self._check_query(fault, case)
+        r_fault, x_fault = np.broadcast_arrays(np.atleast_1d(r_fault_ohm).astype(float),
+                                               np.atleast_1d(x_fault_ohm).astype(float))
+        z_fault_ohm = (r_fault + 1j * x_fault)[:, np.newaxis]
+        self._set_options(fault, case, 0., 0., False, False, False)
+        ppci = self._cached_model(case)[1]
+        bus = ppci["bus"]
+        c = bus[:, C_MIN] if case == "min" else bus[:, C_MAX]
+        z_fault = z_fault_ohm / (np.square(bus[:, BASE_KV]) / ppci["baseMVA"])
+        z_equiv = ppci["internal"]["zbus_diag"] + z_fault
+        if fault == "1ph":
+            ppci_0 = self._cached_model(case, zero_sequence=True)[1]
+            bus_0 = ppci_0["bus"]
+            z_equiv_0 = ppci_0["internal"]["zbus_diag"] + \
+                z_fault_ohm / (np.square(bus_0[:, BASE_KV]) / ppci_0["baseMVA"])
+            ikss1 = c / abs(2 * z_equiv + z_equiv_0) / bus_0[:, BASE_KV] * np.sqrt(3) * \
+                ppci_0["baseMVA"]
+        elif fault == "3ph":
+            ikss1 = c / abs(z_equiv) / bus[:, BASE_KV] / np.sqrt(3) * ppci["baseMVA"]
+        else:
+            ikss1 = c / abs(z_equiv) / bus[:, BASE_KV] / 2 * ppci["baseMVA"]
+        # the lookups of the zero sequence model are used for 1ph faults like in calc_sc
+        self._set_lookups(case, zero_sequence=fault == "1ph")
+        # contribution of the static generators as in _current_source_current, with the fault
+        # impedance on the diagonal of Zbus
+        buses, ikcv_pu = _current_source_injections(net)
+        ikss2 = np.zeros_like(ikss1)
+        if len(buses):
+            baseI = bus[:, BASE_KV] * np.sqrt(3) / ppci["baseMVA"]
+            ikcv = np.zeros(bus.shape[0], dtype=complex)
+            ikcv[buses] = ikcv_pu * -1j
+            z_ikcv = ppci["internal"]["ybus_fact"].solve(ikcv) + z_fault * ikcv
+            ikss2 = abs(z_ikcv / z_equiv) / baseI
+        ppc_index = net["_pd2ppc_lookups"]["bus"][net.bus.index.values]
+        in_service = ppc_index < bus.shape[0]
+        ikss = np.full((len(r_fault), len(net.bus)), np.nan)
+        ikss[:, in_service] = (ikss1 + ikss2)[:, ppc_index[in_service]]
+        return ikss
+
+    def _check_query(self, fault, case):
+        if fault not in ["3ph", "2ph", "1ph"]:
+            raise NotImplementedError(
+                "Only 3ph, 2ph and 1ph short-circuit currents implemented")
+        if case not in ['max', 'min']:
+            raise ValueError('case can only be "min" or "max" for minimal or maximal short '
+                             'circuit current')
+        if fault == "1ph" and case == "min":
+            raise NotImplementedError("Minimum 1ph short-circuits are not yet implemented")
+
+    def _set_options(self, fault, case, r_fault_ohm, x_fault_ohm, ip, ith, branch_results):
+        net = self.net
+        net["_options"] = {}
+        _add_ppc_options(net, calculate_voltage_angles=False, trafo_model="pi",
+                         check_connectivity=False, mode="sc", copy_constraints_to_ppc=False,
+                         r_switch=0.0, init_vm_pu="flat", init_va_degree="flat",
+                         enforce_q_lims=False, recycle=None)
+        _add_sc_options(net, fault=fault, case=case, lv_tol_percent=self.lv_tol_percent,
+                        tk_s=self.tk_s, topology=self.topology, r_fault_ohm=r_fault_ohm,
+                        kappa_method=self.kappa_method, x_fault_ohm=x_fault_ohm,
+                        kappa=ip or ith, ip=ip, ith=ith, consider_sgens=False,
+                        branch_results=branch_results, inverse_y=False)
+
+    def _set_lookups(self, case, zero_sequence=False):
+        _, _, lookups, is_elements = self._models[(case, zero_sequence)]
+        self.net["_pd2ppc_lookups"] = lookups
+        self.net["_is_elements"] = is_elements
+
+    def _cached_model(self, case, zero_sequence=False):
+        key = (case, zero_sequence)
+        if key not in self._models:
+            self._models[key] = self._create_model(zero_sequence)
+        return self._models[key]
+
+    def _get_model(self, case, zero_sequence=False):
+        """
+        Returns copies of the ppc and ppci of the model that can be changed by the calculation.
+        The bus and branch arrays are copied, the factorization of Ybus and the diagonal of Zbus
+        are shared with the cached model.
+        """
+        ppc, ppci = self._cached_model(case, zero_sequence)[:2]
+        self._set_lookups(case, zero_sequence)
+        ppc = dict(ppc, bus=ppc["bus"].copy(), branch=ppc["branch"].copy(),
+                   gen=ppc["gen"].copy())
+        ppci = dict(ppci, bus=ppci["bus"].copy(), branch=ppci["branch"].copy(),
+                    internal=dict(ppci["internal"]))
+        return ppc, ppci
+
+    def _create_model(self, zero_sequence):
+        net = self.net
+        _add_auxiliary_elements(net)
+        try:
+            ppc, ppci = _pd2ppc_zero(net) if zero_sequence else _pd2ppc(net)
+            _set_fault_buses(net, ppci)
+            _calc_ybus(ppci)
+            _calc_zbus(net, ppci, inverse_y=False)
+            ppci["internal"]["zbus_diag"] = _calc_zbus_diag(ppci)
+            if not zero_sequence and self.kappa_method == "C":
+                ppc_c = _create_ppc_c(net, ppci)
+                ppc_c["internal"]["zbus_diag"] = _calc_zbus_diag(ppc_c)
+                ppci["internal"]["ppc_c"] = ppc_c
+            lookups, is_elements = net["_pd2ppc_lookups"], net["_is_elements"]
+        finally:
+            _clean_up(net, res=False)
+        return ppc, ppci, lookups, is_elements
@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import copy
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from pandapower.contingency import MONITORED_ELEMENTS, _get_loading_factors
+from pandapower.create import create_buses, create_impedance
+from pandapower.idx_brch import F_BUS, T_BUS, BR_STATUS
+from pandapower.idx_bus import BASE_KV, GS
+from pandapower.idx_gen import VG
+from pandapower.pf.dcpf import dcpf
+from pandapower.pf.makeBdc import makeBdc
+from pandapower.pf.newtonpf import newtonpf
+from pandapower.powerflow import LoadflowNotConverged
+from pandapower.results import _extract_results_batch
+from pandapower.results_branch import _get_branch_results_batch
+from pandapower.session import PowerFlowSession
+
+try:
+    import pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+# element switch types and the bus columns of the switched elements
+SWITCHED_ELEMENTS = {"l": ("line", ["from_bus", "to_bus"]),
+                     "t": ("trafo", ["hv_bus", "lv_bus"]),
+                     "t3": ("trafo3w", ["hv_bus", "mv_bus", "lv_bus"])}
+
+
+class SwitchingSession(object):
+    """
+    Repeated AC power flows (newton raphson) of one network with changing switch states, e.g. for
+    reconfiguration studies.
+
+    The network is converted only once without fusing any buses: every switch at a line, trafo or
+    trafo3w gets an auxiliary bus at the switched end of the element, as it is done for open
+    switches in the conversion of runpp. The buses that are connected by closed switches (bus-bus
+    switches and the auxiliary buses of closed element switches) are fused for every switching
+    state by reducing the admittance matrix and the bus injections of the unfused network with a
+    sparse incidence matrix. Buses that are not connected to an ext_grid are not supplied. The
+    results are the same as of runpp with the same switch states, but a switching state costs only
+    the reduction, two connected component searches and the power flow itself.
+
+    INPUT:
+        **net** - The pandapower format network
+
+    OPTIONAL:
+        ****kwargs** - power flow options as in runpp (e.g. calculate_voltage_angles,
+        init, tolerance_kva, max_iteration). The power flows start from the voltages of the last
+        converged state, the initialization given by init (for init="dc" with a dc power flow of
+        the switching state) is only used for the first run and with warm_start=False.
+        init="results", r_switch, enforce_q_lims and voltage dependent loads are not available.
+
+    EXAMPLE:
+        session = pp.SwitchingSession(net)
+
+        session.set_switches(False, index=[12, 40])
+
+        session.run()
+
+        vm_pu = session.results_as_arrays()["bus"]["vm_pu"]
+
+        res = session.evaluate_states(closed_matrix, index=net.switch.index[net.switch.et == "l"])
+    """
+
+    def __init__(self, net, **kwargs):
+        for option in ["init", "init_vm_pu", "init_va_degree"]:
+            if isinstance(kwargs.get(option), str) and kwargs[option] == "results":
+                raise NotImplementedError("init='results' is not available in a SwitchingSession")
+        if kwargs.get("r_switch", 0.):
+            raise NotImplementedError("r_switch is not available in a SwitchingSession")
+        # the connectivity is checked for every switching state
+        kwargs.pop("check_connectivity", None)
+        self.net = net
+        self.bus_index = net["bus"].index.values
+        self.switch_index = net["switch"].index
+        self.closed = net["switch"]["closed"].values.astype(bool)
+
+        self.base_net, switch_buses, dummy_impedances = _create_unfused_net(net)
+        self.session = PowerFlowSession(self.base_net, check_connectivity=False, **kwargs)
+        if self.session.options["voltage_depend_loads"]:
+            raise NotImplementedError("Voltage dependent loads are not available in a "
+                                      "SwitchingSession")
+        session = self.session
+        n_bus = session.ppci["bus"].shape[0]
+        self._n_bus = n_bus
+        bus_ppci = session.lookups["bus"][self.bus_index]
+        self._bus_ppci = bus_ppci[bus_ppci < n_bus]
+
+        # switches between in service buses of the unfused ppci
+        switch_buses = session.lookups["bus"][switch_buses]
+        self._switch_valid = np.all(switch_buses < n_bus, axis=1)
+        self._switch_buses = np.where(self._switch_valid[:, np.newaxis], switch_buses, 0)
+
+        # the dummy impedances that keep the switch buses in the ppci are removed again
+        branch = session.ppci["branch"]
+        Yf = session.ppci["internal"]["Yf"].tocsr()
+        Yt = session.ppci["internal"]["Yt"].tocsr()
+        f = branch[:, F_BUS].real.astype(np.int64)
+        t = branch[:, T_BUS].real.astype(np.int64)
+        dummy = _get_ppci_impedance_rows(self.base_net, session, dummy_impedances)
+        keep = (branch[:, BR_STATUS].real == 1)
+        keep[dummy] = False
+        n_dummy = len(dummy)
+        Cf = csr_matrix((np.ones(n_dummy), (np.arange(n_dummy), f[dummy])), shape=(n_dummy, n_bus))
+        Ct = csr_matrix((np.ones(n_dummy), (np.arange(n_dummy), t[dummy])), shape=(n_dummy, n_bus))
+        self._Ybus = (session.Ybus - Cf.T * Yf[dummy] - Ct.T * Yt[dummy]).tocsr()
+        self._dc_init = session.options["init_va_degree"] == "dc"
+        if self._dc_init:
+            branch_dc = branch.copy()
+            branch_dc[dummy, BR_STATUS] = 0
+            self._B, _, self._Pbusinj, _ = makeBdc(session.ppci["bus"], branch_dc)
+        self._f, self._t = f[keep], t[keep]
+        self._Yf, self._Yt = Yf[keep], Yt[keep]
+        self._loading = {key: values[keep] for key, values in
+                         _get_loading_factors(self.base_net, session).items()}
+        # the jacobian template of the fused networks
+        self._ppci = {"baseMVA": session.ppci["baseMVA"], "bus": session.ppci["bus"],
+                      "gen": session.ppci["gen"], "internal": dict()}
+        self.V = None
+        self.supplied = None
+        self.converged = False
+        self.iterations = 0
+
+    def set_switches(self, closed, index=None):
+        """
+        Changes the switch states for the following runs.
+
+        INPUT:
+            **closed** (bool/array) - states of the switches
+
+        OPTIONAL:
+            **index** (iterable, None) - indices of the switches the states are given for. If
+            None, the states are given for all switches of net.switch.
+        """
+        if index is None:
+            self.closed[:] = closed
+            return
+        index = np.atleast_1d(np.asarray(index))
+        pos = self.switch_index.get_indexer(index)
+        if np.any(pos < 0):
+            raise UserWarning("Unknown switch indices %s" % index[pos < 0])
+        self.closed[pos] = closed
+
+    def update_injections(self, element, p_kw=None, q_kvar=None, vm_pu=None, index=None):
+        """
+        Changes the power or the voltage setpoint of elements for the following runs, see
+        PowerFlowSession.update_injections.
+        """
+        self.session.update_injections(element, p_kw=p_kw, q_kvar=q_kvar, vm_pu=vm_pu,
+                                       index=index)
+
+    def run(self, warm_start=True):
+        """
+        Runs the power flow with the current switch states and injections.
+
+        OPTIONAL:
+            **warm_start** (bool, True) - if True, the power flow is started from the voltages of
+            the last converged run. Otherwise it is started from the initialization given by init.
+
+        OUTPUT:
+            **converged** (bool) - True if the power flow converged. Otherwise a
+            LoadflowNotConverged error is raised and the voltages of the last converged run are
+            kept.
+        """
+        V, supplied, success, iterations = self._run_state(warm_start)
+        self.converged = bool(success)
+        self.iterations = iterations
+        if not success:
+            raise LoadflowNotConverged("Power Flow did not converge after %u iterations!"
+                                       % iterations)
+        self.V, self.supplied = V, supplied
+        return self.converged
+
+    def _run_state(self, warm_start):
+        """
+        Fuses the buses of the current switch states and solves the power flow. Returns the
+        voltages of the unfused ppci buses (nan for buses that are not supplied), the supplied
+        buses, convergence and number of iterations.
+        """
+        session, n_bus = self.session, self._n_bus
+
+        # buses connected by closed switches are fused
+        closed = self.closed & self._switch_valid
+        sw = self._switch_buses[closed]
+        graph = coo_matrix((np.ones(len(sw)), (sw[:, 0], sw[:, 1])), shape=(n_bus, n_bus))
+        n_fused, labels = connected_components(graph, directed=False)
+        P = csr_matrix((np.ones(n_bus), (np.arange(n_bus), labels)), shape=(n_bus, n_fused))
+        Ybus = (P.T * self._Ybus * P).tocsr()
+        Sbus_unfused = session._get_Sbus()
+        Sbus = P.T * Sbus_unfused
+
+        # fused buses that are connected to a reference bus are supplied
+        branch_graph = coo_matrix((np.ones(len(self._f)), (labels[self._f], labels[self._t])),
+                                  shape=(n_fused, n_fused))
+        _, islands = connected_components(branch_graph, directed=False)
+        ref = np.unique(labels[session.ref])
+        supplied = np.in1d(islands, islands[ref])
+        pv = np.setdiff1d(labels[session.pv], ref)
+        pv = pv[supplied[pv]]
+        pq = np.setdiff1d(np.arange(n_fused), np.r_[ref, pv])
+        pq = pq[supplied[pq]]
+
+        # initial voltages from the representative (first) unfused bus of every fused bus
+        first = np.zeros(n_fused, dtype=np.int64)
+        first[labels[::-1]] = np.arange(n_bus)[::-1]
+        V0 = session._V_init[first]
+        if warm_start and self.V is not None:
+            V_last = self.V[first]
+            V0 = np.where(np.isnan(V_last), V0, V_last)
+        elif self._dc_init and len(pv) + len(pq):
+            # voltage angles of a dc power flow of the fused network
+            bus = session.ppci["bus"]
+            B = (P.T * self._B * P).tocsr()
+            Pbus = P.T * (Sbus_unfused.real - self._Pbusinj - bus[:, GS] / session.ppci["baseMVA"])
+            Va = dcpf(B, Pbus, np.angle(V0), ref, pv, pq, session.options["linear_solver"])
+            V0 = np.abs(V0) * np.exp(1j * Va)
+        gen = session.ppci["gen"]
+        gbus = labels[session.gbus]
+        V0[gbus] = gen[session.on, VG] / abs(V0[gbus]) * V0[gbus]
+
+        if len(pv) + len(pq):
+            V, success, iterations, _, _, _ = newtonpf(Ybus, Sbus, V0, pv, pq, self._ppci,
+                                                       session.options)
+        else:
+            # only the reference buses are supplied
+            V, success, iterations = V0, True, 0
+        V = np.where(supplied, V, np.nan)
+        return V[labels], supplied[labels], success, iterations
+
+    def results_as_arrays(self):
+        """
+        Returns the results of the last converged run as arrays.
+
+        OUTPUT:
+            **results** (dict) - dicts of arrays for "bus" (vm_pu, va_degree), "line" and
+            "trafo" (the columns of res_line / res_trafo) in the order of the element tables.
+            Out of service and unsupplied buses get nan, out of service branches and branches
+            between unsupplied buses zero flows, as in runpp.
+        """
+        if not self.converged:
+            raise UserWarning("There are no results, since the last run did not converge")
+        session = self.session
+        self.base_net["_pd2ppc_lookups"] = session.lookups
+        self.base_net["_options"] = session.options
+        # unsupplied buses get zero voltages, so that the branches between them get zero flows
+        V = np.where(self.supplied, self.V, 0.)
+        res = _extract_results_batch(self.base_net, session.ppc, session.ppci,
+                                     V[np.newaxis, :], self.bus_index)
+        bus_ppci = session.lookups["bus"][self.bus_index]
+        unsupplied = bus_ppci < self._n_bus
+        unsupplied[unsupplied] = ~self.supplied[bus_ppci[unsupplied]]
+        vm_pu, va_degree = res["vm_pu"][0], res["va_degree"][0]
+        vm_pu[unsupplied], va_degree[unsupplied] = np.nan, np.nan
+        results = {"bus": {"vm_pu": vm_pu, "va_degree": va_degree}}
+        for element in ["line", "trafo"]:
+            results[element] = {column: values[0] for column, values in
+                                _get_branch_results_batch(self.base_net, res, element).items()}
+        return results
+
+    def evaluate_states(self, closed_matrix, index=None, warm_start=True):
+        """
+        Runs the power flows for many switching states and returns the key results of every state.
+        The switch states are reset to the ones before the call afterwards.
+
+        INPUT:
+            **closed_matrix** (array) - switch states with the shape (number of states,
+            number of switches in index)
+
+        OPTIONAL:
+            **index** (iterable, None) - indices of the switches the states are given for. If
+            None, the states are given for all switches of net.switch.
+
+            **warm_start** (bool, True) - if True, every power flow starts from the voltages of
+            the last converged state
+
+        OUTPUT:
+            **results** (dict) - arrays with one entry per state:
+
+                - "converged" - convergence of the power flow
+                - "min_vm_pu", "max_vm_pu" - minimum and maximum voltage of the supplied buses
+                - "max_loading_line", "max_loading_trafo" - maximum loading_percent of the lines
+                  and trafos
+                - "unsupplied_buses" - number of in service buses of net.bus that are not supplied
+
+            States without convergence get nan results.
+        """
+        closed_matrix = np.atleast_2d(np.asarray(closed_matrix, dtype=bool))
+        n = closed_matrix.shape[0]
+        results = {"converged": np.zeros(n, dtype=bool), "unsupplied_buses": np.zeros(n, dtype=int)}
+        for key in ["min_vm_pu", "max_vm_pu"] + ["max_loading_" + e for e in MONITORED_ELEMENTS]:
+            results[key] = np.full(n, np.nan)
+        closed_before = self.closed.copy()
+        V_last = self.V
+        try:
+            for i in range(n):
+                self.set_switches(closed_matrix[i], index)
+                V, supplied, success, _ = self._run_state(warm_start)
+                results["converged"][i] = success
+                if not success:
+                    continue
+                if warm_start:
+                    self.V = V
+                self._get_state_results(V, supplied, results, i)
+        finally:
+            self.closed[:] = closed_before
+            self.V = V_last
+        return results
+
+    def _get_state_results(self, V, supplied, results, i):
+        vm = np.abs(V[supplied])
+        results["unsupplied_buses"][i] = np.count_nonzero(~supplied[self._bus_ppci])
+        results["min_vm_pu"][i], results["max_vm_pu"][i] = vm.min(), vm.max()
+
+        # loading of the branches between supplied buses, as in _run_outage
+        f, t, loading = self._f, self._t, self._loading
+        V = np.where(supplied, V, 0.)
+        baseMVA = self.session.ppci["baseMVA"]
+        base_kv = self.session.ppci["bus"][:, BASE_KV]
+        valid = supplied[f] & supplied[t]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s_f = np.abs(V[f] * np.conj(self._Yf * V)) * baseMVA
+            s_t = np.abs(V[t] * np.conj(self._Yt * V)) * baseMVA
+            use_power = loading["use_power"]
+            x_f = np.where(use_power, s_f, s_f / (np.abs(V[f]) * base_kv[f] * np.sqrt(3)))
+            x_t = np.where(use_power, s_t, s_t / (np.abs(V[t]) * base_kv[t] * np.sqrt(3)))
+        branch_loading = np.maximum(x_f * loading["a_f"], x_t * loading["a_t"])
+        for j, element in enumerate(MONITORED_ELEMENTS):
+            monitored = valid & (loading["monitored"] == j)
+            if monitored.any():
+                results["max_loading_" + element][i] = branch_loading[monitored].max()
+
+
+def _create_unfused_net(net):
+    """
+    Returns a copy of the net without switches, the pairs of buses that every switch of
+    net.switch connects when it is closed and the indices of dummy impedances. Every switch at a
+    line, trafo or trafo3w is replaced by an auxiliary bus at the switched end of the element, so
+    that closing the switch connects the auxiliary bus with the switch bus.
+
+    Buses without branches are set out of service in the conversion, so the switches are replaced
+    by dummy impedances, which are removed from the admittance matrix after the conversion.
+    """
+    base = copy.deepcopy(net)
+    switch = net["switch"]
+    switch_buses = np.column_stack([switch["bus"].values,
+                                    switch["element"].values]).astype(np.int64)
+    for et, (element, columns) in SWITCHED_ELEMENTS.items():
+        is_et = switch["et"].values == et
+        if not np.any(is_et):
+            continue
+        buses = switch["bus"].values[is_et]
+        aux_buses = create_buses(base, len(buses), vn_kv=base["bus"]["vn_kv"].loc[buses].values,
+                                 in_service=base["bus"]["in_service"].loc[buses].values,
+                                 name=["switch %s" % i for i in switch.index[is_et]])
+        elements = switch["element"].values[is_et]
+        table = base[element]
+        for element_index, bus, aux_bus in zip(elements, buses, aux_buses):
+            for column in columns:
+                if table.at[element_index, column] == bus:
+                    table.at[element_index, column] = aux_bus
+                    break
+            else:
+                raise UserWarning("Switch at %s %s is not connected to one of its buses (or "
+                                  "there are several switches at the same end)"
+                                  % (element, element_index))
+        switch_buses[is_et, 1] = aux_buses
+    base["switch"].drop(base["switch"].index, inplace=True)
+    dummy_impedances = [create_impedance(base, f, t, rft_pu=0., xft_pu=1., sn_kva=net.sn_kva)
+                        for f, t in switch_buses if f != t]
+    return base, switch_buses, dummy_impedances
+
+
+def _get_ppci_impedance_rows(net, session, index):
+    """
+    Returns the ppci branch rows of the impedances in index (that are in service).
+    """
+    if not len(index):
+        return np.array([], dtype=np.int64)
+    branch_is = session.ppci["internal"]["branch_is"]
+    first, _ = session.lookups["branch"]["impedance"]
+    ppc_rows = first + net["impedance"].index.get_indexer(index)
+    ppc_rows = ppc_rows[branch_is[ppc_rows]]
+    return np.cumsum(branch_is)[ppc_rows] - 1
@@ -35,6 +35,30 @@ def simple_network():
 
 
 
+@pytest.fixture
+def count_calls(monkeypatch):
+    """
+    Returns a function count(owner, *names) that replaces the functions or methods names of the
+    module or class owner with wrappers that count their calls. It returns a dict with the
+    number of calls of each name, which is updated by the wrappers.
+    """
+    calls = dict()
+
+    def count(owner, *names):
+        for name in names:
+            calls[name] = 0
+            monkeypatch.setattr(owner, name, _counted(getattr(owner, name), name, calls))
+        return calls
+    return count
+
+
+def _counted(original, name, calls):
+    def counted(*args, **kwargs):
+        calls[name] += 1
+        return original(*args, **kwargs)
+    return counted
+
+
 @pytest.fixture(scope="session")
 def result_test_network():
     for net in result_test_network_generator():
@@ -4,14 +4,23 @@
 # and Energy System Technology (IEE), Kassel. All rights reserved.
 
 
+import copy
 import os
 
 import numpy as np
+import pandas as pd
 import pytest
+from scipy.sparse import issparse
 
 import pandapower as pp
 import pandapower.networks as nw
-from pandapower.estimation import chi2_analysis, remove_bad_data, estimate
+from pandapower.estimation import chi2_analysis, remove_bad_data, estimate, state_estimation, \
+    tracking_state_estimation
+from pandapower.estimation.state_estimation import _diagonal_of_h_ginv_ht
+from pandapower.pf.linear_solver import get_linear_solver, SuperLUSolver
+from pandapower.estimation.wls_matrix_ops import wls_matrix_ops
+from pandapower.estimation.wls_ppc_conversions import _add_measurements_to_ppc, \
+    _build_measurement_vectors, _init_ppc
 
 
 def test_2bus():
@@ -238,7 +247,9 @@ def test_3bus_with_transformer():
 
     assert success
     assert (np.nanmax(abs(diff_v)) < 6e-4)
-    assert (np.nanmax(abs(diff_delta)) < 1.4e-4)
+    # the standard deviation of the estimated voltage angles from the measurement accuracy
+    # (diagonal of the inverse gain matrix) is about 1.8e-3 degree
+    assert (np.nanmax(abs(diff_delta)) < 3.5e-3)
 
     # Backwards check. Use state estimation results for power flow and check for equality
     net.load.drop(net.load.index, inplace=True)
@@ -325,6 +336,27 @@ def test_3bus_with_i_line_measurements():
     assert (np.nanmax(abs(net.res_bus_est.va_degree.values - net.res_bus.va_degree.values)) < 0.9)
 
 
+def test_current_measurements_per_unit():
+    # current measurements in A are converted with the base current of the measured bus
+    net = load_3bus_network()
+    net.measurement.drop(net.measurement.index, inplace=True)
+    pp.create_load(net, 1, p_kw=495.974966, q_kvar=297.749528)
+    pp.create_load(net, 2, p_kw=1514.220983, q_kvar=787.528929)
+    pp.runpp(net)
+    for line in net.line.index:
+        pp.create_measurement(net, "i", "line", net.res_line.i_from_ka[line] * 1e3, 1.,
+                              net.line.from_bus[line], line)
+    s_ref = 1e6
+    ppc, ppci = _init_ppc(net, net.res_bus.vm_pu.values, net.res_bus.va_degree.values, False)
+    ppci = _add_measurements_to_ppc(net, ppci, s_ref)
+    z = _build_measurement_vectors(ppci)[0]
+
+    # per unit current magnitude |S| / |V| of the power flow
+    s_from = np.hypot(net.res_line.p_from_kw.values, net.res_line.q_from_kvar.values) * 1e3 / s_ref
+    i_pu = s_from / net.res_bus.vm_pu[net.line.from_bus].values
+    assert np.allclose(z, i_pu)
+
+
 def test_3bus_with_pq_line_from_to_measurements():
     np.random.seed(2017)
     net = load_3bus_network()
@@ -532,6 +564,250 @@ def test_check_existing_measurements():
     assert m5 != m6
 
 
+def test_create_measurements():
+    net = nw.case14()
+    _create_flow_measurements(net)
+    net_bulk = nw.case14()
+    # bulk creation with sides instead of buses and large, sparse element indices
+    net_bulk.line.index = net_bulk.line.index * 10 ** 9
+    table = net.measurement.copy()
+    is_line = (table.element_type == "line").values
+    table.loc[is_line, "element"] = table.element[is_line] * 10 ** 9
+    trafo_meas = table[table.element_type == "trafo"]
+    is_hv = trafo_meas.index[trafo_meas.bus.values ==
+                             net.trafo.hv_bus.loc[trafo_meas.element].values]
+    table["bus"] = table.bus.astype(object)
+    table.loc[is_hv, "bus"] = "hv"
+    index = pp.create_measurements(net_bulk, table)
+    assert list(index) == list(net.measurement.index)
+    assert net_bulk.measurement.drop("element", axis=1).equals(
+        net.measurement.drop("element", axis=1))
+    assert net_bulk.measurement.dtypes.equals(net.measurement.dtypes)
+
+    # existing measurements are replaced
+    table = pd.DataFrame({"type": ["v", "p"], "element_type": ["bus", "line"],
+                          "value": [1.02, 100.], "std_dev": [0.004, 10.],
+                          "bus": [0, "from"], "element": [None, 10 ** 9]})
+    index = pp.create_measurements(net_bulk, table)
+    assert len(net_bulk.measurement) == len(net.measurement)
+    assert list(net_bulk.measurement.value.loc[index]) == [1.02, 100.]
+    index = pp.create_measurements(net_bulk, table, check_existing=False)
+    assert len(net_bulk.measurement) == len(net.measurement) + 2
+
+    # the same measurement vector with the large line indices
+    net_bulk.measurement.drop(index, inplace=True)
+    net_bulk.measurement.loc[net.measurement.index, "value"] = net.measurement.value
+    vectors = []
+    for n in [net, net_bulk]:
+        ppc, ppci = _init_ppc(n, np.ones(len(n.bus)), np.zeros(len(n.bus)), True)
+        vectors.append(_build_measurement_vectors(_add_measurements_to_ppc(n, ppci, 1e8)))
+    for a, b in zip(*vectors):
+        assert np.array_equal(a, b)
+
+    for column, value in [("type", "x"), ("element_type", "load"), ("bus", 100),
+                          ("element", 1)]:
+        invalid = table.copy()
+        invalid.loc[1, column] = value
+        with pytest.raises(UserWarning):
+            pp.create_measurements(net_bulk, invalid)
+
+
+def _create_flow_measurements(net):
+    pp.runpp(net, calculate_voltage_angles=True)
+    for bus in net.bus.index:
+        pp.create_measurement(net, "v", "bus", net.res_bus.vm_pu[bus], 0.004, bus)
+        pp.create_measurement(net, "p", "bus", -net.res_bus.p_kw[bus], 10., bus)
+        pp.create_measurement(net, "q", "bus", -net.res_bus.q_kvar[bus], 10., bus)
+    for line in net.line.index:
+        pp.create_measurement(net, "p", "line", net.res_line.p_from_kw[line], 10.,
+                              net.line.from_bus[line], line)
+        pp.create_measurement(net, "q", "line", net.res_line.q_to_kvar[line], 10.,
+                              net.line.to_bus[line], line)
+        pp.create_measurement(net, "i", "line", net.res_line.i_from_ka[line] * 1e3, 1.,
+                              net.line.from_bus[line], line)
+    for trafo in net.trafo.index:
+        pp.create_measurement(net, "p", "trafo", net.res_trafo.p_hv_kw[trafo], 10.,
+                              net.trafo.hv_bus[trafo], trafo)
+        pp.create_measurement(net, "i", "trafo", net.res_trafo.i_lv_ka[trafo] * 1e3, 1.,
+                              net.trafo.lv_bus[trafo], trafo)
+
+
+def test_sparse_jacobian():
+    net = nw.case14()
+    _create_flow_measurements(net)
+    s_ref = net.sn_kva * 1e3
+    v_start = net.res_bus.vm_pu.values + 0.01 * np.arange(len(net.bus))
+    delta_start = net.res_bus.va_degree.values
+    ppc, ppci = _init_ppc(net, v_start, delta_start, True)
+    ppci = _add_measurements_to_ppc(net, ppci, s_ref)
+    z = _build_measurement_vectors(ppci)[0]
+    slack_buses = np.where(ppci["bus"][:, 1] == 3)[0]
+    non_slack_buses = np.where(ppci["bus"][:, 1] != 3)[0]
+    sem = wls_matrix_ops(ppci, slack_buses, non_slack_buses, s_ref)
+    v, delta = ppci["bus"][:, 7], np.deg2rad(ppci["bus"][:, 8])
+    H = sem.create_jacobian(v, delta)
+    assert issparse(H)
+    assert H.shape == (len(z), len(non_slack_buses) + len(v))
+
+    def hx(E):
+        delta_E = delta.copy()
+        delta_E[non_slack_buses] = E[:len(non_slack_buses)]
+        return sem.create_hx(E[len(non_slack_buses):], delta_E)
+    E = np.r_[delta[non_slack_buses], v]
+    eps = 1e-7
+    H_num = np.array([(hx(E + eps * e) - hx(E - eps * e)) / (2 * eps)
+                      for e in np.eye(len(E))]).T
+    assert np.allclose(H.toarray(), H_num, atol=1e-5)
+
+
+def test_flow_and_current_measurements():
+    net = nw.case30()
+    # bus power measurements of the power flow include the shunts, which are part of Ybus in the
+    # estimation
+    net.shunt.drop(net.shunt.index, inplace=True)
+    _create_flow_measurements(net)
+    v_pf, delta_pf = net.res_bus.vm_pu.values, net.res_bus.va_degree.values
+    success = estimate(net, ref_power=net.sn_kva * 1e3)
+
+    assert success
+    assert np.allclose(net.res_bus_est.vm_pu.values, v_pf, atol=1e-5)
+    assert np.allclose(net.res_bus_est.va_degree.values, delta_pf, atol=1e-3)
+
+
+def test_residual_covariance_diagonal():
+    net = nw.case30()
+    net.shunt.drop(net.shunt.index, inplace=True)
+    _create_flow_measurements(net)
+    wls = state_estimation(net=net, ref_power=net.sn_kva * 1e3)
+    assert wls.estimate()
+    H, R = wls.H.toarray(), 1 / wls.R_inv.diagonal()
+    omega = R - np.diag(H.dot(np.linalg.solve(wls.Gm.toarray(), H.T)))
+    solver = get_linear_solver()
+    solver.factorize(wls.Gm.tocsc())
+    # small blocks of Gm^-1 * H^T, so that the diagonal is calculated over several blocks
+    for block_size in [None, 7]:
+        assert np.allclose(R - _diagonal_of_h_ginv_ht(wls.H, solver, block_size), omega,
+                           atol=1e-10 * np.max(R))
+
+
+def test_remove_multiple_bad_data():
+    np.random.seed(0)
+    net = nw.case30()
+    net.shunt.drop(net.shunt.index, inplace=True)
+    _create_flow_measurements(net)
+    v_pf, delta_pf = net.res_bus.vm_pu.values, net.res_bus.va_degree.values
+    meas = net.measurement
+    meas["value"] += np.random.normal(0, 1, len(meas)) * meas.std_dev
+    # two gross errors in different areas of the network
+    bad_v = meas.index[(meas.type == "v") & (meas.bus == 5)][0]
+    bad_p = meas.index[(meas.type == "p") & (meas.element_type == "bus") & (meas.bus == 25)][0]
+    meas.loc[bad_v, "value"] += 0.05
+    meas.loc[bad_p, "value"] += 5000.
+    measurements = set(meas.index)
+
+    success = remove_bad_data(net, ref_power=net.sn_kva * 1e3, max_removed_per_pass=2)
+
+    assert success
+    assert measurements - set(net.measurement.index) == {bad_v, bad_p}
+    assert np.allclose(net.res_bus_est.vm_pu.values, v_pf, atol=1e-2)
+    assert np.allclose(net.res_bus_est.va_degree.values, delta_pf, atol=0.5)
+
+
+def test_remove_bad_data_with_virtual_measurements():
+    net = nw.case30()
+    net.shunt.drop(net.shunt.index, inplace=True)
+    # the open line switch creates an artificial bus with virtual p and q measurements
+    pp.create_switch(net, net.line.from_bus.at[5], 5, et="l", closed=False)
+    _create_flow_measurements(net)
+    bad_p = net.measurement.index[(net.measurement.type == "p") &
+                                  (net.measurement.element_type == "bus") &
+                                  (net.measurement.bus == 25)][0]
+    net.measurement.loc[bad_p, "value"] += 5000.
+    measurements = set(net.measurement.index)
+    wls = state_estimation(net=net, ref_power=net.sn_kva * 1e3)
+    assert wls.estimate()
+    assert np.count_nonzero(wls.pp_meas_indices == -1) == 2
+    assert set(wls.pp_meas_indices[wls.pp_meas_indices >= 0]) == measurements
+
+    with pytest.raises(ValueError):
+        remove_bad_data(net, ref_power=net.sn_kva * 1e3, max_removed_per_pass=0)
+    with pytest.raises(ValueError):
+        wls.perform_rn_max_test(max_removed_per_pass=0)
+    assert remove_bad_data(net, ref_power=net.sn_kva * 1e3)
+    assert measurements - set(net.measurement.index) == {bad_p}
+
+
+def test_tracking_state_estimation(count_calls):
+    net = nw.case30()
+    net.shunt.drop(net.shunt.index, inplace=True)
+    _create_flow_measurements(net)
+    tse = tracking_state_estimation(net=net, ref_power=net.sn_kva * 1e3)
+    assert tse.track()
+    assert np.allclose(net.res_bus_est.vm_pu.values, net.res_bus.vm_pu.values, atol=1e-5)
+    assert list(tse.measurement_index) == list(net.measurement.index)
+
+    # measurements of the next cycle after a load change
+    net_next = copy.deepcopy(net)
+    net_next.load.p_kw *= 1.05
+    net_next.measurement.drop(net_next.measurement.index, inplace=True)
+    _create_flow_measurements(net_next)
+    values = net_next.measurement.value.values
+    calls = count_calls(SuperLUSolver, "factorize", "refactorize")
+    assert tse.track(values)
+    # warm start from the last state with the ordering of the last factorization
+    assert calls["factorize"] == 0 and calls["refactorize"] > 0
+    assert np.allclose(net.res_bus_est.vm_pu.values, net_next.res_bus.vm_pu.values, atol=1e-5)
+    assert np.allclose(net.res_bus_est.va_degree.values, net_next.res_bus.va_degree.values,
+                       atol=1e-3)
+    assert np.allclose(net.res_line_est.p_from_kw.values, net_next.res_line.p_from_kw.values,
+                       atol=1.)
+    # the measurements in net.measurement are not changed
+    assert not np.allclose(net.measurement.value.values, values)
+
+    # values as a Series indexed by the measurement index
+    assert tse.track(pd.Series(values[::-1], index=net.measurement.index[::-1]))
+    assert np.allclose(net.res_bus_est.vm_pu.values, net_next.res_bus.vm_pu.values, atol=1e-5)
+    with pytest.raises(ValueError):
+        tse.track(values[1:])
+
+
+def test_fast_decoupled_state_estimation(count_calls):
+    net = nw.case30()
+    net.shunt.drop(net.shunt.index, inplace=True)
+    _create_flow_measurements(net)
+    assert estimate(net, ref_power=net.sn_kva * 1e3)
+    res_wls = net.res_bus_est.copy()
+
+    calls = count_calls(SuperLUSolver, "factorize", "refactorize")
+    tse = tracking_state_estimation(net=net, ref_power=net.sn_kva * 1e3, algorithm="fd",
+                                    maximum_iterations=50)
+    assert tse.track()
+    # the constant P-theta and Q-V gain matrices are factorized once
+    assert calls["factorize"] == 2 and calls["refactorize"] == 0
+    assert np.allclose(net.res_bus_est.vm_pu.values, res_wls.vm_pu.values, atol=1e-5)
+    assert np.allclose(net.res_bus_est.va_degree.values, res_wls.va_degree.values, atol=1e-3)
+    assert np.allclose(net.res_bus_est.vm_pu.values, net.res_bus.vm_pu.values, atol=1e-5)
+
+    # the factorizations are reused for new measurement values
+    net_next = copy.deepcopy(net)
+    net_next.load.p_kw *= 1.05
+    net_next.measurement.drop(net_next.measurement.index, inplace=True)
+    _create_flow_measurements(net_next)
+    calls["factorize"] = 0
+    assert tse.track(net_next.measurement.value.values)
+    assert calls["factorize"] == 0
+    assert np.allclose(net.res_bus_est.vm_pu.values, net_next.res_bus.vm_pu.values, atol=1e-5)
+    assert np.allclose(net.res_bus_est.va_degree.values, net_next.res_bus.va_degree.values,
+                       atol=1e-3)
+
+    # and refactorized for new weights
+    assert tse.track(std_dev=net_next.measurement.std_dev.values * 2)
+    assert calls["factorize"] == 2
+
+    with pytest.raises(UserWarning):
+        state_estimation(net=net, algorithm="gauss")
+
+
 def load_3bus_network():
     folder = os.path.abspath(os.path.dirname(pp.__file__))
     return pp.from_pickle(os.path.join(folder, "test", "estimation", "3bus_wls.p"))
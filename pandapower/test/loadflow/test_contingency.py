@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import copy
+
+import numpy as np
+import pytest
+
+import pandapower as pp
+from pandapower.networks import example_multivoltage
+
+
+def _assert_outage_results(net, res, i):
+    net_out = copy.deepcopy(net)
+    net_out[res["element"][i]].in_service.at[res["index"][i]] = False
+    pp.runpp(net_out, tolerance_kva=1e-7)
+    assert res["converged"][i]
+    assert res["unsupplied_buses"][i] == net_out.res_bus.vm_pu.isnull().sum()
+    assert np.isclose(res["min_vm_pu"][i], net_out.res_bus.vm_pu.min(), atol=1e-7,
+                      equal_nan=True)
+    assert np.isclose(res["max_vm_pu"][i], net_out.res_bus.vm_pu.max(), atol=1e-7,
+                      equal_nan=True)
+    for element in ["line", "trafo"]:
+        assert np.isclose(res["max_loading_" + element][i],
+                          net_out["res_" + element].loading_percent.max(), atol=1e-5,
+                          equal_nan=True)
+
+
+def test_contingency_analysis():
+    net = example_multivoltage()
+    elements = {"line": net.line.index[::3], "trafo": net.trafo.index, "trafo3w": [0]}
+    res = pp.run_contingency_analysis(net, elements, tolerance_kva=1e-7)
+    n_outages = len(net.line.index[::3]) + len(net.trafo) + 1
+    assert len(res["index"]) == n_outages
+    assert list(res["element"]).count("trafo3w") == 1
+    # some outages disconnect buses
+    assert np.any(res["unsupplied_buses"] > 0)
+    # the star point of the trafo3w is not counted as unsupplied bus
+    assert res["unsupplied_buses"][res["element"] == "trafo3w"][0] == 21
+    for i in range(n_outages):
+        _assert_outage_results(net, res, i)
+
+    # the same results with worker processes
+    res_parallel = pp.run_contingency_analysis(net, elements, n_jobs=2, tolerance_kva=1e-7)
+    for key, values in res.items():
+        if values.dtype.kind == "f":
+            assert np.allclose(values, res_parallel[key], equal_nan=True)
+        else:
+            assert np.array_equal(values, res_parallel[key])
+
+
+def test_contingency_analysis_errors():
+    net = example_multivoltage()
+    with pytest.raises(NotImplementedError):
+        pp.run_contingency_analysis(net, {"bus": [0]})
+    with pytest.raises(UserWarning):
+        pp.run_contingency_analysis(net, {"line": [1000]})
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, "-xs"])
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import pickle
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+import pandapower as pp
+from pandapower.estimation import estimate
+from pandapower.networks import create_cigre_network_mv
+from pandapower.pf.linear_solver import SuperLUSolver, LINEAR_SOLVERS, get_linear_solver, \
+    register_linear_solver, solve_sparse
+
+
+class CountingSolver(SuperLUSolver):
+    factorizations = 0
+
+    def factorize(self, A):
+        CountingSolver.factorizations += 1
+        super(CountingSolver, self).factorize(A)
+
+
+@pytest.fixture
+def counting_solver():
+    register_linear_solver("counting", CountingSolver)
+    CountingSolver.factorizations = 0
+    yield CountingSolver
+    del LINEAR_SOLVERS["counting"]
+
+
+def test_superlu_solver():
+    A = sp.random(50, 50, density=0.1, random_state=1) + sp.identity(50) * 3
+    b = np.arange(50.)
+    solver = get_linear_solver()
+    solver.factorize(A)
+    assert np.allclose(A * solver.solve(b), b)
+    # refactorization with the ordering of the first factorization
+    A2 = A * 2.
+    solver.refactorize(A2)
+    assert solver.permuted
+    assert np.allclose(A2 * solver.solve(b), b)
+    assert np.allclose(A2 * solver.solve(b * 1j), b * 1j)
+    B = np.column_stack([b, b ** 2])
+    assert np.allclose(A2 * solver.solve_matrix(B), B)
+
+    # the factorization is not pickled, only the ordering
+    solver_p = pickle.loads(pickle.dumps(solver))
+    assert not solver_p.is_factorized()
+    solver_p.refactorize(A2)
+    assert solver_p.permuted
+    assert np.allclose(A2 * solver_p.solve(b), b)
+
+    # singular matrices give nan, as spsolve does
+    assert np.all(np.isnan(solve_sparse(sp.csr_matrix((3, 3)), np.ones(3))))
+
+    with pytest.raises(ValueError):
+        get_linear_solver("unknown")
+
+
+def test_linear_solver_options(counting_solver):
+    net = create_cigre_network_mv()
+    pp.runpp(net)
+    vm_pu = net.res_bus.vm_pu.values.copy()
+    pp.runpp(net, linear_solver="counting", calculate_voltage_angles=True, init="dc")
+    assert np.allclose(net.res_bus.vm_pu.values, vm_pu)
+    # dc initialization and one factorization per newton iteration
+    assert counting_solver.factorizations == net._ppc["iterations"] + 1
+
+    counting_solver.factorizations = 0
+    pp.rundcpp(net)
+    va_degree = net.res_bus.va_degree.values.copy()
+    pp.rundcpp(net, linear_solver="counting")
+    assert np.allclose(net.res_bus.va_degree.values, va_degree)
+    assert counting_solver.factorizations == 1
+
+
+def test_dc_factorization_reuse(counting_solver):
+    net = create_cigre_network_mv()
+    p_kw = np.outer(np.linspace(0.5, 1.5, 10), net.load.p_kw.values)
+    res = pp.rundcpp_batch(net, p_kw, linear_solver="counting")
+    # the factorization is reused for an unchanged topology
+    pp.rundcpp_batch(net, p_kw * 2, linear_solver="counting")
+    assert counting_solver.factorizations == 1
+
+    # ... and by rundcpp with the recycled ppc
+    recycle = dict(_is_elements=True, ppc=True, Ybus=True, bfsw=False)
+    for i in range(3):
+        net.load.p_kw = p_kw[i]
+        pp.rundcpp(net, recycle=recycle, linear_solver="counting")
+        f, t = net._pd2ppc_lookups["branch"]["line"]
+        assert np.allclose(res["p_from_kw"][i, f:t], net.res_line.p_from_kw.values)
+    assert counting_solver.factorizations == 1
+
+    # a changed topology leads to a new factorization
+    net.line.in_service.at[0] = False
+    pp.rundcpp_batch(net, p_kw, linear_solver="counting")
+    assert counting_solver.factorizations == 2
+
+
+def test_linear_solver_opf_and_estimation(counting_solver):
+    net = pp.create_empty_network()
+    pp.create_bus(net, max_vm_pu=1.05, min_vm_pu=0.95, vn_kv=10.)
+    pp.create_bus(net, max_vm_pu=1.05, min_vm_pu=0.95, vn_kv=.4)
+    pp.create_gen(net, 1, p_kw=-100, controllable=True, max_p_kw=-5, min_p_kw=-150,
+                  max_q_kvar=50, min_q_kvar=-50)
+    pp.create_ext_grid(net, 0)
+    pp.create_load(net, 1, p_kw=20, controllable=False)
+    pp.create_line_from_parameters(net, 0, 1, 50, r_ohm_per_km=0.876, c_nf_per_km=260.0,
+                                   max_i_ka=0.123, x_ohm_per_km=0.1159876,
+                                   max_loading_percent=100)
+    pp.create_polynomial_cost(net, 0, "gen", np.array([100, 0]))
+    pp.runopp(net)
+    p_kw = net.res_gen.p_kw.values.copy()
+    pp.runopp(net, linear_solver="counting")
+    assert net.OPF_converged
+    assert np.allclose(net.res_gen.p_kw.values, p_kw)
+    assert counting_solver.factorizations > 0
+
+    counting_solver.factorizations = 0
+    pp.runpp(net)
+    for bus, row in net.res_bus.iterrows():
+        pp.create_measurement(net, "v", "bus", row.vm_pu, 0.01, bus)
+        pp.create_measurement(net, "p", "bus", -row.p_kw, 1., bus)
+        pp.create_measurement(net, "q", "bus", -row.q_kvar, 1., bus)
+    assert estimate(net, linear_solver="counting")
+    assert np.allclose(net.res_bus_est.vm_pu.values, net.res_bus.vm_pu.values, atol=1e-5)
+    assert counting_solver.factorizations > 0
+
+
+if __name__ == "__main__":
+    pytest.main(["test_linear_solver.py", "-xs"])
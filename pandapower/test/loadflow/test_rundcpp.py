@@ -9,6 +9,7 @@ import pytest
 
 import pandapower as pp
 from pandapower.auxiliary import _check_connectivity, _add_ppc_options
+from pandapower.networks import example_multivoltage
 from pandapower.pd2ppc import _pd2ppc
 from pandapower.test.loadflow.result_test_network_generator import result_test_network_generator_dcpp
 from pandapower.test.toolbox import add_grid_connection, create_test_line, assert_net_equal
@@ -88,5 +89,35 @@ def test_test_sn_kva():
             raise UserWarning("Result difference due to sn_kva after adding %s" % net1.last_added_case)
 
 
+
+def test_rundcpp_batch():
+    net = example_multivoltage()
+    p_kw = np.outer(np.linspace(0.5, 1.5, 4), net.load.p_kw.values)
+    p_kw[1, 0] = 0.
+    res = pp.rundcpp_batch(net, p_kw)
+    assert res["va_degree"].shape == (4, len(net.bus))
+    lookup = net._pd2ppc_lookups["branch"]
+    for i in range(4):
+        net.load.p_kw = p_kw[i]
+        pp.rundcpp(net)
+        assert np.allclose(res["va_degree"][i], net.res_bus.va_degree.values, equal_nan=True)
+        for element in ["line", "trafo", "trafo3w"]:
+            f, t = lookup[element]
+            res_element = net["res_" + element]
+            p_columns = ["p_hv_kw", "p_lv_kw"] if element != "line" else ["p_from_kw", "p_to_kw"]
+            if element == "trafo3w":
+                # the hv side is the from side of the first of three branches per trafo3w
+                t = f + len(net.trafo3w)
+                p_columns = ["p_hv_kw"]
+            assert np.allclose(res["p_from_kw"][i, f:t], res_element[p_columns[0]].values)
+            if len(p_columns) > 1:
+                assert np.allclose(res["p_to_kw"][i, f:t], res_element[p_columns[1]].values)
+
+    with pytest.raises(ValueError):
+        pp.rundcpp_batch(net, p_kw[:, 1:])
+    with pytest.raises(ValueError):
+        pp.rundcpp_batch(net, p_kw, element="gen")
+
+
 if __name__ == "__main__":
     pytest.main(["test_rundcpp.py", "-xs"])
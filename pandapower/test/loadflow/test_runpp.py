@@ -13,10 +13,11 @@ import pytest
 
 import pandapower as pp
 from pandapower.auxiliary import _check_connectivity, _add_ppc_options
-from pandapower.networks import create_cigre_network_mv, four_loads_with_branches_out, \
+from pandapower.networks import create_cigre_network_mv, four_loads_with_branches_out, example_multivoltage, \
     example_simple, simple_four_bus_system
 from pandapower.pd2ppc import _pd2ppc
-from pandapower.pf.create_jacobian import _create_J_without_numba
+from pandapower.pf.create_jacobian import _create_J_without_numba, _create_J_from_template, \
+    _get_J_template
 from pandapower.pf.run_newton_raphson_pf import _get_pf_variables_from_ppci
 from pandapower.powerflow import LoadflowNotConverged
 from pandapower.test.consistency_checks import runpp_with_consistency_checks
@@ -418,6 +419,37 @@ def test_bsfw_algorithm():
     assert np.allclose(va_nr, va_alg)
 
 
+def test_bfsw_meshed_and_multiple_subnetworks():
+    # meshed network with parallel lines
+    net = create_cigre_network_mv(with_der=False)
+    net.switch.closed = True
+    l = net.line.index[0]
+    pp.create_line_from_parameters(net, net.line.from_bus.at[l], net.line.to_bus.at[l], 1.,
+                                   r_ohm_per_km=0.5, x_ohm_per_km=0.3, c_nf_per_km=10, max_i_ka=1)
+    # separate radial subnetwork with its own slack bus and a deep feeder
+    b = pp.create_bus(net, vn_kv=20.)
+    pp.create_ext_grid(net, b, vm_pu=1.02)
+    for _ in range(200):
+        b_next = pp.create_bus(net, vn_kv=20.)
+        pp.create_line_from_parameters(net, b, b_next, 0.2, r_ohm_per_km=0.3, x_ohm_per_km=0.1,
+                                       c_nf_per_km=10, max_i_ka=1)
+        pp.create_load(net, b_next, p_kw=5., q_kvar=1.)
+        b = b_next
+
+    pp.runpp(net)
+    vm_nr = net.res_bus.vm_pu.copy()
+    va_nr = net.res_bus.va_degree.copy()
+
+    pp.runpp(net, algorithm='bfsw')
+    assert np.allclose(vm_nr, net.res_bus.vm_pu)
+    assert np.allclose(va_nr, net.res_bus.va_degree)
+
+    # a second slack bus in the same subnetwork is not supported
+    pp.create_ext_grid(net, b)
+    with pytest.raises(NotImplementedError):
+        pp.runpp(net, algorithm='bfsw')
+
+
 def test_pypower_algorithms_iter():
     alg_to_test = ['fdbx', 'fdxb', 'gs']
     for alg in alg_to_test:
@@ -472,6 +504,44 @@ def test_recycle():
     assert np.allclose(net.res_gen.vm_pu.iloc[0], u_set)
 
 
+def test_recycle_auto():
+    net = example_simple()
+
+    def check_level(level):
+        pp.runpp(net, recycle="auto")
+        assert net._change_tracking["level"] == level
+        net_ref = copy.deepcopy(net)
+        pp.runpp(net_ref)
+        assert np.allclose(net.res_bus.vm_pu.values, net_ref.res_bus.vm_pu.values, atol=1e-8,
+                           equal_nan=True)
+        assert np.allclose(net.res_line.p_from_kw.values, net_ref.res_line.p_from_kw.values,
+                           atol=1e-3)
+
+    check_level("full")
+    check_level("injections")
+    net.load.p_kw *= 1.5
+    net.sgen.loc[:, "q_kvar"] = -100.
+    net.gen.vm_pu = 1.01
+    check_level("injections")
+    net.trafo.tp_pos = 2
+    check_level("branch_parameters")
+    net.line.length_km.iat[0] *= 2
+    net.shunt.q_kvar *= 2
+    check_level("branch_parameters")
+    net.switch.closed = ~net.switch.closed.values
+    check_level("full")
+    net.sgen.in_service = False
+    check_level("injections")
+
+    # the ppc is rebuilt if it has been replaced by another calculation or other options are used
+    pp.rundcpp(net)
+    check_level("full")
+    pp.runpp(net, recycle="auto", calculate_voltage_angles=False)
+    assert net._change_tracking["level"] == "full"
+    pp.runpp(net, recycle="auto", calculate_voltage_angles=False)
+    assert net._change_tracking["level"] == "injections"
+
+
 @pytest.mark.xfail
 def test_zip_loads_gridcal():
     # Tests newton power flow considering zip loads against GridCal's pf result
@@ -591,6 +661,44 @@ def test_zip_loads_consistency():
     assert runpp_with_consistency_checks(net)
 
 
+def test_bfsw_dlf_cache_and_feeders(count_calls):
+    import pandapower.pf.run_bfswpf as run_bfswpf
+    # independent lv feeders behind phase shifting trafos, each with its own slack bus
+    net = pp.create_empty_network()
+    for _ in range(5):
+        hv = pp.create_bus(net, vn_kv=20.)
+        pp.create_ext_grid(net, hv)
+        b = pp.create_bus(net, vn_kv=0.4)
+        pp.create_transformer(net, hv, b, "0.4 MVA 20/0.4 kV")
+        for _ in range(10):
+            b_next = pp.create_bus(net, vn_kv=0.4)
+            pp.create_line(net, b, b_next, 0.05, "NAYY 4x150 SE")
+            pp.create_load(net, b_next, p_kw=5., q_kvar=1.)
+            b = b_next
+    assert (net.trafo.shift_degree != 0).all()
+
+    calls = count_calls(run_bfswpf, "_make_bibc_bcbv")
+
+    for _ in range(2):
+        pp.runpp(net, calculate_voltage_angles=True)
+        res_nr = net.res_bus.copy()
+        pp.runpp(net, algorithm="bfsw", calculate_voltage_angles=True)
+        assert np.allclose(net.res_bus.vm_pu, res_nr.vm_pu)
+        assert np.allclose(net.res_bus.va_degree, res_nr.va_degree)
+        # the DLF matrix is only built once for the unchanged network
+        assert calls["_make_bibc_bcbv"] == 1
+        net.load.p_kw *= 2
+
+    # changed branch impedances
+    net.line.length_km.at[net.line.index[3]] = 0.2
+    pp.runpp(net, calculate_voltage_angles=True)
+    res_nr = net.res_bus.copy()
+    pp.runpp(net, algorithm="bfsw", calculate_voltage_angles=True)
+    assert calls["_make_bibc_bcbv"] == 2
+    assert np.allclose(net.res_bus.vm_pu, res_nr.vm_pu)
+    assert np.allclose(net.res_bus.va_degree, res_nr.va_degree)
+
+
 def test_zip_loads_pf_algorithms():
     net = four_loads_with_branches_out()
     net.load['const_i_percent'] = 40
@@ -729,6 +837,59 @@ def test_get_internal():
     # get J for all other algorithms
 
 
+def test_jacobian_template():
+    net = example_simple()
+    pp.runpp(net, recycle=dict(_is_elements=True, ppc=True, Ybus=True))
+    ppci = {"internal": net._ppc["internal"]}
+    J_template = ppci["internal"]["J_template"]
+    Ybus = ppci["internal"]["Ybus"].tocsr()
+    pvpq, pq = J_template["pvpq"], J_template["pq"]
+
+    # the template is reused as long as pattern and bus types are the same
+    assert _get_J_template(ppci, Ybus, pvpq, pq) is J_template
+    nb = Ybus.shape[0]
+    V = 1.02 * np.exp(1j * np.linspace(-0.1, 0.1, nb))
+    J = _create_J_from_template(Ybus, V, J_template, numba=False)
+    assert np.allclose(J.toarray(), _create_J_without_numba(Ybus, V, pvpq, pq).toarray())
+
+    # the template survives recycled power flows with changed injections
+    net.load.p_kw *= 1.2
+    pp.runpp(net, recycle=dict(_is_elements=True, ppc=True, Ybus=True))
+    assert np.array_equal(net._ppc["internal"]["J_template"]["Jsrc"], J_template["Jsrc"])
+
+    # a changed bus type creates a new template
+    new_template = _get_J_template(ppci, Ybus, pq, pq[1:])
+    assert new_template is not J_template
+    assert new_template["J"].shape[0] == 2 * len(pq) - 1
+    J_new = _create_J_from_template(Ybus, V, new_template, numba=False)
+    assert np.allclose(J_new.toarray(), _create_J_without_numba(Ybus, V, pq, pq[1:]).toarray())
+
+
+def test_reuse_ordering_and_chord():
+    net = create_cigre_network_mv(with_der="pv_wind")
+    pp.runpp(net)
+    vm_pu = net.res_bus.vm_pu.values.copy()
+    iterations = net._ppc["iterations"]
+
+    pp.runpp(net, reuse_ordering=True)
+    assert np.allclose(net.res_bus.vm_pu.values, vm_pu)
+    assert net._ppc["iterations"] == iterations
+    assert net._ppc["internal"]["J_template"]["solver"].col_order is not None
+
+    pp.runpp(net, chord=True, max_iteration=30)
+    assert np.allclose(net.res_bus.vm_pu.values, vm_pu)
+
+    # the factorization is kept for the next power flow with recycle
+    lu = net._ppc["internal"]["J_template"]["solver"].lu
+    net.load.p_kw *= 1.05
+    pp.runpp(net, chord=True, max_iteration=30,
+             recycle=dict(_is_elements=True, ppc=True, Ybus=True))
+    net_ref = copy.deepcopy(net)
+    pp.runpp(net_ref)
+    assert np.allclose(net.res_bus.vm_pu.values, net_ref.res_bus.vm_pu.values)
+    assert net._ppc["internal"]["J_template"]["solver"].lu is lu
+
+
 def test_storage_pf():
     net = pp.create_empty_network()
 
@@ -952,5 +1113,107 @@ def test_init_results_without_results():
     pp.runpp(net, init="results")
 
 
+def test_runpp_batch():
+    net = create_cigre_network_mv(with_der="pv_wind")
+    factors = np.array([0.5, 1., 1.5])
+    p_kw = np.outer(factors, net.load.p_kw.values)
+    q_kvar = np.outer(factors, net.load.q_kvar.values)
+    res = pp.runpp_batch(net, p_kw, q_kvar)
+
+    assert res["vm_pu"].shape == (len(factors), len(net.bus))
+    assert all(res["converged"])
+    f, t = net._pd2ppc_lookups["branch"]["line"]
+    for s, factor in enumerate(factors):
+        net_s = copy.deepcopy(net)
+        net_s.load.p_kw *= factor
+        net_s.load.q_kvar *= factor
+        pp.runpp(net_s)
+        assert np.allclose(res["vm_pu"][s], net_s.res_bus.vm_pu.values)
+        assert np.allclose(res["va_degree"][s], net_s.res_bus.va_degree.values)
+        assert np.allclose(res["p_from_kw"][s, f:t], net_s.res_line.p_from_kw.values)
+        assert np.allclose(res["i_to_ka"][s, f:t], net_s.res_line.i_to_ka.values)
+
+    # sgen scenarios, reactive power is taken from the element table
+    p_sgen = np.outer(factors, net.sgen.p_kw.values)
+    res = pp.runpp_batch(net, p_sgen, element="sgen")
+    net.sgen.p_kw *= factors[-1]
+    pp.runpp(net)
+    assert np.allclose(res["vm_pu"][-1], net.res_bus.vm_pu.values)
+
+    with pytest.raises(ValueError):
+        pp.runpp_batch(net, p_kw[:, :-1])
+    with pytest.raises(ValueError):
+        pp.runpp_batch(net, p_kw, element="gen")
+
+
+def test_result_mode_arrays():
+    net = example_multivoltage()
+    pp.create_dcline(net, 20, 33, p_kw=1e3, loss_percent=1.2, loss_kw=25, vm_from_pu=1.01,
+                     vm_to_pu=1.02)
+    net_ref = copy.deepcopy(net)
+    pp.runpp(net_ref)
+
+    pp.runpp(net, result_mode="arrays")
+    assert "_pending_results" in net
+    assert net.converged
+    # the ppc indexed results are available before the res_* tables are created
+    bus_lookup = net._pd2ppc_lookups["bus"]
+    assert np.allclose(net._ppc["bus"][bus_lookup[net.bus.index.values], 7],
+                       net_ref.res_bus.vm_pu.values)
+    assert len(net.bus) == len(net_ref.bus) and len(net.gen) == len(net_ref.gen)
+    assert net.res_line.equals(net_ref.res_line)
+    assert "_pending_results" not in net
+    for element in ["bus", "trafo3w", "xward", "dcline", "gen", "load"]:
+        assert net["res_" + element].equals(net_ref["res_" + element])
+
+    # the results are created from the right power flow after other calculations
+    pp.runpp(net, result_mode="arrays")
+    pp.rundcpp(net, result_mode="arrays")
+    pp.rundcpp(net_ref)
+    net_b = copy.deepcopy(net)
+    # the pending results are created before the net is copied
+    assert "_pending_results" not in net and "_pending_results" not in net_b
+    assert np.allclose(net_b.res_line.p_from_kw.values, net_ref.res_line.p_from_kw.values)
+    pp.runpp(net_b, result_mode="arrays")
+    pp.rundcpp(net_b, result_mode="arrays")
+    pp.runpp_batch(net_b, net_b.load.p_kw.values)
+    assert "_pending_results" not in net_b
+    assert np.allclose(net_b.res_line.p_from_kw.values, net_ref.res_line.p_from_kw.values)
+    assert np.allclose(net.res_line.p_from_kw.values, net_ref.res_line.p_from_kw.values)
+
+    # the results of the last power flow are taken as initial values
+    pp.runpp(net_ref)
+    pp.runpp(net_ref, init="results")
+    pp.runpp(net, result_mode="arrays")
+    pp.runpp(net, init="results", result_mode="arrays")
+    assert net._ppc["iterations"] == net_ref._ppc["iterations"]
+    assert np.allclose(net.res_bus.vm_pu.values, net_ref.res_bus.vm_pu.values)
+
+    with pytest.raises(ValueError):
+        pp.runpp(net, result_mode="lazy")
+
+    # all ways of reading the tables see the results
+    for get_res_bus in [lambda n: n.get("res_bus"), lambda n: dict(n.items())["res_bus"],
+                        lambda n: [v for k, v in n.items() if k == "res_bus"][0]]:
+        pp.runpp(net, result_mode="arrays")
+        assert np.allclose(get_res_bus(net).values, net_ref.res_bus.values)
+
+
+def test_result_mode_arrays_file_io(tmpdir):
+    net = example_multivoltage()
+    net_ref = copy.deepcopy(net)
+    pp.runpp(net_ref)
+    pp.runpp(net, result_mode="arrays")
+    filename = os.path.join(str(tmpdir), "net.p")
+    pp.to_pickle(net, filename)
+    net_loaded = pp.from_pickle(filename)
+    assert "_pending_results" not in net_loaded
+    assert np.allclose(net_loaded.res_bus.values, net_ref.res_bus.values)
+
+    pp.runpp(net, result_mode="arrays")
+    net_loaded = pp.from_json_string(pp.to_json_string(net))
+    assert np.allclose(net_loaded.res_bus.values, net_ref.res_bus.values)
+
+
 if __name__ == "__main__":
     pytest.main(["test_runpp.py"])
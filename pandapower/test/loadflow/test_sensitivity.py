@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import copy
+
+import numpy as np
+import pytest
+
+import pandapower as pp
+from pandapower.networks import example_multivoltage
+
+
+def _branch_flows(net):
+    return np.r_[net.res_line.p_from_kw.values, net.res_trafo.p_hv_kw.values,
+                 net.res_impedance.p_from_kw.values]
+
+
+@pytest.fixture
+def meshed_net():
+    net = example_multivoltage()
+    net.switch.closed = True
+    pp.rundcpp(net)
+    return net
+
+
+def test_ptdf(meshed_net):
+    net = meshed_net
+    p0 = _branch_flows(net)
+    ptdf = pp.calc_ptdf(net)
+    assert ptdf.shape == (len(net.line) + len(net.trafo) + len(net.impedance), len(net.bus))
+    for j, bus in enumerate(net.bus.index[::5]):
+        net_inj = copy.deepcopy(net)
+        pp.create_sgen(net_inj, bus, p_kw=-1000.)
+        pp.rundcpp(net_inj)
+        assert np.allclose((_branch_flows(net_inj) - p0) / 1000., ptdf[:, 5 * j], atol=1e-8)
+
+    # restriction to monitored branches and injection buses
+    lines, buses = net.line.index[[3, 1]], net.bus.index[[10, 2, 40]]
+    ptdf_sub = pp.calc_ptdf(net, monitored={"line": lines}, injection_buses=buses)
+    assert np.allclose(ptdf_sub, ptdf[np.ix_(net.line.index.get_indexer(lines),
+                                             net.bus.index.get_indexer(buses))])
+
+    # sparse and blocked output
+    ptdf_sparse = pp.calc_ptdf(net, output="sparse", block_size=7, threshold=1e-3)
+    assert np.allclose(ptdf_sparse.toarray(), np.where(np.abs(ptdf) < 1e-3, 0., ptdf))
+    blocks = list(pp.calc_ptdf(net, output="blocks", block_size=10))
+    assert [start for start, _ in blocks] == [0, 10, 20]
+    assert np.allclose(np.vstack([block for _, block in blocks]), ptdf)
+
+
+def test_lodf(meshed_net):
+    net = meshed_net
+    p0 = _branch_flows(net)
+    lodf = pp.calc_lodf(net)
+    bridges = np.isnan(lodf).all(axis=0)
+    assert bridges.any() and not bridges.all()
+    k = 0
+    for element in ["line", "trafo", "impedance"]:
+        for idx in net[element].index:
+            if not bridges[k]:
+                net_out = copy.deepcopy(net)
+                net_out[element].in_service.at[idx] = False
+                pp.rundcpp(net_out)
+                assert lodf[k, k] == -1.
+                assert np.allclose(_branch_flows(net_out), p0 + lodf[:, k] * p0[k], atol=1e-6)
+            k += 1
+
+    # blocked output, with the outaged branches solved in blocks as well
+    blocks = list(pp.calc_lodf(net, output="blocks", block_size=4))
+    assert np.allclose(np.vstack([block for _, block in blocks]), lodf, equal_nan=True)
+
+
+def test_sensitivity_cache(meshed_net):
+    net = meshed_net
+    ptdf = pp.calc_ptdf(net)
+    solver = net._sensitivity_cache["solver"]
+    cached = net._sensitivity_cache["results"]["ptdf"][1]
+    assert np.array_equal(pp.calc_ptdf(net), ptdf)
+    assert net._sensitivity_cache["results"]["ptdf"][1] is cached
+    # changes of the returned array do not change the cached result
+    ptdf_changed = pp.calc_ptdf(net)
+    ptdf_changed[:] = 0.
+    assert np.array_equal(pp.calc_ptdf(net), ptdf)
+    # only the last dense result is cached
+    pp.calc_ptdf(net, injection_buses=net.bus.index[:3])
+    assert len(net._sensitivity_cache["results"]) == 1
+    assert net._sensitivity_cache["results"]["ptdf"][1] is not cached
+    assert np.array_equal(pp.calc_ptdf(net), ptdf)
+    cached = net._sensitivity_cache["results"]["ptdf"][1]
+    # changes of injections do not change the sensitivities
+    net.load.p_kw *= 2
+    assert np.array_equal(pp.calc_ptdf(net), ptdf)
+    assert net._sensitivity_cache["results"]["ptdf"][1] is cached
+    # changes of the topology do
+    net.line.in_service.at[0] = False
+    ptdf_out = pp.calc_ptdf(net)
+    assert net._sensitivity_cache["solver"] is not solver
+    assert np.all(ptdf_out[0] == 0.)
+    assert not np.allclose(ptdf_out, ptdf)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, "-xs"])
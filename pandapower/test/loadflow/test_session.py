@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import copy
+
+import numpy as np
+import pytest
+
+import pandapower as pp
+from pandapower.networks import create_cigre_network_mv
+from pandapower.powerflow import LoadflowNotConverged
+
+
+def _cigre_with_gen():
+    net = create_cigre_network_mv(with_der="pv_wind")
+    pp.create_gen(net, 5, p_kw=-200, vm_pu=1.01)
+    net.load.in_service.at[2] = False
+    return net
+
+
+def _assert_session_results(session, net):
+    res = session.results_as_arrays()
+    assert np.allclose(res["bus"]["vm_pu"], net.res_bus.vm_pu.values, atol=1e-8)
+    assert np.allclose(res["bus"]["va_degree"], net.res_bus.va_degree.values, atol=1e-6)
+    for column in ["p_from_kw", "q_to_kvar", "i_ka", "loading_percent"]:
+        assert np.allclose(res["line"][column], net.res_line[column].values, atol=1e-4)
+    for column in ["p_hv_kw", "q_lv_kvar", "loading_percent"]:
+        assert np.allclose(res["trafo"][column], net.res_trafo[column].values, atol=1e-4)
+
+
+def test_power_flow_session():
+    net = _cigre_with_gen()
+    session = pp.PowerFlowSession(net, calculate_voltage_angles=True, tolerance_kva=1e-7)
+    assert session.run()
+    net_ref = copy.deepcopy(net)
+    pp.runpp(net_ref, calculate_voltage_angles=True, tolerance_kva=1e-7)
+    _assert_session_results(session, net_ref)
+
+    rng = np.random.RandomState(0)
+    for _ in range(3):
+        load_p = net.load.p_kw.values * rng.uniform(0.5, 1.5, len(net.load))
+        sgen_q = rng.uniform(-50., 50., 2)
+        gen_p, gen_vm, ext_grid_vm = rng.uniform(-400., -100.), rng.uniform(0.99, 1.03), \
+            rng.uniform(1., 1.04)
+        session.update_injections("load", p_kw=load_p)
+        session.update_injections("sgen", q_kvar=sgen_q, index=net.sgen.index[:2])
+        session.update_injections("gen", p_kw=gen_p, vm_pu=gen_vm)
+        session.update_injections("ext_grid", vm_pu=ext_grid_vm, index=[0])
+        assert session.run()
+
+        net_ref.load.p_kw = load_p
+        net_ref.sgen.q_kvar.iloc[:2] = sgen_q
+        net_ref.gen.p_kw, net_ref.gen.vm_pu, net_ref.ext_grid.vm_pu = gen_p, gen_vm, ext_grid_vm
+        pp.runpp(net_ref, calculate_voltage_angles=True, tolerance_kva=1e-7)
+        _assert_session_results(session, net_ref)
+    # the injections in the net are not changed by the session
+    assert np.allclose(net.load.p_kw.values, _cigre_with_gen().load.p_kw.values)
+
+
+def test_power_flow_session_errors():
+    net = _cigre_with_gen()
+    with pytest.raises(NotImplementedError):
+        pp.PowerFlowSession(net, algorithm="bfsw")
+    with pytest.raises(NotImplementedError):
+        pp.PowerFlowSession(net, enforce_q_lims=True)
+
+    session = pp.PowerFlowSession(net)
+    with pytest.raises(NotImplementedError):
+        session.update_injections("ext_grid", p_kw=100.)
+    with pytest.raises(UserWarning):
+        session.update_injections("load", p_kw=100., index=[100])
+    with pytest.raises(UserWarning):
+        session.results_as_arrays()
+
+    session.run()
+    vm_pu = session.results_as_arrays()["bus"]["vm_pu"]
+    session.update_injections("load", p_kw=net.load.p_kw.values * 1e3)
+    with pytest.raises(LoadflowNotConverged):
+        session.run()
+    with pytest.raises(UserWarning):
+        session.results_as_arrays()
+    # the voltages of the last converged run are kept
+    session.update_injections("load", p_kw=net.load.p_kw.values)
+    assert session.run(warm_start=False)
+    assert np.allclose(session.results_as_arrays()["bus"]["vm_pu"], vm_pu)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, "-xs"])
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import copy
+
+import numpy as np
+import pytest
+
+import pandapower as pp
+from pandapower.networks import example_multivoltage, example_simple
+
+
+def _runpp_with_switches(net, closed, **kwargs):
+    net_sw = copy.deepcopy(net)
+    net_sw.switch.closed = closed
+    pp.runpp(net_sw, tolerance_kva=1e-7, **kwargs)
+    return net_sw
+
+
+def _assert_results(net_sw, res):
+    assert np.allclose(res["bus"]["vm_pu"], net_sw.res_bus.vm_pu.values, atol=1e-7,
+                       equal_nan=True)
+    assert np.allclose(res["bus"]["va_degree"], net_sw.res_bus.va_degree.values, atol=1e-5,
+                       equal_nan=True)
+    for element in ["line", "trafo"]:
+        for column, values in res[element].items():
+            assert np.allclose(values, net_sw["res_" + element][column].values, atol=1e-3,
+                               equal_nan=True)
+
+
+@pytest.mark.parametrize("network", [example_simple, example_multivoltage])
+def test_switching_session(network):
+    net = network()
+    session = pp.SwitchingSession(net, init="dc", tolerance_kva=1e-7)
+    rng = np.random.RandomState(0)
+    for warm_start in [False, True]:
+        closed = net.switch.closed.values.copy()
+        flip = rng.choice(len(closed), 3, replace=False)
+        closed[flip] = ~closed[flip]
+        session.set_switches(closed)
+        assert session.run(warm_start=warm_start)
+        net_sw = _runpp_with_switches(net, closed, init="dc")
+        _assert_results(net_sw, session.results_as_arrays())
+
+    # the switch states of the net are not changed
+    assert net.switch.closed.equals(network().switch.closed)
+
+
+def test_switching_session_unsupplied_buses():
+    net = example_multivoltage()
+    session = pp.SwitchingSession(net, init="dc", tolerance_kva=1e-7)
+    # opening the switch of the trafo disconnects the lower voltage levels
+    trafo_switch = net.switch.index[(net.switch.et == "t") & (net.switch.element == 1)][0]
+    session.set_switches(False, index=[trafo_switch])
+    session.run()
+    closed = net.switch.closed.values.copy()
+    closed[net.switch.index.get_loc(trafo_switch)] = False
+    net_sw = _runpp_with_switches(net, closed, init="dc")
+    assert net_sw.res_bus.vm_pu.isnull().any()
+    _assert_results(net_sw, session.results_as_arrays())
+
+
+def test_evaluate_states():
+    net = example_multivoltage()
+    session = pp.SwitchingSession(net, init="dc", tolerance_kva=1e-7)
+    line_switches = net.switch.index[net.switch.et == "l"]
+    closed_matrix = np.ones((4, len(line_switches)), dtype=bool)
+    for i in range(1, 4):
+        closed_matrix[i, i * 3] = False
+    res = session.evaluate_states(closed_matrix, index=line_switches)
+    for i in range(4):
+        closed = net.switch.closed.values.copy()
+        closed[net.switch.index.get_indexer(line_switches)] = closed_matrix[i]
+        net_sw = _runpp_with_switches(net, closed, init="dc")
+        assert res["converged"][i]
+        assert res["unsupplied_buses"][i] == net_sw.res_bus.vm_pu.isnull().sum() - \
+            (~net.bus.in_service).sum()
+        assert np.isclose(res["min_vm_pu"][i], net_sw.res_bus.vm_pu.min(), atol=1e-7)
+        assert np.isclose(res["max_vm_pu"][i], net_sw.res_bus.vm_pu.max(), atol=1e-7)
+        for element in ["line", "trafo"]:
+            assert np.isclose(res["max_loading_" + element][i],
+                              net_sw["res_" + element].loading_percent.max(), atol=1e-5)
+    # the switch states of the session are restored
+    assert np.array_equal(session.closed, net.switch.closed.values)
+
+
+def test_switching_session_errors():
+    net = example_simple()
+    with pytest.raises(NotImplementedError):
+        pp.SwitchingSession(net, init="results")
+    with pytest.raises(NotImplementedError):
+        pp.SwitchingSession(net, r_switch=0.1)
+    session = pp.SwitchingSession(net)
+    with pytest.raises(UserWarning):
+        session.set_switches(False, index=[1000])
+    with pytest.raises(UserWarning):
+        session.results_as_arrays()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, "-xs"])
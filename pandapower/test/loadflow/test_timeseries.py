@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pandapower as pp
+from pandapower.networks import create_cigre_network_mv
+from pandapower.powerflow import LoadflowNotConverged
+
+
+def _cigre_with_profiles(n_steps=8):
+    net = create_cigre_network_mv(with_der="pv_wind")
+    pp.create_gen(net, 5, p_kw=-200, vm_pu=1.01)
+    net.load.in_service.at[2] = False
+    rng = np.random.RandomState(0)
+    load_p = pd.DataFrame(net.load.p_kw.values * rng.uniform(0.5, 1.5, (n_steps, len(net.load))),
+                          columns=net.load.index)
+    sgen_p = pd.DataFrame(net.sgen.p_kw.values[:3] * rng.uniform(0., 1.5, (n_steps, 3)),
+                          columns=net.sgen.index[:3])
+    profiles = {("load", "p_kw"): load_p,
+                ("sgen", "p_kw"): sgen_p,
+                ("gen", "p_kw"): pd.DataFrame({0: np.linspace(-100., -400., n_steps)}),
+                ("gen", "vm_pu"): pd.DataFrame({0: np.linspace(0.99, 1.03, n_steps)}),
+                ("ext_grid", "vm_pu"): pd.DataFrame({0: np.linspace(1., 1.04, n_steps)})}
+    return net, profiles
+
+
+def test_run_timeseries():
+    net, profiles = _cigre_with_profiles()
+    output_spec = {"res_bus": ["vm_pu", "va_degree"], "res_line": ["loading_percent", "p_from_kw"],
+                   "res_trafo": ["loading_percent", "q_lv_kvar"]}
+    res = pp.run_timeseries(net, profiles, output_spec, chunk_size=3,
+                            calculate_voltage_angles=True)
+    assert res["converged"].all()
+    assert net.res_bus.empty
+
+    net_t = copy.deepcopy(net)
+    for t in profiles[("load", "p_kw")].index:
+        for (element, column), profile in profiles.items():
+            net_t[element].loc[profile.columns, column] = profile.loc[t].values
+        pp.runpp(net_t, calculate_voltage_angles=True, tolerance_kva=1e-7)
+        for table, columns in output_spec.items():
+            for column in columns:
+                assert np.allclose(res[(table, column)].loc[t].values, net_t[table][column].values,
+                                   atol=1e-5)
+
+
+def test_run_timeseries_divergence():
+    net, profiles = _cigre_with_profiles(n_steps=3)
+    profiles[("load", "p_kw")].iloc[1] *= 1e3
+    with pytest.raises(LoadflowNotConverged):
+        pp.run_timeseries(net, profiles)
+    res = pp.run_timeseries(net, profiles, continue_on_divergence=True)
+    assert list(res["converged"].values) == [True, False, True]
+    assert np.isnan(res[("res_bus", "vm_pu")].loc[1].values).all()
+    assert not np.isnan(res[("res_bus", "vm_pu")].loc[2].values).any()
+    assert not net.converged
+
+
+if __name__ == "__main__":
+    pytest.main(["test_timeseries.py", "-xs"])
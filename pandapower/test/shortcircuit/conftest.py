@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import pytest
+
+import pandapower as pp
+
+
+@pytest.fixture
+def meshed_sgen_example():
+    net = pp.create_empty_network()
+    b1 = pp.create_bus(net, 110)
+    b2 = pp.create_bus(net, 110)
+    b3 = pp.create_bus(net, 110)
+    b4 = pp.create_bus(net, 20)
+    b5 = pp.create_bus(net, 20)
+    pp.create_bus(net, 20, in_service=False)
+
+    pp.create_ext_grid(net, b1, s_sc_max_mva=100., s_sc_min_mva=80., rx_min=0.4, rx_max=0.4)
+    pp.create_line(net, b1, b2, std_type="305-AL1/39-ST1A 110.0", length_km=20.)
+    pp.create_line(net, b2, b3, std_type="N2XS(FL)2Y 1x185 RM/35 64/110 kV", length_km=15.)
+    pp.create_line(net, b1, b3, std_type="305-AL1/39-ST1A 110.0", length_km=30.)
+    pp.create_transformer(net, b3, b4, std_type="25 MVA 110/20 kV")
+    pp.create_line(net, b4, b5, std_type="NA2XS2Y 1x185 RM/25 12/20 kV", length_km=3.)
+    net.line["endtemp_degree"] = 80
+
+    pp.create_sgen(net, b2, sn_kva=2000, p_kw=0, k=1.2)
+    pp.create_sgen(net, b5, sn_kva=1000, p_kw=0, k=1.2)
+    return net
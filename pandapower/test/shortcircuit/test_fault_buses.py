@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import copy
+
+import numpy as np
+import pytest
+
+import pandapower as pp
+import pandapower.shortcircuit as sc
+
+
+@pytest.fixture
+def meshed_network():
+    net = pp.create_empty_network()
+    b1 = pp.create_bus(net, 110)
+    b2 = pp.create_bus(net, 110)
+    b3 = pp.create_bus(net, 110)
+    b4 = pp.create_bus(net, 110)
+    b5 = pp.create_bus(net, 110)
+
+    pp.create_ext_grid(net, b1, s_sc_max_mva=100., s_sc_min_mva=80., rx_min=0.4, rx_max=0.4)
+    pp.create_line(net, b1, b2, std_type="305-AL1/39-ST1A 110.0", length_km=20.)
+    pp.create_line(net, b2, b3, std_type="N2XS(FL)2Y 1x185 RM/35 64/110 kV", length_km=15.)
+    pp.create_line(net, b1, b4, std_type="305-AL1/39-ST1A 110.0", length_km=12.)
+    pp.create_line(net, b4, b5, std_type="N2XS(FL)2Y 1x185 RM/35 64/110 kV", length_km=8.)
+    pp.create_line(net, b3, b5, std_type="N2XS(FL)2Y 1x185 RM/35 64/110 kV", length_km=10.)
+    net.line["endtemp_degree"] = 80
+    for b in [b2, b3, b5]:
+        pp.create_sgen(net, b, sn_kva=2000, p_kw=0)
+    net.sgen["k"] = 1.2
+    return net
+
+
+@pytest.mark.parametrize("inverse_y", [True, False])
+@pytest.mark.parametrize("kappa_method", ["B", "C"])
+def test_fault_bus_subset(meshed_network, inverse_y, kappa_method):
+    net = meshed_network
+    net_all = copy.deepcopy(net)
+    sc.calc_sc(net_all, ip=True, ith=True, kappa_method=kappa_method)
+    fault_buses = [4, 2]
+    sc.calc_sc(net, ip=True, ith=True, kappa_method=kappa_method, inverse_y=inverse_y,
+               bus=fault_buses)
+    assert list(net.res_bus_sc.index) == fault_buses
+    for column in ["ikss_ka", "ip_ka", "ith_ka"]:
+        assert np.allclose(net.res_bus_sc[column].values,
+                           net_all.res_bus_sc[column].loc[fault_buses].values)
+
+
+@pytest.mark.parametrize("case", ["max", "min"])
+def test_fault_bus_branch_results(meshed_network, case):
+    net = meshed_network
+    net_all = copy.deepcopy(net)
+    sc.calc_sc(net_all, case=case, ip=True, branch_results=True)
+    # the branch results over all faults are the extreme values of the results of single faults
+    line_results = []
+    for b in net.bus.index:
+        sc.calc_sc(net, case=case, ip=True, branch_results=True, inverse_y=False, bus=b)
+        assert np.isclose(net.res_bus_sc.ikss_ka.at[b], net_all.res_bus_sc.ikss_ka.at[b])
+        line_results.append(net.res_line_sc[["ikss_ka", "ip_ka"]].values)
+    minmax = np.nanmax if case == "max" else np.nanmin
+    assert np.allclose(minmax(line_results, axis=0),
+                       net_all.res_line_sc[["ikss_ka", "ip_ka"]].values)
+
+
+@pytest.mark.parametrize("inverse_y", [True, False])
+def test_branch_results_in_chunks(meshed_network, inverse_y):
+    net = meshed_network
+    net_all = copy.deepcopy(net)
+    sc.calc_sc(net_all, ip=True, ith=True, branch_results=True)
+    sc.calc_sc(net, ip=True, ith=True, branch_results=True, inverse_y=inverse_y, chunk_size=2)
+    for table in ["res_bus_sc", "res_line_sc"]:
+        assert np.allclose(net[table].values, net_all[table].values)
+
+
+def test_fault_bus_errors(meshed_network):
+    with pytest.raises(UserWarning):
+        sc.calc_sc(meshed_network, bus=[10])
+    with pytest.raises(ValueError):
+        sc.calc_sc(meshed_network, chunk_size=0)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, "-xs"])
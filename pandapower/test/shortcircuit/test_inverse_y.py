@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import copy
+
+import numpy as np
+import pytest
+from scipy.sparse import eye, random as sparse_random
+
+import pandapower as pp
+import pandapower.shortcircuit as sc
+import pandapower.shortcircuit.impedance as impedance
+from pandapower.pf.linear_solver import SuperLUSolver
+
+
+def _assert_sc_results_equal(net, **kwargs):
+    net_dense = copy.deepcopy(net)
+    sc.calc_sc(net_dense, **kwargs)
+    sc.calc_sc(net, inverse_y=False, **kwargs)
+    for table in ["res_bus_sc", "res_line_sc", "res_trafo_sc"]:
+        assert np.allclose(net[table].values, net_dense[table].values, atol=1e-10,
+                           equal_nan=True)
+
+
+@pytest.mark.parametrize("case", ["max", "min"])
+def test_inverse_y_branch_results(meshed_sgen_example, monkeypatch, case):
+    # small blocks of Zbus columns, so that the branch currents are reduced over several blocks
+    monkeypatch.setattr(impedance, "ZBUS_BLOCK_ENTRIES", 10)
+    _assert_sc_results_equal(meshed_sgen_example, case=case, ip=True, ith=True,
+                             branch_results=True)
+
+
+def test_inverse_y_fault_impedance(meshed_sgen_example):
+    _assert_sc_results_equal(meshed_sgen_example, r_fault_ohm=1., x_fault_ohm=5.,
+                             branch_results=True)
+    _assert_sc_results_equal(meshed_sgen_example, fault="2ph", ip=True, kappa_method="B")
+
+
+def test_kappa_c_shared_factorization(meshed_sgen_example, count_calls):
+    calls = count_calls(SuperLUSolver, "factorize", "refactorize")
+    _assert_sc_results_equal(meshed_sgen_example, ip=True, ith=True, kappa_method="C")
+    # the equivalent frequency network of kappa method C is solved once for ip and ith, with a
+    # refactorization that reuses the ordering of the base case (and the dense run also only
+    # factorizes the equivalent frequency network)
+    assert calls == {"factorize": 2, "refactorize": 1}
+
+
+def test_sparse_zbus_functions():
+    # unsymmetric Ybus, so that Ybus.T is factorized separately
+    n = 20
+    rng = np.random.RandomState(0)
+    Ybus = sparse_random(n, n, density=0.2, random_state=rng) * (1 - 2j) + \
+        eye(n) * (10 - 20j)
+    Zbus = np.linalg.inv(Ybus.toarray())
+    z_fault = rng.rand(n) + 1j * rng.rand(n)
+    ppc = {"bus": np.zeros((n, 1)),
+           "internal": {"Ybus": Ybus.tocsr(), "fault_buses": np.arange(n)}}
+    net = pp.create_empty_network()
+    net._options = {"inverse_y": False}
+    impedance._calc_zbus(net, ppc)
+    ppc["internal"]["z_fault"] = z_fault
+    Zbus += np.diag(z_fault)
+    assert np.allclose(impedance._calc_zbus_diag(ppc) + z_fault, Zbus.diagonal())
+    x = rng.rand(n)
+    assert np.allclose(impedance._zbus_dot(ppc, x), Zbus.dot(x))
+    assert np.allclose(impedance._zbus_dot(ppc, x, transpose=True), Zbus.T.dot(x))
+    columns = np.array([3, 7, 19])
+    assert np.allclose(impedance._zbus_columns(ppc, columns), Zbus[:, columns])
+    assert np.allclose(impedance._zbus_columns(ppc, columns, transpose=True), Zbus.T[:, columns])
+    assert ppc["internal"]["ybus_fact_t"] is not ppc["internal"]["ybus_fact"]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, "-xs"])
@@ -6,10 +6,17 @@
 
 import os
 
+import networkx as nx
+import numpy as np
 import pytest
 
 import pandapower as pp
 import pandapower.shortcircuit as sc
+from pandapower.auxiliary import _add_ppc_options, _add_sc_options
+from pandapower.pd2ppc import _pd2ppc
+from pandapower.powerflow import _add_auxiliary_elements
+from pandapower.shortcircuit.kappa import nxgraph_from_ppc, _meshing_from_ppc, \
+    _biconnected_components
 
 
 @pytest.fixture
@@ -168,5 +175,61 @@ def test_min_6_meshed_grid(meshed_grid):
     assert (abs(net.res_bus_sc.ith_ka.at[8] - 1.058954) <1e-5)
     assert (abs(net.res_bus_sc.ith_ka.at[9] - 0.9327717) <1e-5)
 
+def _meshing_with_all_paths(net, ppc):
+    mg = nxgraph_from_ppc(net, ppc)
+    n = ppc["bus"].shape[0]
+    meshed, low_rx = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+    for bus in range(n):
+        paths = list(nx.all_simple_paths(mg, bus, "earth"))
+        meshed[bus] = len(paths) > 1
+        for path in paths:
+            r = sum(min(e["r"] for e in mg[b1][b2].values()) for b1, b2 in zip(path, path[1:]))
+            x = sum(min(e["x"] for e in mg[b1][b2].values()) for b1, b2 in zip(path, path[1:]))
+            low_rx[bus] |= r / x < .3
+    return meshed, low_rx
+
+
+def test_meshing_detection_without_paths():
+    rng = np.random.RandomState(0)
+    for _ in range(20):
+        net = pp.create_empty_network()
+        n_bus = rng.randint(3, 9)
+        pp.create_buses(net, n_bus, vn_kv=20.)
+        pp.create_ext_grid(net, 0, s_sc_max_mva=100., rx_max=0.1)
+        # radial feeders with additional lines and a second ext_grid in some networks
+        if rng.rand() < .3:
+            pp.create_ext_grid(net, n_bus - 1, s_sc_max_mva=100., rx_max=0.1)
+        buses = [(rng.randint(0, i), i) for i in range(1, n_bus)]
+        buses += [tuple(rng.choice(n_bus, 2, replace=False)) for _ in range(rng.randint(0, 4))]
+        for f, t in buses:
+            pp.create_line_from_parameters(net, f, t, 1., rng.choice([0.05, 0.3, 1.]), 0.3, 0.,
+                                           1.)
+        net._options = {}
+        _add_ppc_options(net, calculate_voltage_angles=False, trafo_model="pi",
+                         check_connectivity=False, mode="sc", copy_constraints_to_ppc=False,
+                         r_switch=0.0, init_vm_pu="flat", init_va_degree="flat",
+                         enforce_q_lims=False, recycle=None)
+        _add_sc_options(net, fault="3ph", case="max", lv_tol_percent=10, tk_s=1.,
+                        topology="auto", r_fault_ohm=0., x_fault_ohm=0., kappa=True, ip=True,
+                        ith=False, consider_sgens=False, branch_results=False, kappa_method="B")
+        _add_auxiliary_elements(net)
+        _, ppci = _pd2ppc(net)
+        meshed, low_rx = _meshing_from_ppc(net, ppci)
+        meshed_paths, low_rx_paths = _meshing_with_all_paths(net, ppci)
+        assert np.array_equal(meshed, meshed_paths)
+        assert np.array_equal(low_rx[meshed], low_rx_paths[meshed])
+
+
+def test_biconnected_components():
+    # two rings connected by a line, parallel lines and a radial line
+    f = np.array([0, 1, 2, 2, 3, 4, 5, 5, 6, 7])
+    t = np.array([1, 2, 0, 3, 4, 5, 3, 6, 7, 6])
+    n_blocks, block = _biconnected_components(8, f, t)
+    assert n_blocks == 5
+    blocks = [block[[0, 1, 2]], block[[3]], block[[4, 5, 6]], block[[7]], block[[8, 9]]]
+    assert all(len(set(b)) == 1 for b in blocks)
+    assert len(set(b[0] for b in blocks)) == 5
+
+
 if __name__ == '__main__':
     pytest.main(['-xs'])
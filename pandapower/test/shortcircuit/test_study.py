@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+import copy
+
+import numpy as np
+import pytest
+
+import pandapower as pp
+import pandapower.shortcircuit as sc
+from pandapower.pf.linear_solver import SuperLUSolver
+from pandapower.test.shortcircuit.test_1ph import add_network
+
+
+@pytest.mark.parametrize("kappa_method", ["B", "C"])
+def test_study_equals_calc_sc(meshed_sgen_example, kappa_method):
+    net = meshed_sgen_example
+    study = sc.ShortCircuitStudy(net, kappa_method=kappa_method)
+    for fault, case, r_fault_ohm, x_fault_ohm in [("3ph", "max", 0., 0.), ("3ph", "min", 2., 5.),
+                                                  ("2ph", "max", 1., 0.), ("3ph", "max", 0., 0.)]:
+        net_ref = copy.deepcopy(net)
+        kwargs = dict(fault=fault, case=case, r_fault_ohm=r_fault_ohm, x_fault_ohm=x_fault_ohm,
+                      ip=True, ith=True, branch_results=True)
+        sc.calc_sc(net_ref, kappa_method=kappa_method, **kwargs)
+        study.run(**kwargs)
+        for table in ["res_bus_sc", "res_line_sc", "res_trafo_sc"]:
+            assert np.allclose(net[table].values, net_ref[table].values, equal_nan=True)
+    # the network is not changed by the study
+    assert len(net.bus) == 6
+
+
+def test_study_factorizes_once(meshed_sgen_example, count_calls):
+    calls = count_calls(SuperLUSolver, "factorize", "refactorize")
+    study = sc.ShortCircuitStudy(meshed_sgen_example)
+    for r_fault_ohm in [0., 1., 5.]:
+        study.run(r_fault_ohm=r_fault_ohm, ip=True)
+    study.calc_ikss(fault="2ph", r_fault_ohm=[0., 1.])
+    # one factorization of the base case and one refactorization of the equivalent frequency
+    # network of kappa method C
+    assert calls == {"factorize": 1, "refactorize": 1}
+
+
+@pytest.mark.parametrize("fault", ["3ph", "2ph"])
+@pytest.mark.parametrize("case", ["max", "min"])
+def test_calc_ikss_fault_impedances(meshed_sgen_example, fault, case):
+    net = meshed_sgen_example
+    study = sc.ShortCircuitStudy(net)
+    r_fault_ohm = np.array([0., 1., 5.])
+    x_fault_ohm = np.array([0., 2., 0.5])
+    ikss = study.calc_ikss(fault=fault, case=case, r_fault_ohm=r_fault_ohm,
+                           x_fault_ohm=x_fault_ohm)
+    assert ikss.shape == (3, len(net.bus))
+    for i, (r, x) in enumerate(zip(r_fault_ohm, x_fault_ohm)):
+        sc.calc_sc(net, fault=fault, case=case, r_fault_ohm=r, x_fault_ohm=x)
+        in_service = net.bus.in_service.values
+        assert np.allclose(ikss[i, in_service], net.res_bus_sc.ikss_ka.values[in_service])
+        assert np.all(np.isnan(ikss[i, ~in_service]))
+
+
+@pytest.mark.parametrize("vector_group", ["Dyn", "YNyn", "Yy"])
+def test_study_1ph_equals_calc_sc(vector_group):
+    net = pp.create_empty_network()
+    add_network(net, vector_group)
+    pp.create_sgen(net, 3, sn_kva=1000, p_kw=0, k=1.2)
+    study = sc.ShortCircuitStudy(net)
+    net_ref = copy.deepcopy(net)
+    sc.calc_sc(net_ref, fault="1ph", case="max")
+    study.run(fault="1ph")
+    assert np.allclose(net.res_bus_sc.values, net_ref.res_bus_sc.values, equal_nan=True)
+
+    r_fault_ohm = np.array([0., 2.])
+    x_fault_ohm = np.array([0., 1.])
+    ikss = study.calc_ikss(fault="1ph", r_fault_ohm=r_fault_ohm, x_fault_ohm=x_fault_ohm)
+    for i, (r, x) in enumerate(zip(r_fault_ohm, x_fault_ohm)):
+        sc.calc_sc(net_ref, fault="1ph", case="max", r_fault_ohm=r, x_fault_ohm=x)
+        assert np.allclose(ikss[i], net_ref.res_bus_sc.ikss_ka.values, equal_nan=True)
+
+
+def test_study_errors(meshed_sgen_example):
+    study = sc.ShortCircuitStudy(meshed_sgen_example)
+    with pytest.raises(NotImplementedError):
+        study.run(fault="1ph", case="min")
+    with pytest.raises(ValueError):
+        study.calc_ikss(case="mean")
+    with pytest.raises(ValueError):
+        sc.ShortCircuitStudy(meshed_sgen_example, topology="ring")
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, "-xs"])
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016-2018 by University of Kassel and Fraunhofer Institute for Energy Economics
+# and Energy System Technology (IEE), Kassel. All rights reserved.
+
+
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from pandapower.auxiliary import _clean_up, _check_bus_index_and_print_warning_if_high, \
+    _check_gen_index_and_print_warning_if_high
+from pandapower.idx_bus import PD, QD, VM
+from pandapower.idx_gen import PG, VG, GEN_BUS
+from pandapower.pd2ppc import _pd2ppc
+from pandapower.pf.makeSbus import makeSbus
+from pandapower.pf.newtonpf import newtonpf
+from pandapower.pf.ppci_variables import _get_pf_variables_from_ppci
+from pandapower.pf.run_dc_pf import _run_dc_pf
+from pandapower.pf.run_newton_raphson_pf import _get_Y_bus, _get_numba_functions
+from pandapower.powerflow import _add_auxiliary_elements, _get_injection_connection_matrix, \
+    LoadflowNotConverged
+from pandapower.results import _extract_results_batch
+from pandapower.results_branch import _get_branch_results_batch
+from pandapower.run import _init_runpp_options
+
+try:
+    import pplog as logging
+except ImportError:
+    import logging
+
+logger = logging.getLogger(__name__)
+
+PQ_PROFILES = [("load", "p_kw"), ("load", "q_kvar"), ("sgen", "p_kw"), ("sgen", "q_kvar"),
+               ("storage", "p_kw"), ("storage", "q_kvar")]
+GEN_PROFILES = [("gen", "p_kw"), ("gen", "vm_pu"), ("ext_grid", "vm_pu")]
+BUS_OUTPUTS = ["vm_pu", "va_degree"]
+
+
+def run_timeseries(net, profiles, output_spec=None, continue_on_divergence=False,
+                   chunk_size=100, **kwargs):
+    """
+    Runs a time series of AC power flows (newton raphson) for the given profiles.
+
+    The network is converted to the ppc format only once. In every time step, only the profiled
+    values are written to the cached ppci and the power flow is started from the voltages of the
+    previous time step. The results are collected in preallocated arrays and only converted to
+    DataFrames once after the last time step.
+
+    Only injections and voltage setpoints can be changed by profiles. Topology and branch
+    parameters are the ones of the net when run_timeseries is called.
+
+    INPUT:
+        **net** - The pandapower format network
+
+        **profiles** (dict) - profiles for element table columns. The keys are tuples
+        (element, column), the values DataFrames with the time steps as index and the element
+        indices as columns. All profiles must have the same index. Available are:
+
+            - ("load", "p_kw"), ("load", "q_kvar")
+            - ("sgen", "p_kw"), ("sgen", "q_kvar")
+            - ("storage", "p_kw"), ("storage", "q_kvar")
+            - ("gen", "p_kw"), ("gen", "vm_pu")
+            - ("ext_grid", "vm_pu")
+
+    OPTIONAL:
+        **output_spec** (dict, None) - result columns that are stored for every time step, e.g.
+        {"res_bus": ["vm_pu"], "res_line": ["loading_percent", "i_ka"]}. Available are the
+        voltage columns of res_bus and the flow columns of res_line and res_trafo. If None,
+        res_bus.vm_pu, res_line.loading_percent and res_trafo.loading_percent are stored.
+
+        **continue_on_divergence** (bool, False) - if True, time steps that do not converge get
+        nan results and the time series continues from the last converged voltages. Otherwise a
+        LoadflowNotConverged error is raised.
+
+        **chunk_size** (int, 100) - number of time steps for which the voltages are buffered
+        before the branch results are calculated at once
+
+        ****kwargs** - power flow options as in runpp (e.g. calculate_voltage_angles, init,
+        tolerance_kva, max_iteration). enforce_q_lims is not available.
+
+    OUTPUT:
+        **results** (dict) - DataFrames with the time steps as index and the element indices as
+        columns for every requested result column, with keys (table, column), e.g.
+        results[("res_bus", "vm_pu")]. results["converged"] is a Series with the convergence
+        of every time step.
+
+    EXAMPLE:
+        profiles = {("load", "p_kw"): load_p_df, ("sgen", "p_kw"): sgen_p_df}
+
+        res = pp.run_timeseries(net, profiles, {"res_line": ["loading_percent"]})
+    """
+    if output_spec is None:
+        output_spec = {"res_bus": ["vm_pu"], "res_line": ["loading_percent"],
+                       "res_trafo": ["loading_percent"]}
+    time_steps = _check_profiles(net, profiles)
+
+    kwargs = _init_runpp_options(net, **kwargs)
+    _check_bus_index_and_print_warning_if_high(net)
+    _check_gen_index_and_print_warning_if_high(net)
+    options = net["_options"]
+
+    bus_index = net["bus"].index.values
+    _add_auxiliary_elements(net)
+    ppc, ppci = _pd2ppc(net)
+    net["_ppc"] = ppc
+
+    pq_profiles, gen_profiles = _init_profile_updates(net, ppci, profiles)
+    buffers = _init_output_buffers(net, output_spec, len(time_steps))
+    converged = np.zeros(len(time_steps), dtype=bool)
+
+    t0 = time()
+    if options["init_va_degree"] == "dc":
+        ppci = _run_dc_pf(ppci, options["linear_solver"])
+    makeYbus, _ = _get_numba_functions(ppci, options)
+    baseMVA, bus, gen, branch, ref, pv, pq, on, gbus, V, _ = _get_pf_variables_from_ppci(ppci)
+    ppci, Ybus, Yf, Yt = _get_Y_bus(ppci, options, makeYbus, baseMVA, bus, branch)
+    Ybus = Ybus.tocsr()
+
+    # the bus loads that are not given by profiles stay constant
+    pd_mw, qd_mvar = bus[:, PD].copy(), bus[:, QD].copy()
+    for element, column, C, values in pq_profiles:
+        base = C * net[element][column].values
+        if column == "p_kw":
+            pd_mw -= base
+        else:
+            qd_mvar -= base
+
+    V_chunk = np.empty((min(chunk_size, len(time_steps)), bus.shape[0]), dtype=np.complex128)
+    chunk_start = 0
+    for step in range(len(time_steps)):
+        # ----- update the profiled values in the ppci -----
+        bus[:, PD] = pd_mw
+        bus[:, QD] = qd_mvar
+        for element, column, C, values in pq_profiles:
+            bus[:, PD if column == "p_kw" else QD] += C * values[step]
+        for gen_rows, column, values in gen_profiles:
+            if column == "p_kw":
+                gen[gen_rows, PG] = values[step]
+            else:
+                gen[gen_rows, VG] = values[step]
+        Sbus = makeSbus(baseMVA, bus, gen)
+        # voltage setpoints of the generators for the warm start
+        V[gbus] = gen[on, VG] / abs(V[gbus]) * V[gbus]
+
+        # ----- run the power flow from the last converged voltages -----
+        V_step, success, _, _, _, _ = newtonpf(Ybus, Sbus, V, pv, pq, ppci, options)
+        converged[step] = success
+        if success:
+            V = V_step
+        elif not continue_on_divergence:
+            _clean_up(net, res=False)
+            raise LoadflowNotConverged("Power Flow did not converge in time step %s!"
+                                       % time_steps[step])
+        V_chunk[step - chunk_start] = V_step if success else np.nan
+
+        if step - chunk_start + 1 == len(V_chunk) or step == len(time_steps) - 1:
+            res = _extract_results_batch(net, ppc, ppci, V_chunk[:step - chunk_start + 1],
+                                         bus_index)
+            _write_output_buffers(net, res, buffers, chunk_start, step + 1)
+            chunk_start = step + 1
+    ppci["et"] = time() - t0
+    _clean_up(net, res=False)
+
+    results = {key: pd.DataFrame(buffer, index=time_steps, columns=_get_output_index(net, key[0]))
+               for key, buffer in buffers.items()}
+    results["converged"] = pd.Series(converged, index=time_steps)
+    net["converged"] = bool(converged.all())
+    return results
+
+
+def _check_profiles(net, profiles):
+    time_steps = None
+    for (element, column), profile in profiles.items():
+        if (element, column) not in PQ_PROFILES + GEN_PROFILES:
+            raise NotImplementedError("Profiles for %s.%s are not supported" % (element, column))
+        if not set(profile.columns).issubset(net[element].index):
+            raise UserWarning("The profile for %s.%s contains unknown %s indices"
+                              % (element, column, element))
+        if time_steps is None:
+            time_steps = profile.index
+        elif not profile.index.equals(time_steps):
+            raise UserWarning("All profiles need to have the same time steps as index")
+    if time_steps is None:
+        raise UserWarning("No profiles are given")
+    return time_steps
+
+
+def _init_profile_updates(net, ppci, profiles):
+    """
+    Translates the profiles to updates of the ppci:
+        - P/Q profiles to connection matrices (ppci bus x element) that already contain scaling and
+          unit conversion, together with the profile values of all elements
+        - generator profiles to rows in ppci["gen"] and the values to be written there
+    """
+    n_bus = ppci["bus"].shape[0]
+    bus_lookup = net["_pd2ppc_lookups"]["bus"]
+    pq_profiles, gen_profiles = [], []
+    for (element, column), profile in profiles.items():
+        el = net[element]
+        if (element, column) in PQ_PROFILES:
+            # elements without profile keep their value from the element table
+            values = np.tile(el[column].values.astype(float), (len(profile), 1))
+            values[:, el.index.get_indexer(profile.columns)] = profile.values
+            C = _get_injection_connection_matrix(net, element, n_bus, bus_lookup)
+            pq_profiles.append((element, column, C, values))
+        else:
+            gen_rows, pos = _get_ppci_gen_rows(net, ppci, element, profile.columns.values)
+            values = profile.values[:, pos].astype(float)
+            if column == "p_kw":
+                values = - values * 1e-3 * el["scaling"].loc[profile.columns.values[pos]].values
+            else:
+                # the bus voltage of the generator buses is the initial value of the warm start
+                ppci["bus"][ppci["gen"][gen_rows, GEN_BUS].astype(int), VM] = values[0]
+            gen_profiles.append((gen_rows, column, values))
+    return pq_profiles, gen_profiles
+
+
+def _get_ppci_gen_rows(net, ppci, element, index):
+    """
+    Returns the rows in ppci["gen"] of the given elements and the positions of the elements
+    in index that are in service
+    """
+    gen_is = ppci["internal"]["gen_is"]
+    ppci_rows = np.cumsum(gen_is) - 1
+    lookup = net["_pd2ppc_lookups"].get(element)
+    if lookup is None:
+        lookup = np.array([], dtype=int)
+    ppc_rows = np.full(len(index), -1)
+    known = index < len(lookup)
+    ppc_rows[known] = lookup[index[known]]
+    pos = np.where(ppc_rows >= 0)[0]
+    pos = pos[gen_is[ppc_rows[pos]]]
+    return ppci_rows[ppc_rows[pos]], pos
+
+
+def _init_output_buffers(net, output_spec, n_steps):
+    buffers = dict()
+    for table, columns in output_spec.items():
+        element = table[4:] if table.startswith("res_") else table
+        if element not in ["bus", "line", "trafo"]:
+            raise NotImplementedError("Time series results are only available for res_bus, "
+                                      "res_line and res_trafo, not for %s" % table)
+        if element == "bus" and not set(columns).issubset(BUS_OUTPUTS):
+            raise NotImplementedError("Only %s are available for res_bus" % BUS_OUTPUTS)
+        for column in columns:
+            buffers[("res_" + element, column)] = np.full((n_steps, len(net[element])), np.nan)
+    return buffers
+
+
+def _write_output_buffers(net, res, buffers, start, stop):
+    branch_res = dict()
+    for (table, column), buffer in buffers.items():
+        element = table[4:]
+        if element == "bus":
+            buffer[start:stop] = res[column]
+            continue
+        if element not in branch_res:
+            branch_res[element] = _get_branch_results_batch(net, res, element)
+        if column not in branch_res[element]:
+            raise NotImplementedError("%s is not available in time series results for %s"
+                                      % (column, table))
+        buffer[start:stop] = branch_res[element][column]
+
+
+def _get_output_index(net, table):
+    return net[table[4:]].index